@@ -0,0 +1,93 @@
+import os
+import time
+import json
+
+# --- ADMISSION CONTROL ---
+# The analyze endpoints are admitted per lane before their upload is read:
+# past ADMIT_INTERACTIVE concurrent /analyze requests (or ADMIT_BULK
+# /analyze/batch requests) the client gets 429 straight away, and while the
+# lane's inference queue is full it gets 503, both with Retry-After. Nothing
+# is buffered for a request we can't serve, and everything else (/centers,
+# /health, ...) never waits behind a backlog of uploads.
+# Admitted requests carry a deadline (ANALYZE_DEADLINE_MS, or a shorter
+# X-Deadline-Ms from the client) in request.state.deadline; work still
+# queued when it passes is dropped and answered with 503.
+
+ADMIT_INTERACTIVE = int(os.getenv("ADMIT_INTERACTIVE", "64"))
+ADMIT_BULK = int(os.getenv("ADMIT_BULK", "4"))
+ANALYZE_DEADLINE_MS = float(os.getenv("ANALYZE_DEADLINE_MS", "15000"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+
+
+class Lane:
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = max(1, limit)
+        self.active = 0
+        self.rejected = 0
+
+
+class Admission:
+    def __init__(self, saturated=None):
+        # saturated(lane name) -> True while that inference lane is full
+        self.saturated = saturated
+        self.lanes = {
+            "interactive": Lane("interactive", ADMIT_INTERACTIVE),
+            "bulk": Lane("bulk", ADMIT_BULK),
+        }
+        self.routes = {"/analyze": self.lanes["interactive"], "/analyze/batch": self.lanes["bulk"]}
+
+    def stats(self):
+        return {name: {"active": lane.active, "limit": lane.limit, "rejected": lane.rejected}
+                for name, lane in self.lanes.items()}
+
+
+def request_deadline(headers):
+    """time.monotonic() deadline: ANALYZE_DEADLINE_MS, or the client's X-Deadline-Ms if shorter."""
+    budget = ANALYZE_DEADLINE_MS
+    requested = headers.get(b"x-deadline-ms")
+    if requested is not None and requested.isdigit():
+        budget = min(budget, int(requested))
+    return time.monotonic() + budget / 1000
+
+
+async def reject(send, status, detail, retry_after=ADMISSION_RETRY_AFTER):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        lane = None
+        if scope["type"] == "http" and scope["method"] == "POST":
+            lane = self.admission.routes.get(scope["path"])
+        if lane is None:
+            return await self.app(scope, receive, send)
+
+        if lane.active >= lane.limit:
+            lane.rejected += 1
+            return await reject(send, 429, f"Too many {lane.name} analyze requests in progress")
+        saturated = self.admission.saturated
+        if saturated is not None and saturated(lane.name):
+            lane.rejected += 1
+            return await reject(send, 503, "Inference queue is full")
+
+        scope.setdefault("state", {})["deadline"] = request_deadline(dict(scope["headers"]))
+        lane.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.active -= 1
@@ -0,0 +1,147 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import db
+from executors import io_pool
+
+# --- PRECOMPUTED RECYCLING ADVICE ---
+# Advice only depends on the detected class, so it is generated once per
+# class, kept in memory and persisted in waste_categories.general_recovery_protocol.
+# Lookups never wait on Gemini: a miss or a stale entry returns what we have
+# (or the default text) and queues a background refresh. A refresh that comes
+# back empty (no API key, breaker open) or fails isn't retried for
+# ADVICE_RETRY_SECONDS, so lookups in the meantime don't each queue another.
+
+ADVICE_TTL_SECONDS = float(os.getenv("ADVICE_TTL_SECONDS", str(7 * 24 * 3600)))
+ADVICE_CACHE_SIZE = int(os.getenv("ADVICE_CACHE_SIZE", "256"))
+ADVICE_REFRESH_INTERVAL = float(os.getenv("ADVICE_REFRESH_INTERVAL", "600"))
+ADVICE_RETRY_SECONDS = float(os.getenv("ADVICE_RETRY_SECONDS", "60"))
+
+DEFAULT_ADVICE = "Recycle according to local construction guidelines."
+
+
+class AdviceCache:
+    def __init__(self, generate, ttl=ADVICE_TTL_SECONDS, max_entries=ADVICE_CACHE_SIZE):
+        # generate(waste_type) -> advice text, or None if no generator is configured
+        self.generate = generate
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()  # waste_type -> (advice, fetched_at)
+        self._lock = threading.Lock()
+        self._in_flight = {}  # waste_type -> callbacks to run when its refresh ends
+        self._retry_at = {}  # waste_type -> time.time() before which a failed refresh isn't retried
+        self._stop = threading.Event()
+        self._refresher = None
+
+    def get(self, waste_type):
+        """Returns advice for `waste_type` immediately, refreshing it in the background if needed."""
+        with self._lock:
+            entry = self._entries.get(waste_type)
+            if entry is not None:
+                self._entries.move_to_end(waste_type)
+        if entry is None:
+            self.refresh_async(waste_type)
+            return DEFAULT_ADVICE
+        advice, fetched_at = entry
+        if time.time() - fetched_at > self.ttl:
+            self.refresh_async(waste_type)
+        return advice
+
+    def peek(self, waste_type):
+        """Cached advice for `waste_type` (stale or not), or None. Never triggers a refresh."""
+        with self._lock:
+            entry = self._entries.get(waste_type)
+        return entry[0] if entry is not None else None
+
+    def put(self, waste_type, advice, fetched_at=None):
+        with self._lock:
+            self._retry_at.pop(waste_type, None)
+            self._entries[waste_type] = (advice, time.time() if fetched_at is None else fetched_at)
+            self._entries.move_to_end(waste_type)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh_async(self, waste_type, callback=None):
+        """Regenerates advice in the background. `callback()` runs (on a pool
+        thread) when that refresh ends, whether or not it succeeded, or right
+        away if the last refresh failed less than ADVICE_RETRY_SECONDS ago."""
+        with self._lock:
+            backing_off = self._retry_at.get(waste_type, 0) > time.time()
+        if backing_off:
+            if callback is not None:
+                callback()
+            return
+        with self._lock:
+            callbacks = self._in_flight.get(waste_type)
+            if callbacks is not None:
+                if callback is not None:
+                    callbacks.append(callback)
+                return
+            self._in_flight[waste_type] = [callback] if callback is not None else []
+        io_pool.submit(self._refresh, waste_type)
+
+    def _refresh(self, waste_type):
+        try:
+            advice = self.generate(waste_type)
+            if not advice:
+                self._back_off(waste_type)
+                return
+            fetched_at = time.time()
+            self.put(waste_type, advice, fetched_at)
+            db.save_advice(waste_type, advice, fetched_at)
+        except Exception as e:
+            # Keep serving the previous entry; retried after the backoff
+            print(f"⚠️ Advice refresh failed for {waste_type}: {e}")
+            self._back_off(waste_type)
+        finally:
+            with self._lock:
+                callbacks = self._in_flight.pop(waste_type, [])
+            for callback in callbacks:
+                callback()
+
+    def _back_off(self, waste_type):
+        with self._lock:
+            self._retry_at[waste_type] = time.time() + ADVICE_RETRY_SECONDS
+
+    def warm(self, waste_types):
+        """Loads persisted advice for every class and generates whatever is missing."""
+        try:
+            stored = db.fetch_advice()
+        except Exception as e:
+            print(f"⚠️ Could not load stored advice: {e}")
+            stored = {}
+
+        loaded = 0
+        for waste_type in waste_types:
+            advice, fetched_at = stored.get(waste_type, (None, None))
+            if advice:
+                # Rows saved before fetch times were recorded count as stale
+                self.put(waste_type, advice, fetched_at or 0.0)
+                loaded += 1
+            else:
+                self.refresh_async(waste_type)
+        print(f"✅ Advice cache warmed ({loaded}/{len(waste_types)} classes from DB, rest generating)")
+
+    def start(self):
+        """Starts the thread that refreshes entries before their TTL runs out."""
+        if self._refresher is not None:
+            return
+        self._stop.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="advice-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout)
+            self._refresher = None
+
+    def _refresh_loop(self):
+        while not self._stop.wait(ADVICE_REFRESH_INTERVAL):
+            # Refresh anything that would expire before the next pass
+            horizon = time.time() - self.ttl + ADVICE_REFRESH_INTERVAL
+            with self._lock:
+                due = [name for name, (_, fetched_at) in self._entries.items() if fetched_at < horizon]
+            for waste_type in due:
+                self.refresh_async(waste_type)
@@ -0,0 +1,88 @@
+import os
+import uuid
+import asyncio
+from collections import OrderedDict
+from advice_cache import DEFAULT_ADVICE
+from executors import run_io
+
+# --- DEFERRED ADVICE ---
+# With /analyze?advice=deferred a class whose advice isn't cached yet doesn't
+# get the default text: the response carries an advice job id instead, the
+# advice is generated in the background, and the client picks it up from
+# /advice/{job_id} (polling) or /advice/{job_id}/events (SSE). Once known, the
+# advice is also written onto the scan row.
+
+# Give up waiting for Gemini after this long and settle for the default text
+ADVICE_WAIT_SECONDS = float(os.getenv("ADVICE_WAIT_SECONDS", "30"))
+# How many finished jobs we remember for late pollers
+ADVICE_JOB_MEMORY = 10000
+
+
+class AdviceJob:
+    def __init__(self, waste_type):
+        self.id = f"a-{uuid.uuid4().hex}"
+        self.waste_type = waste_type
+        self.advice = None
+        self.done = asyncio.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": "done" if self.done.is_set() else "pending",
+            "waste_type": self.waste_type,
+            "advice": self.advice,
+        }
+
+
+class AdviceJobs:
+    def __init__(self, advice_cache, wait_seconds=ADVICE_WAIT_SECONDS):
+        self.advice_cache = advice_cache
+        self.wait_seconds = wait_seconds
+        self._jobs = OrderedDict()  # job id -> AdviceJob
+        self._tasks = set()
+
+    def submit(self, waste_type, save=None):
+        """Starts a job for `waste_type`. `save(advice)` (blocking, optional)
+        persists the advice onto the scan once it is known."""
+        job = AdviceJob(waste_type)
+        self._jobs[job.id] = job
+        while len(self._jobs) > ADVICE_JOB_MEMORY:
+            self._jobs.popitem(last=False)
+        task = asyncio.ensure_future(self._complete(job, save))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    async def _complete(self, job, save):
+        if self.advice_cache.peek(job.waste_type) is None:
+            # Shares the refresh with every other job (and the cache's own
+            # refresher) waiting on the same class
+            loop = asyncio.get_running_loop()
+            refreshed = asyncio.Event()
+
+            def wake():
+                try:
+                    loop.call_soon_threadsafe(refreshed.set)
+                except RuntimeError:
+                    pass  # loop already closed (shutdown)
+
+            self.advice_cache.refresh_async(job.waste_type, wake)
+            try:
+                await asyncio.wait_for(refreshed.wait(), self.wait_seconds)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Advice for {job.waste_type} not ready after {self.wait_seconds:g}s, using default")
+        job.advice = self.advice_cache.peek(job.waste_type) or DEFAULT_ADVICE
+        job.done.set()
+
+        if save is not None:
+            try:
+                await run_io(save, job.advice)
+            except Exception as e:
+                print(f"⚠️ Could not save deferred advice ({job.waste_type}): {e}")
+
+    def close(self):
+        for task in list(self._tasks):
+            task.cancel()
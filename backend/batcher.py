@@ -0,0 +1,187 @@
+import os
+import time
+import asyncio
+from collections import deque
+from executors import run_inference
+
+# --- MICRO-BATCHING FOR YOLO INFERENCE ---
+# Requests that arrive within BATCH_WINDOW_MS of each other (or until
+# BATCH_MAX_SIZE images are queued) share one forward pass of the model.
+# Images wait in one of two lanes: "interactive" (single scans, live camera)
+# is always served before "bulk" (/analyze/batch). Each lane holds at most
+# its INFERENCE_QUEUE_* images; beyond that predict() fails fast with
+# QueueFull instead of letting the backlog (and every caller's latency) grow.
+# An image whose caller's deadline passes while it waits is dropped unrun.
+# Ultralytics models aren't thread-safe (each call mutates the predictor), so
+# the batcher is given one predict function per model replica and runs at
+# most one batch on each replica at a time.
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "10"))
+INFERENCE_QUEUE_INTERACTIVE = int(os.getenv("INFERENCE_QUEUE_INTERACTIVE", "64"))
+INFERENCE_QUEUE_BULK = int(os.getenv("INFERENCE_QUEUE_BULK", "128"))
+LANES = ("interactive", "bulk")  # in priority order
+
+
+class QueueFull(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class InferenceBatcher:
+    """Collects images from concurrent callers and runs them as one batch."""
+
+    def __init__(self, predict, max_batch_size=BATCH_MAX_SIZE, window_ms=BATCH_WINDOW_MS, queue_limits=None):
+        # predict(list of images) -> list of ultralytics Results, same order;
+        # or a list of such functions, one per model replica
+        self.predictors = list(predict) if isinstance(predict, (list, tuple)) else [predict]
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self.queue_limits = queue_limits or {"interactive": INFERENCE_QUEUE_INTERACTIVE, "bulk": INFERENCE_QUEUE_BULK}
+        self._lanes = {lane: deque() for lane in LANES}  # (image, future, deadline)
+        self._arrived = None
+        self._worker = None
+        self._free = None  # predictors not running a batch
+        # Counters for /metrics
+        self.batches = 0
+        self.images = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.in_flight = 0
+        self.rejected = {lane: 0 for lane in LANES}
+        self.expired = 0
+
+    def _ensure_worker(self):
+        # The queue and task must belong to the running event loop, so they
+        # are created on first use instead of at import time.
+        if self._worker is None or self._worker.done():
+            self._arrived = asyncio.Event()
+            # One batch in flight per replica
+            self._free = asyncio.Queue()
+            for predictor in self.predictors:
+                self._free.put_nowait(predictor)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict(self, image, lane="interactive", deadline=None):
+        """Queue one image and wait for its own ultralytics Results object.
+        `deadline` is a time.monotonic() value; raises QueueFull when the lane
+        is at its limit, DeadlineExceeded if no result is ready by then."""
+        self._ensure_worker()
+        queue = self._lanes[lane]
+        if len(queue) >= self.queue_limits[lane]:
+            self.rejected[lane] += 1
+            raise QueueFull(f"{len(queue)} images waiting in the {lane} lane")
+        future = asyncio.get_running_loop().create_future()
+        queue.append((image, future, deadline))
+        self._arrived.set()
+        if deadline is None:
+            return await future
+        try:
+            return await asyncio.wait_for(future, deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("No inference result before the request deadline")
+
+    def queued(self):
+        return sum(len(queue) for queue in self._lanes.values())
+
+    def saturated(self, lane):
+        """True when `lane` can't take another image."""
+        return len(self._lanes[lane]) >= self.queue_limits[lane]
+
+    def _take(self, limit):
+        """Up to `limit` live images, interactive lane first."""
+        taken = []
+        now = time.monotonic()
+        for lane in LANES:
+            queue = self._lanes[lane]
+            while queue and len(taken) < limit:
+                image, future, deadline = queue.popleft()
+                if future.done():  # caller gave up (deadline, disconnect)
+                    continue
+                if deadline is not None and deadline <= now:
+                    self.expired += 1
+                    future.set_exception(DeadlineExceeded("Request deadline passed while queued"))
+                    continue
+                taken.append((image, future))
+        if not self.queued():
+            self._arrived.clear()
+        return taken
+
+    async def _collect(self):
+        batch = []
+        while not batch:
+            await self._arrived.wait()
+            batch = self._take(self.max_batch_size)
+        deadline = asyncio.get_running_loop().time() + self.window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            if not self.queued():
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch.extend(self._take(self.max_batch_size - len(batch)))
+        return batch
+
+    async def _run(self):
+        while True:
+            predictor = await self._free.get()
+            batch = await self._collect()
+            asyncio.get_running_loop().create_task(self._dispatch(predictor, batch))
+
+    async def _dispatch(self, predictor, batch):
+        try:
+            # Drop callers that gave up (client disconnected) before we ran.
+            batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                return
+
+            images = [image for image, _ in batch]
+            self.in_flight += 1
+            start = time.perf_counter()
+            try:
+                results = await run_inference(predictor, images)
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Batched inference failed ({len(images)} images): {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            finally:
+                self.in_flight -= 1
+                self.busy_seconds += time.perf_counter() - start
+            self.batches += 1
+            self.images += len(images)
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._free.put_nowait(predictor)
+
+    def stats(self):
+        return {
+            "queued": {lane: len(queue) for lane, queue in self._lanes.items()},
+            "rejected": dict(self.rejected),
+            "expired": self.expired,
+            "in_flight": self.in_flight,
+            "batches": self.batches,
+            "images": self.images,
+            "errors": self.errors,
+            "busy_seconds": self.busy_seconds,
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
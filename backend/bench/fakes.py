@@ -0,0 +1,81 @@
+import time
+import zlib
+import numpy as np
+
+# --- OFFLINE STAND-INS ---
+# Just enough of the Ultralytics and google-genai interfaces for the backend
+# to run without best.pt, a GPU/CPU-heavy model or network access. Latencies
+# are simulated with sleep(), which releases the GIL like a real forward pass
+# or HTTP call does.
+
+FAKE_CLASSES = {0: "Concrete", 1: "Brick", 2: "Metal", 3: "Wood", 4: "Plastic", 5: "Glass"}
+
+
+class FakeBoxes:
+    """Mirrors ultralytics Boxes: parallel cls/conf/xyxy arrays, sorted by confidence."""
+
+    def __init__(self, cls, conf, xyxy):
+        self.cls, self.conf, self.xyxy = cls, conf, xyxy
+
+    def __len__(self):
+        return len(self.cls)
+
+    def __getitem__(self, index):
+        index = slice(index, index + 1) if isinstance(index, int) else index
+        return FakeBoxes(self.cls[index], self.conf[index], self.xyxy[index])
+
+
+class FakeResult:
+    def __init__(self, boxes, orig_shape, names):
+        self.boxes = boxes
+        self.orig_shape = orig_shape
+        self.names = names
+
+
+class FakeYOLO:
+    """Deterministic detector: the same image always gives the same boxes.
+    Each call sleeps base_ms + per_image_ms * len(images)."""
+
+    def __init__(self, base_ms=20.0, per_image_ms=15.0, max_boxes=5, names=None):
+        self.base_ms = base_ms
+        self.per_image_ms = per_image_ms
+        self.max_boxes = max_boxes
+        self.names = dict(names or FAKE_CLASSES)
+
+    def __call__(self, source, imgsz=640, verbose=False, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        time.sleep((self.base_ms + self.per_image_ms * len(images)) / 1000)
+        return [self._detect(image) for image in images]
+
+    def _detect(self, image):
+        width, height = image.size
+        # Seed from a thumbnail so near-identical frames get the same answer
+        rng = np.random.default_rng(zlib.crc32(image.resize((8, 8)).tobytes()))
+        n = int(rng.integers(0, self.max_boxes + 1))
+        conf = np.sort(rng.uniform(0.25, 0.98, n))[::-1].astype(np.float32)
+        cls = rng.integers(0, len(self.names), n).astype(np.float32)
+        corners = rng.uniform(0, 1, (n, 2, 2))
+        lo, hi = corners.min(axis=1), corners.max(axis=1)
+        xyxy = (np.concatenate([lo, hi], axis=1) * [width, height, width, height]).astype(np.float32)
+        return FakeResult(FakeBoxes(cls, conf, xyxy), (height, width), self.names)
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+
+    def generate_content(self, model, contents, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        return _FakeResponse(f"Benchmark advice for: {contents[-60:]}")
+
+
+class FakeGeminiClient:
+    """Stands in for google.genai.Client; only models.generate_content() is used."""
+
+    def __init__(self, latency_ms=800.0):
+        self.models = _FakeModels(latency_ms)
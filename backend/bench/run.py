@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""Load-tests the backend and keeps the results per commit.
+
+    python -m bench.run                                  # start bench.server, test, save
+    python -m bench.run --url http://localhost:8000      # test a server you started
+    python -m bench.run --compare latest --fail-on 10    # gate on >10% p95 regressions
+
+Each endpoint gets its own phase: --concurrency clients hit it back-to-back
+for --duration seconds. /analyze uploads synthetic site photos (or --images).
+Throughput and p50/p95/p99 latency are reported per endpoint, and per
+pipeline stage from the Server-Timing header /analyze returns.
+
+Results are written to bench/results/<time>-<commit>.json. --compare takes
+such a file, or "latest" for the newest one from another commit.
+"""
+import io
+import os
+import sys
+import json
+import glob
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+import httpx
+from PIL import Image, ImageDraw
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (method, path or path factory)
+ENDPOINTS = {
+    "analyze": ("POST", "/analyze"),
+    "centers": ("GET", "/centers"),
+    "nearest": ("GET", lambda rng: f"/centers/nearest?lat={rng.uniform(8, 32):.4f}&lon={rng.uniform(69, 89):.4f}&k=5"),
+    "history": ("GET", "/history?limit=20"),
+    "stats": ("GET", "/stats?bucket=day"),
+    "health": ("GET", "/health"),
+}
+DEFAULT_ENDPOINTS = "analyze,centers,history,health"
+
+
+# --- INPUTS ---
+
+def synthetic_photo(rng, size):
+    """A JPEG with enough structure (shapes + noise) to decode like a real photo."""
+    image = Image.effect_noise(size, rng.uniform(20, 60)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        w, h = rng.randrange(20, size[0] // 3), rng.randrange(20, size[1] // 3)
+        draw.rectangle((x, y, x + w, y + h), fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=88)
+    return buffer.getvalue()
+
+
+def load_photos(directory, count, rng):
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, "*.jp*g")) + glob.glob(os.path.join(directory, "*.png")))
+        if not paths:
+            raise SystemExit(f"No images in {directory}")
+        photos = []
+        for path in paths[:count]:
+            with open(path, "rb") as f:
+                photos.append(f.read())
+        return photos
+    # Phone-camera-ish sizes: mostly 12 MP, some smaller
+    sizes = [(4032, 3024), (4032, 3024), (1920, 1440), (1280, 960)]
+    return [synthetic_photo(rng, sizes[i % len(sizes)]) for i in range(count)]
+
+
+# --- MEASUREMENT ---
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def parse_server_timing(header):
+    stages = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                stages[name] = float(value)
+    return stages
+
+
+def summarize(latencies_ms, errors, elapsed, stages):
+    done = len(latencies_ms)
+    summary = {
+        "requests": done + errors,
+        "errors": errors,
+        "throughput_rps": round(done / elapsed, 2) if elapsed else 0.0,
+    }
+    for q in (50, 95, 99):
+        value = percentile(latencies_ms, q)
+        summary[f"p{q}_ms"] = round(value, 2) if value is not None else None
+    if stages:
+        summary["stages"] = {
+            name: {f"p{q}_ms": round(percentile(values, q), 2) for q in (50, 95, 99)}
+            for name, values in stages.items()
+        }
+    return summary
+
+
+async def run_phase(client, name, concurrency, duration, photos, rng):
+    method, path = ENDPOINTS[name]
+    latencies, stages, errors = [], {}, 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(seed):
+        nonlocal errors
+        local = random.Random(seed)
+        while time.perf_counter() < deadline:
+            url = path(local) if callable(path) else path
+            kwargs = {}
+            if name == "analyze":
+                kwargs["files"] = {"file": ("bench.jpg", local.choice(photos), "image/jpeg")}
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                await response.aread()
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                response, ok = None, False
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if not ok:
+                errors += 1
+                continue
+            latencies.append(elapsed_ms)
+            for stage, ms in parse_server_timing(response.headers.get("server-timing")).items():
+                stages.setdefault(stage, []).append(ms)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(rng.random()) for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started, stages)
+
+
+# --- SERVER ---
+
+def start_server(args):
+    command = [sys.executable, "-m", "bench.server", "--port", str(args.port),
+               "--infer-ms", str(args.infer_ms), "--per-image-ms", str(args.per_image_ms),
+               "--gemini-ms", str(args.gemini_ms)]
+    if args.weights:
+        command += ["--weights", args.weights]
+    env = dict(os.environ)
+    if not args.result_cache:
+        env["RESULT_CACHE_MAX_MB"] = "0"  # every upload pays for decode + inference
+    output = None if args.server_log else subprocess.DEVNULL
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, stdout=output, stderr=output)
+
+
+def wait_ready(url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/readyz", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"{url} not ready after {timeout}s")
+
+
+# --- RESULTS ---
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=BACKEND_DIR) != 0
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def find_baseline(spec, commit):
+    if spec != "latest":
+        return spec
+    candidates = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")), reverse=True)
+    for path in candidates:
+        with open(path, encoding="utf-8") as f:
+            if json.load(f).get("commit") != commit:
+                return path
+    return None
+
+
+def compare(results, baseline_path, fail_on):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n📏 Compared with {baseline.get('commit')} ({os.path.basename(baseline_path)})")
+    regressions = []
+    for name, current in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            old, new = before.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = change > fail_on if metric != "throughput_rps" else -change > fail_on
+            flag = " ❌" if worse else ""
+            print(f"   {name:10s} {metric:15s} {old:10.2f} -> {new:10.2f}  ({change:+.1f}%){flag}")
+            if worse and metric in ("p95_ms", "throughput_rps"):
+                regressions.append(f"{name} {metric}")
+    return regressions
+
+
+async def run_all(url, names, args, photos, rng):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    endpoints = {}
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        for name in names:
+            if args.warmup > 0:
+                await run_phase(client, name, args.concurrency, args.warmup, photos, rng)
+            summary = await run_phase(client, name, args.concurrency, args.duration, photos, rng)
+            endpoints[name] = summary
+            print(f"⏱️ {name:10s} {summary['throughput_rps']:8.1f} req/s  "
+                  f"p50 {summary['p50_ms'] or 0:8.1f}  p95 {summary['p95_ms'] or 0:8.1f}  "
+                  f"p99 {summary['p99_ms'] or 0:8.1f} ms  errors {summary['errors']}")
+            for stage, stats in summary.get("stages", {}).items():
+                print(f"     {stage:12s} p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}  p99 {stats['p99_ms']:8.2f} ms")
+    return endpoints
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="test this server instead of starting bench.server")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--endpoints", default=DEFAULT_ENDPOINTS, help=f"comma-separated, from {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of unrecorded load per endpoint")
+    parser.add_argument("--images", help="directory of real photos for /analyze")
+    parser.add_argument("--image-count", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=17)
+    parser.add_argument("--result-cache", action="store_true", help="leave the duplicate-upload cache on")
+    parser.add_argument("--weights", help="bench.server: real weights instead of the fake model")
+    parser.add_argument("--infer-ms", type=float, default=20.0)
+    parser.add_argument("--per-image-ms", type=float, default=15.0)
+    parser.add_argument("--gemini-ms", type=float, default=800.0)
+    parser.add_argument("--server-log", action="store_true", help="show bench.server output")
+    parser.add_argument("--compare", help='results file to compare with, or "latest"')
+    parser.add_argument("--fail-on", type=float, default=10.0, help="percent p95/throughput regression that fails the run")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    rng = random.Random(args.seed)
+    photos = load_photos(args.images, args.image_count, rng) if "analyze" in names else []
+
+    server = None
+    url = args.url
+    if not url:
+        url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args)
+    try:
+        wait_ready(url)
+        endpoints = asyncio.run(run_all(url, names, args, photos, rng))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "no_save", "server_log")},
+        "endpoints": endpoints,
+    }
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Saved {path}")
+
+    if args.compare:
+        baseline = find_baseline(args.compare, commit)
+        if baseline is None:
+            print("\n📏 No earlier results to compare with")
+        elif compare(results, baseline, args.fail_on):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
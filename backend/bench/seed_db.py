@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Prepares the benchmark database (never point this at production).
+
+    python -m bench.seed_db --scans 200000
+
+Creates the schema, loads data/centers_india.csv plus --synthetic-centers
+random centers, and inserts --scans random scans spread over the last
+--days days, so /centers, /history and /stats work on realistic volumes.
+"""
+import os
+import json
+import runpy
+import random
+import argparse
+import db
+from load_centers import load_centers, insert_chunks
+from bench.fakes import FAKE_CLASSES
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+MATERIALS = ["concrete", "brick", "metal", "wood", "plastic", "glass"]
+
+
+def synthetic_centers(count, rng):
+    for i in range(count):
+        yield (f"Bench Recycler {i}", f"Plot {i}, Bench Industrial Area",
+               rng.uniform(8.0, 32.0), rng.uniform(69.0, 89.0), "000-0000000",
+               json.dumps(rng.sample(MATERIALS, rng.randint(1, 4))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=100_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--synthetic-centers", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=17)
+    args = parser.parse_args()
+    if "rds.amazonaws.com" in (os.getenv("DB_HOST") or ""):
+        raise SystemExit("Refusing to seed benchmark data into RDS")
+    rng = random.Random(args.seed)
+
+    runpy.run_path(os.path.join(os.path.dirname(DATA_DIR), "createdb.py"))
+    load_centers([os.path.join(DATA_DIR, "centers_india.csv")], mode="replace")
+    if args.synthetic_centers:
+        stats = {"written": 0}
+        with db.connection() as conn:
+            insert_chunks(conn, "recycling_centers", synthetic_centers(args.synthetic_centers, rng), 5000, stats)
+
+    names = list(FAKE_CLASSES.values())
+
+    def scan():
+        located = rng.random() < 0.5  # about half the uploads share a location
+        return {
+            "waste_type": rng.choice(names),
+            "confidence": rng.uniform(0.25, 0.99),
+            "gemini_advice": "Benchmark advice.",
+            "latitude": rng.uniform(12.8, 13.2) if located else None,
+            "longitude": rng.uniform(77.4, 77.8) if located else None,
+        }
+
+    remaining = args.scans
+    while remaining > 0:
+        batch = min(remaining, 5000)
+        db.insert_scans([scan() for _ in range(batch)])
+        remaining -= batch
+        print(f"   ... {args.scans - remaining} scans inserted")
+
+    # Spread the scans over --days, then recompute the rollups to match
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE scans SET timestamp = NOW() - INTERVAL FLOOR(RAND(%s) * %s * 24) HOUR",
+                       (args.seed, args.days))
+        conn.commit()
+        cursor.close()
+    db.rebuild_rollups()
+    print("✅ Benchmark database ready")
+
+
+if __name__ == "__main__":
+    main()
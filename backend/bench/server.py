@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""Runs the backend with offline stand-ins, for benchmarking.
+
+    python -m bench.server --port 8100 --infer-ms 20 --per-image-ms 15 --gemini-ms 800
+
+YOLO is replaced by bench.fakes.FakeYOLO unless --weights points at a real
+(e.g. tiny yolov8n.pt) model; Gemini always by FakeGeminiClient. The database
+is whatever DB_* points at - see bench/docker-compose.yml for a local MySQL.
+"""
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--weights", help="real weights to load instead of the fake model")
+    parser.add_argument("--infer-ms", type=float, default=20.0, help="fake model: fixed cost per forward pass")
+    parser.add_argument("--per-image-ms", type=float, default=15.0, help="fake model: cost per image in a batch")
+    parser.add_argument("--gemini-ms", type=float, default=800.0, help="fake Gemini latency")
+    args = parser.parse_args()
+
+    import inference_backends
+    from bench.fakes import FakeYOLO, FakeGeminiClient
+
+    if args.weights:
+        real_load_model = inference_backends.load_model
+        inference_backends.load_model = lambda *a, **kw: real_load_model(weights=args.weights)
+    else:
+        fake = FakeYOLO(args.infer_ms, args.per_image_ms)
+        inference_backends.load_model = lambda *a, **kw: fake
+
+    # main binds load_model at import, so patch first
+    import main as backend
+    gemini = FakeGeminiClient(args.gemini_ms)
+    backend.get_gemini_client = lambda: gemini
+
+    import uvicorn
+    uvicorn.run(backend.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
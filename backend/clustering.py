@@ -0,0 +1,136 @@
+import os
+import math
+import json
+import threading
+from collections import defaultdict, OrderedDict
+
+# --- SERVER-SIDE MAP CLUSTERING ---
+# Centers are grouped per zoom level on a grid in Web Mercator pixel space
+# (CLUSTER_CELL_PX square cells) and bucketed by the standard z/x/y slippy-map
+# tile they fall in. A tile's payload therefore depends on how many cells it
+# covers, not on how many centers the table holds. Levels are built on first
+# use and dropped whenever the center index changes. Serialized tiles are kept
+# in a bounded LRU; empty tiles (most of the world) all share one payload.
+
+TILE_SIZE = 256
+CLUSTER_CELL_PX = int(os.getenv("CLUSTER_CELL_PX", "64"))
+# From this zoom on, centers are returned individually; only rows sharing the
+# same coordinates still come back grouped
+CLUSTER_MAX_ZOOM = int(os.getenv("CLUSTER_MAX_ZOOM", "16"))
+CLUSTER_MAX_TILES = int(os.getenv("CLUSTER_MAX_TILES", "64"))
+CLUSTER_PAYLOAD_CACHE = int(os.getenv("CLUSTER_PAYLOAD_CACHE", "4096"))
+MAX_ZOOM = 22
+MAX_MERCATOR_LAT = 85.05112878
+
+CENTER_FIELDS = ("name", "address", "latitude", "longitude", "contact_info")
+EMPTY_TILE = b"[]"
+
+
+def world_xy(lat, lon):
+    """Web Mercator position of (lat, lon) in [0, 1) x [0, 1)."""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = (lon + 180.0) / 360.0
+    siny = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + siny) / (1 - siny)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def tile_range(zoom, west, south, east, north):
+    """Inclusive (x0, y0, x1, y1) tile range covering a lon/lat bounding box."""
+    n = 2 ** zoom
+    x0, y0 = world_xy(north, west)
+    x1, y1 = world_xy(south, east)
+    return int(x0 * n), int(y0 * n), int(x1 * n), int(y1 * n)
+
+
+class ClusterCache:
+    def __init__(self, index):
+        self.index = index
+        self._lock = threading.Lock()
+        self._version = None
+        self._levels = {}  # zoom -> {(x, y): [feature]}
+        self._payloads = OrderedDict()  # (zoom, x, y) -> JSON bytes, least recently used first
+
+    def _level(self, zoom):
+        version = self.index.version
+        with self._lock:
+            if version != self._version:
+                self._levels.clear()
+                self._payloads.clear()
+                self._version = version
+            level = self._levels.get(zoom)
+        if level is None:
+            version, centers = self.index.snapshot()
+            level = self._build(zoom, centers)
+            with self._lock:
+                if version == self._version:
+                    self._levels[zoom] = level
+        return level
+
+    def _build(self, zoom, centers):
+        if zoom >= CLUSTER_MAX_ZOOM:
+            # Only identical coordinates are merged
+            key_of = lambda c, wx, wy: (c["latitude"], c["longitude"])
+        else:
+            cells_per_world = 2 ** zoom * TILE_SIZE / CLUSTER_CELL_PX
+            key_of = lambda c, wx, wy: (int(wx * cells_per_world), int(wy * cells_per_world))
+
+        n = 2 ** zoom
+        cells = {}
+        for center in centers:
+            wx, wy = world_xy(center["latitude"], center["longitude"])
+            key = key_of(center, wx, wy)
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = cell = {"lat": 0.0, "lon": 0.0, "members": [], "tile": (int(wx * n), int(wy * n))}
+            cell["lat"] += center["latitude"]
+            cell["lon"] += center["longitude"]
+            cell["members"].append(center)
+
+        tiles = defaultdict(list)
+        for cell in cells.values():
+            members = cell["members"]
+            feature = {
+                "latitude": cell["lat"] / len(members),
+                "longitude": cell["lon"] / len(members),
+                "count": len(members),
+            }
+            if len(members) == 1 or zoom >= CLUSTER_MAX_ZOOM:
+                feature["centers"] = [{field: c[field] for field in CENTER_FIELDS} for c in members]
+            tiles[cell["tile"]].append(feature)
+        return dict(tiles)
+
+    def tile(self, zoom, x, y):
+        return self._level(zoom).get((x, y), [])
+
+    def tile_json(self, zoom, x, y):
+        """Serialized tile payload, cached (LRU) until the centers change."""
+        features = self.tile(zoom, x, y)
+        if not features:
+            return EMPTY_TILE
+        key = (zoom, x, y)
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                return payload
+        payload = json.dumps(features).encode("utf-8")
+        with self._lock:
+            self._payloads[key] = payload
+            while len(self._payloads) > CLUSTER_PAYLOAD_CACHE:
+                self._payloads.popitem(last=False)
+        return payload
+
+    def bbox(self, zoom, west, south, east, north):
+        """Features in the viewport. west > east means it crosses the antimeridian."""
+        level = self._level(zoom)
+        spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        ranges = [tile_range(zoom, w, south, e, north) for w, e in spans]
+        if sum((x1 - x0 + 1) * (y1 - y0 + 1) for x0, y0, x1, y1 in ranges) > CLUSTER_MAX_TILES:
+            raise ValueError(f"Viewport spans more than {CLUSTER_MAX_TILES} tiles at zoom {zoom}")
+        features = []
+        for x0, y0, x1, y1 in ranges:
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    features.extend(level.get((x, y), ()))
+        return features
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Compares inference backends for best.pt on latency and accuracy.
+
+    python compare_backends.py --images val/images --data data.yaml --int8-data calib/
+
+Every backend/precision combination is exported (or reused), timed on the
+same images and scored. Accuracy is mAP50-95 from `model.val()` when a
+dataset YAML is given, otherwise top-class agreement with PyTorch. The
+fastest option within --max-drop of the PyTorch baseline is recommended.
+"""
+import json
+import argparse
+import statistics
+from preprocess import INFERENCE_IMGSZ, decode_image
+from inference_backends import BACKENDS, MODEL_PATH, export_model, load_model, time_predictions, calibration_images
+
+
+def load_images(directory, limit, imgsz):
+    images = []
+    for path in calibration_images(directory, limit):
+        with open(path, "rb") as f:
+            images.append(decode_image(f, imgsz))
+    return images
+
+
+def top_classes(model, images, imgsz):
+    classes = []
+    for image in images:
+        boxes = model(image, imgsz=imgsz, verbose=False)[0].boxes
+        classes.append(int(boxes.cls[0]) if len(boxes) else None)
+    return classes
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", default=MODEL_PATH)
+    parser.add_argument("--images", required=True, help="directory of sample site photos for timing")
+    parser.add_argument("--limit", type=int, default=100, help="max images to time")
+    parser.add_argument("--data", help="dataset YAML; enables mAP-based accuracy")
+    parser.add_argument("--int8-data", help="calibration data for INT8 (image dir for ONNX; YAML for OpenVINO defaults to --data)")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--imgsz", type=int, default=INFERENCE_IMGSZ)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--max-drop", type=float, default=0.01, help="accuracy budget vs PyTorch (absolute)")
+    parser.add_argument("--out", help="write the results table as JSON here")
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit, args.imgsz)
+    if not images:
+        raise SystemExit(f"No images found in {args.images}")
+
+    combos = []
+    for backend in args.backends.split(","):
+        backend = backend.strip()
+        combos.append((backend, False))
+        if backend == "onnx" and args.int8_data:
+            combos.append((backend, True))
+        if backend == "openvino" and (args.int8_data or args.data):
+            combos.append((backend, True))
+    # PyTorch fp32 is the accuracy baseline, so it always runs first
+    combos = [("torch", False)] + [combo for combo in combos if combo != ("torch", False)]
+
+    results, baseline_classes = [], None
+    for backend, int8 in combos:
+        label = f"{backend}{'-int8' if int8 else ''}"
+        calibration = args.int8_data if backend == "onnx" else (args.data or args.int8_data)
+        try:
+            export_model(backend, args.weights, args.imgsz, int8, calibration)
+            model = load_model(backend, args.weights, args.imgsz, int8, args.threads)
+        except Exception as e:
+            print(f"⚠️ Skipping {label}: {e}")
+            continue
+
+        latencies = time_predictions(model, images, args.imgsz)
+        row = {
+            "backend": label,
+            "mean_ms": statistics.fmean(latencies),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+        }
+        if args.data:
+            metrics = model.val(data=args.data, imgsz=args.imgsz, batch=1, verbose=False)
+            row["accuracy"] = float(metrics.box.map)
+            row["metric"] = "mAP50-95"
+        else:
+            classes = top_classes(model, images, args.imgsz)
+            if baseline_classes is None:
+                baseline_classes = classes
+            row["accuracy"] = sum(a == b for a, b in zip(classes, baseline_classes)) / len(classes)
+            row["metric"] = "top-class agreement"
+        results.append(row)
+        print(f"⏱️ {label:14s} mean {row['mean_ms']:7.1f} ms  p95 {row['p95_ms']:7.1f} ms  {row['metric']} {row['accuracy']:.4f}")
+
+    baseline = next((r for r in results if r["backend"] == "torch"), None)
+    if baseline is None:
+        raise SystemExit("PyTorch baseline failed; cannot compare accuracy")
+    eligible = [r for r in results if baseline["accuracy"] - r["accuracy"] <= args.max_drop]
+    best = min(eligible, key=lambda r: r["mean_ms"])
+    print(f"\n🏁 Fastest within {args.max_drop} of PyTorch accuracy: {best['backend']} "
+          f"({baseline['mean_ms'] / best['mean_ms']:.2f}x faster)")
+    backend, _, precision = best["backend"].partition("-")
+    print(f"   INFERENCE_BACKEND={backend} INFERENCE_INT8={'1' if precision == 'int8' else '0'} INFERENCE_IMGSZ={args.imgsz}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"imgsz": args.imgsz, "threads": args.threads, "results": results, "recommended": best["backend"]}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+import os
+import math
+import time
+import threading
+import weakref
+import functools
+from contextlib import contextmanager
+from mysql.connector import pooling
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- SHARED DATA-ACCESS LAYER ---
+# One pool of warm connections to RDS per process. Checking a connection out
+# costs a lock, not a TCP + auth handshake.
+
+DB_POOL_SIZE = min(int(os.getenv("DB_POOL_SIZE", "8")), pooling.CNX_POOL_MAXSIZE)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Connections idle longer than this are pinged before being handed out
+DB_HEALTHCHECK_IDLE = float(os.getenv("DB_HEALTHCHECK_IDLE", "30"))
+# Give up on an unreachable RDS quickly instead of hanging the caller
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+# Statements used on the request path. They run as server-side prepared
+# statements that stay prepared on their connection between checkouts.
+INSERT_SCAN = "INSERT INTO scans (waste_type, confidence, gemini_advice, latitude, longitude, detections) VALUES (%s, %s, %s, %s, %s, %s)"
+SCAN_COLUMNS = ("waste_type", "confidence", "gemini_advice", "latitude", "longitude", "detections")
+# Buffered scans carry the UTC time they were taken (the INSERT may run much
+# later); records without one are stamped by the DB as before
+INSERT_SCANS = "INSERT INTO scans ({}, timestamp) VALUES ({}, COALESCE(CONVERT_TZ(%s, '+00:00', @@session.time_zone), CURRENT_TIMESTAMP))".format(
+    ", ".join(SCAN_COLUMNS), ", ".join(["%s"] * len(SCAN_COLUMNS)))
+# Scans recorded elsewhere (the local store) carry a unique client_id and keep their own UTC timestamp
+SYNCED_SCAN_COLUMNS = SCAN_COLUMNS + ("client_id", "timestamp")
+INSERT_SYNCED_SCANS = "INSERT INTO scans ({}) VALUES ({}, %s, CONVERT_TZ(%s, '+00:00', @@session.time_zone))".format(
+    ", ".join(SYNCED_SCAN_COLUMNS), ", ".join(["%s"] * len(SCAN_COLUMNS)))
+UPDATE_SCAN_ADVICE = "UPDATE scans SET gemini_advice = %s WHERE id = %s"
+SELECT_CENTERS = "SELECT name, address, latitude, longitude, contact_info FROM recycling_centers"
+SELECT_CENTERS_AFTER = (
+    "SELECT id, name, address, latitude, longitude, accepted_materials, contact_info "
+    "FROM recycling_centers WHERE id > %s ORDER BY id"
+)
+SELECT_CENTERS_VERSION = "SELECT COUNT(*), COALESCE(MAX(id), 0), MAX(updated_at) FROM recycling_centers"
+COUNT_CENTERS_UPDATED = "SELECT COUNT(*) FROM recycling_centers WHERE id <= %s AND updated_at > %s"
+HISTORY_COLUMNS = "id, waste_type, confidence, timestamp, gemini_advice"
+SELECT_ADVICE = (
+    "SELECT name, general_recovery_protocol, UNIX_TIMESTAMP(protocol_fetched_at) "
+    "FROM waste_categories WHERE general_recovery_protocol IS NOT NULL"
+)
+UPSERT_ADVICE = (
+    "INSERT INTO waste_categories (name, general_recovery_protocol, protocol_fetched_at) VALUES (%s, %s, FROM_UNIXTIME(%s)) "
+    "ON DUPLICATE KEY UPDATE general_recovery_protocol = VALUES(general_recovery_protocol), "
+    "protocol_fetched_at = VALUES(protocol_fetched_at)"
+)
+
+# --- SCAN STATISTICS ROLLUPS ---
+# Pre-aggregated counts and confidence per waste type and time bucket (and
+# per geo cell for scans with a location). Every scan insert folds its own
+# rows in, in the same transaction, so the rollups never drift from scans.
+STATS_CELL_DEG = float(os.getenv("STATS_CELL_DEG", "0.01"))  # ~1 km
+ROLLUP_MEASURES = "scan_count, confidence_sum, confidence_min, confidence_max"
+ROLLUPS = {
+    # table: (key columns, key expressions over scans, extra filter)
+    "scan_stats_hourly": (
+        ("bucket", "waste_type"),
+        ("TIMESTAMP(DATE(timestamp), MAKETIME(HOUR(timestamp), 0, 0))", "waste_type"),
+        "",
+    ),
+    "scan_stats_daily": (
+        ("bucket", "waste_type"),
+        ("DATE(timestamp)", "waste_type"),
+        "",
+    ),
+    "scan_stats_geo": (
+        ("cell_lat", "cell_lon", "waste_type"),
+        ("FLOOR(latitude / %(cell)s)", "FLOOR(longitude / %(cell)s)", "waste_type"),
+        " AND latitude IS NOT NULL AND longitude IS NOT NULL",
+    ),
+}
+
+
+def _rollup_sql(table):
+    keys, expressions, extra = ROLLUPS[table]
+    return (
+        f"INSERT INTO {table} ({', '.join(keys)}, {ROLLUP_MEASURES}) "
+        f"SELECT {', '.join(expressions)}, COUNT(*), SUM(confidence), MIN(confidence), MAX(confidence) "
+        f"FROM scans WHERE id BETWEEN %(first)s AND %(last)s{extra} "
+        f"GROUP BY {', '.join(str(i + 1) for i in range(len(keys)))} "
+        "ON DUPLICATE KEY UPDATE "
+        "scan_count = scan_count + VALUES(scan_count), "
+        "confidence_sum = confidence_sum + VALUES(confidence_sum), "
+        "confidence_min = LEAST(confidence_min, VALUES(confidence_min)), "
+        "confidence_max = GREATEST(confidence_max, VALUES(confidence_max))"
+    )
+
+
+ROLLUP_SQL = {table: _rollup_sql(table) for table in ROLLUPS}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+# Plain counters for /metrics (read by metrics.py at scrape time)
+_stats_lock = threading.Lock()
+_stats = {"in_use": 0, "checkouts": 0, "wait_seconds": 0.0, "timeouts": 0, "errors": 0}
+
+# raw connection -> {(sql, dictionary): prepared cursor}
+_statements = weakref.WeakKeyDictionary()
+# raw connection -> time it was last returned to the pool
+_last_used = weakref.WeakKeyDictionary()
+
+
+def db_config():
+    return {
+        "host": os.getenv("DB_HOST"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASS"),
+        "database": os.getenv("DB_NAME"),
+        "port": int(os.getenv("DB_PORT", "3306")),
+        "connection_timeout": DB_CONNECT_TIMEOUT,
+    }
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name="scwm",
+                    pool_size=DB_POOL_SIZE,
+                    # No session state is relied on, and a reset would drop
+                    # the prepared statements cached on the connection.
+                    pool_reset_session=False,
+                    **db_config()
+                )
+                print(f"🔌 MySQL pool ready ({DB_POOL_SIZE} connections)")
+    return _pool
+
+
+def _raw(conn):
+    # PooledMySQLConnection wraps the real connection; statements and
+    # timestamps are tracked against that so they survive checkouts.
+    return getattr(conn, "_cnx", conn)
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for name, delta in deltas.items():
+            _stats[name] += delta
+
+
+def pool_stats():
+    """Pool size and saturation counters since start."""
+    with _stats_lock:
+        return {"size": DB_POOL_SIZE, **_stats}
+
+
+def _checkout():
+    start = time.monotonic()
+    if not _slots.acquire(timeout=DB_POOL_TIMEOUT):
+        _count(timeouts=1, errors=1, wait_seconds=time.monotonic() - start)
+        raise pooling.PoolError(f"No DB connection available within {DB_POOL_TIMEOUT}s")
+    _count(in_use=1, checkouts=1, wait_seconds=time.monotonic() - start)
+    try:
+        conn = get_pool().get_connection()
+    except Exception:
+        _count(in_use=-1, errors=1)
+        _slots.release()
+        raise
+
+    raw = _raw(conn)
+    idle = time.monotonic() - _last_used.get(raw, 0.0)
+    if idle > DB_HEALTHCHECK_IDLE and not conn.is_connected():
+        try:
+            conn.reconnect(attempts=2, delay=0)
+        except Exception:
+            conn.close()
+            _count(in_use=-1, errors=1)
+            _slots.release()
+            raise
+        # Prepared statements died with the old session
+        _statements.pop(raw, None)
+    return conn
+
+
+def _checkin(conn):
+    _last_used[_raw(conn)] = time.monotonic()
+    try:
+        conn.close()  # returns it to the pool
+    finally:
+        _count(in_use=-1)
+        _slots.release()
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled, health-checked connection for the duration of a block."""
+    conn = _checkout()
+    try:
+        yield conn
+    except Exception:
+        _count(errors=1)
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        _checkin(conn)
+
+
+def prepared(conn, sql, dictionary=False):
+    """Returns a prepared cursor for `sql`, reused for the life of the connection."""
+    cache = _statements.setdefault(_raw(conn), {})
+    key = (sql, dictionary)
+    cursor = cache.get(key)
+    if cursor is None:
+        cursor = conn.cursor(prepared=True, dictionary=dictionary)
+        cache[key] = cursor
+    return cursor
+
+
+# --- QUERIES ---
+
+def update_rollups(cursor, first_id, last_id, tables=ROLLUPS):
+    """Folds scans first_id..last_id into the rollup tables. Runs inside the
+    caller's transaction."""
+    for table in tables:
+        cursor.execute(ROLLUP_SQL[table], {"first": first_id, "last": last_id, "cell": STATS_CELL_DEG})
+
+
+def insert_scan(waste_type, confidence, advice, latitude=None, longitude=None, detections=None):
+    with connection() as conn:
+        cursor = prepared(conn, INSERT_SCAN)
+        cursor.execute(INSERT_SCAN, (waste_type, confidence, advice, latitude, longitude, detections))
+        scan_id = cursor.lastrowid
+        rollups = conn.cursor()
+        update_rollups(rollups, scan_id, scan_id)
+        rollups.close()
+        conn.commit()
+        return scan_id
+
+
+def insert_scans(records):
+    """Bulk-inserts scan records (dicts keyed by SCAN_COLUMNS, plus an optional
+    UTC "timestamp") in one multi-row INSERT and returns the id of the first
+    row. InnoDB reserves the ids for a single multi-row INSERT together, so
+    row i gets first_id + i."""
+    rows = [tuple(record.get(column) for column in SCAN_COLUMNS + ("timestamp",)) for record in records]
+    with connection() as conn:
+        # A plain cursor: executemany() rewrites the INSERT into one
+        # multi-row statement, prepared cursors would run it row by row.
+        cursor = conn.cursor()
+        cursor.executemany(INSERT_SCANS, rows)
+        first_id = cursor.lastrowid
+        update_rollups(cursor, first_id, first_id + len(rows) - 1)
+        conn.commit()
+        cursor.close()
+        return first_id
+
+
+def _ids_by_client_id(cursor, client_ids):
+    placeholders = ", ".join(["%s"] * len(client_ids))
+    cursor.execute(f"SELECT client_id, id FROM scans WHERE client_id IN ({placeholders})", tuple(client_ids))
+    return {client_id: scan_id for client_id, scan_id in cursor.fetchall()}
+
+
+def _runs(ids):
+    """(first, last) of each run of consecutive ids in a sorted list."""
+    runs = []
+    for scan_id in ids:
+        if runs and scan_id == runs[-1][1] + 1:
+            runs[-1][1] = scan_id
+        else:
+            runs.append([scan_id, scan_id])
+    return runs
+
+
+def insert_synced_scans(records):
+    """Idempotent bulk insert for scans recorded elsewhere: each record carries
+    SYNCED_SCAN_COLUMNS, including a unique client_id and its UTC timestamp.
+    Records already in scans (a retried batch) are skipped, so they are never
+    inserted or folded into the rollups twice. Returns {client_id: scan id}."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        known = _ids_by_client_id(cursor, [record["client_id"] for record in records])
+        fresh = [record for record in records if record["client_id"] not in known]
+        if fresh:
+            cursor.executemany(INSERT_SYNCED_SCANS,
+                               [tuple(record.get(column) for column in SYNCED_SCAN_COLUMNS) for record in fresh])
+            inserted = _ids_by_client_id(cursor, [record["client_id"] for record in fresh])
+            # Only the ids this statement created, even if other writers' rows interleave
+            for first_id, last_id in _runs(sorted(inserted.values())):
+                update_rollups(cursor, first_id, last_id)
+            known.update(inserted)
+        conn.commit()
+        cursor.close()
+        return known
+
+
+def update_scan_advice(scan_id, advice):
+    """Fills in advice that was generated after the scan was saved."""
+    with connection() as conn:
+        cursor = prepared(conn, UPDATE_SCAN_ADVICE)
+        cursor.execute(UPDATE_SCAN_ADVICE, (advice, scan_id))
+        conn.commit()
+
+
+def fetch_centers():
+    with connection() as conn:
+        cursor = prepared(conn, SELECT_CENTERS, dictionary=True)
+        cursor.execute(SELECT_CENTERS)
+        return cursor.fetchall()
+
+
+def fetch_centers_after(after_id):
+    """Centers with id > after_id, including accepted_materials, for the spatial index."""
+    with connection() as conn:
+        cursor = prepared(conn, SELECT_CENTERS_AFTER, dictionary=True)
+        cursor.execute(SELECT_CENTERS_AFTER, (after_id,))
+        return cursor.fetchall()
+
+
+def centers_version():
+    """(row count, max id, last update) of recycling_centers - cheap change detection."""
+    with connection() as conn:
+        cursor = prepared(conn, SELECT_CENTERS_VERSION)
+        cursor.execute(SELECT_CENTERS_VERSION)
+        count, max_id, updated_at = cursor.fetchone()
+        return count, max_id, updated_at
+
+
+def count_centers_updated(max_id, since):
+    """How many centers with id <= max_id were modified after `since`."""
+    with connection() as conn:
+        cursor = prepared(conn, COUNT_CENTERS_UPDATED)
+        cursor.execute(COUNT_CENTERS_UPDATED, (max_id, since))
+        return cursor.fetchone()[0]
+
+
+@functools.lru_cache(maxsize=None)
+def _history_sql(filters, with_detections=False):
+    # One string object per filter combination, so each combination stays a
+    # single prepared statement on the connection.
+    clauses = {
+        "before_id": "id < %s",
+        "waste_type": "waste_type = %s",
+        "since": "timestamp >= %s",
+        "until": "timestamp < %s",
+        "min_confidence": "confidence >= %s",
+    }
+    where = " AND ".join(clauses[name] for name in filters)
+    return (
+        f"SELECT {HISTORY_COLUMNS}{', detections' if with_detections else ''} FROM scans"
+        + (f" WHERE {where}" if where else "")
+        + " ORDER BY id DESC LIMIT %s"
+    )
+
+
+def fetch_history(limit=10, before_id=None, waste_type=None, since=None, until=None, min_confidence=None,
+                  with_detections=False):
+    """Newest-first page of scans. Keyset pagination: pass the last id of the
+    previous page as before_id, so deep pages cost the same as the first."""
+    filters = {
+        "before_id": before_id,
+        "waste_type": waste_type,
+        "since": since,
+        "until": until,
+        "min_confidence": min_confidence,
+    }
+    names = tuple(name for name, value in filters.items() if value is not None)
+    sql = _history_sql(names, with_detections)
+    with connection() as conn:
+        cursor = prepared(conn, sql, dictionary=True)
+        cursor.execute(sql, tuple(filters[name] for name in names) + (limit,))
+        return cursor.fetchall()
+
+
+def ping():
+    """Runs a real query through the pool; returns its result."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        result = cursor.fetchone()
+        cursor.close()
+        return result[0]
+
+
+def fetch_advice():
+    """Returns {waste category name: (stored recovery protocol, epoch seconds it
+    was generated, or None if unknown)}."""
+    with connection() as conn:
+        cursor = prepared(conn, SELECT_ADVICE)
+        cursor.execute(SELECT_ADVICE)
+        return {name: (protocol, None if fetched_at is None else float(fetched_at))
+                for name, protocol, fetched_at in cursor.fetchall()}
+
+
+def save_advice(waste_type, advice, fetched_at):
+    with connection() as conn:
+        cursor = prepared(conn, UPSERT_ADVICE)
+        cursor.execute(UPSERT_ADVICE, (waste_type, advice, fetched_at))
+        conn.commit()
+
+
+@functools.lru_cache(maxsize=None)
+def _stats_sql(table, filters):
+    clauses = {
+        "waste_type": "waste_type = %s",
+        "since": "bucket >= %s",
+        "until": "bucket < %s",
+        "min_cell_lat": "cell_lat >= %s",
+        "max_cell_lat": "cell_lat <= %s",
+        "min_cell_lon": "cell_lon >= %s",
+        "max_cell_lon": "cell_lon <= %s",
+    }
+    keys = ", ".join(ROLLUPS[table][0])
+    where = " AND ".join(clauses[name] for name in filters)
+    return (
+        f"SELECT {keys}, {ROLLUP_MEASURES} FROM {table}"
+        + (f" WHERE {where}" if where else "")
+        + f" ORDER BY {keys}"
+    )
+
+
+def _fetch_rollup(table, filters):
+    names = tuple(name for name, value in filters.items() if value is not None)
+    sql = _stats_sql(table, names)
+    with connection() as conn:
+        cursor = prepared(conn, sql, dictionary=True)
+        cursor.execute(sql, tuple(filters[name] for name in names))
+        return cursor.fetchall()
+
+
+def fetch_stats(bucket="day", since=None, until=None, waste_type=None):
+    """Rollup rows per (bucket, waste_type), oldest bucket first. `bucket` is
+    "day" or "hour"; since/until select buckets whose start is in [since, until)."""
+    table = "scan_stats_hourly" if bucket == "hour" else "scan_stats_daily"
+    return _fetch_rollup(table, {"waste_type": waste_type, "since": since, "until": until})
+
+
+def fetch_geo_stats(waste_type=None, south=None, west=None, north=None, east=None):
+    """Rollup rows per (STATS_CELL_DEG grid cell, waste_type), optionally within a bbox."""
+    def cell(value):
+        return None if value is None else math.floor(value / STATS_CELL_DEG)
+    return _fetch_rollup("scan_stats_geo", {
+        "waste_type": waste_type,
+        "min_cell_lat": cell(south),
+        "max_cell_lat": cell(north),
+        "min_cell_lon": cell(west),
+        "max_cell_lon": cell(east),
+    })
+
+
+def rebuild_rollups():
+    """Recomputes every rollup table from scans in one transaction. Scan inserts
+    wait on it (the write-behind buffer absorbs that); returns rows folded in."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        for table in ROLLUPS:
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM scans LOCK IN SHARE MODE")
+        count, last_id = cursor.fetchone()
+        update_rollups(cursor, 0, last_id)
+        conn.commit()
+        cursor.close()
+        return count
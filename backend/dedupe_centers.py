@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Removes duplicate recycling centers (same name and address), keeping the
+oldest row of each.
+
+    python dedupe_centers.py            # report how many rows would be removed
+    python dedupe_centers.py --apply    # delete them and add the unique key
+
+schema.upgrade() refuses to add uq_centers_natural_key while duplicates exist,
+so run this (after checking the report) when createdb/init_db say so.
+"""
+import sys
+from db import connection
+from schema import (CENTER_NATURAL_KEY, count_duplicate_centers, dedupe_centers,
+                    ensure_column, ensure_index)
+
+
+def main(apply=False):
+    with connection() as conn:
+        cursor = conn.cursor()
+        ensure_column(cursor, "recycling_centers", "natural_key", CENTER_NATURAL_KEY)
+        duplicates = count_duplicate_centers(cursor)
+        print(f"🔎 {duplicates} duplicate centers (same name and address as an older row)")
+        if duplicates and apply:
+            removed = dedupe_centers(cursor)
+            conn.commit()
+            print(f"🧹 Removed {removed} duplicate centers")
+        elif duplicates:
+            print("   Nothing deleted; re-run with --apply to remove them")
+            cursor.close()
+            return
+        ensure_index(cursor, "recycling_centers", "uq_centers_natural_key", "natural_key", unique=True)
+        cursor.close()
+        print("✅ recycling_centers has a unique (name, address) key")
+
+
+if __name__ == "__main__":
+    main(apply="--apply" in sys.argv[1:])
@@ -0,0 +1,88 @@
+import numpy as np
+
+# --- MULTI-DETECTION RESULTS ---
+# A skip photo usually holds several materials, so /analyze reports every box
+# plus a per-class composition (count, summed area fraction, max/mean
+# confidence). Both come from the boxes arrays in one vectorised pass; the
+# only per-item Python work is per class, or building the JSON list itself.
+# Detections are kept packed: that form goes into the result cache and the
+# scans.detections BLOB, and the composition is recomputed from it on read.
+# Packed layout: a version byte, then 12 bytes per box (little endian uint16):
+# class id, confidence * 65535, and the box corners as fractions of the image
+# width/height * 65535.
+
+PACK_VERSION = 1
+PACKED_BOX = np.dtype([("cls", "<u2"), ("conf", "<u2"), ("xyxy", "<u2", (4,))])
+SCALE = 65535
+
+
+def as_array(values, dtype=np.float32):
+    # torch tensors (ultralytics) or numpy arrays (ONNX/fakes/tiling) -> numpy
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return np.asarray(values, dtype=dtype)
+
+
+def box_arrays(result):
+    """(cls, conf, xyxy) of a Results object, boxes normalised to 0..1."""
+    boxes = result.boxes
+    height, width = result.orig_shape[:2]
+    cls = as_array(boxes.cls).reshape(-1).astype(np.int64)
+    conf = as_array(boxes.conf).reshape(-1)
+    xyxy = as_array(boxes.xyxy).reshape(-1, 4) / np.array([width, height, width, height], dtype=np.float32)
+    return cls, conf, np.clip(xyxy, 0, 1)
+
+
+def pack(cls, conf, xyxy):
+    packed = np.empty(len(conf), dtype=PACKED_BOX)
+    packed["cls"] = cls
+    packed["conf"] = np.rint(np.clip(conf, 0, 1) * SCALE)
+    packed["xyxy"] = np.rint(xyxy * SCALE)
+    return bytes([PACK_VERSION]) + packed.tobytes()
+
+
+def unpack(blob):
+    """(cls, conf, xyxy) from pack(); empty arrays for a missing or unknown blob."""
+    if not blob or blob[0] != PACK_VERSION:
+        return np.zeros(0, np.int64), np.zeros(0, np.float32), np.zeros((0, 4), np.float32)
+    packed = np.frombuffer(bytes(blob), dtype=PACKED_BOX, offset=1)
+    return (packed["cls"].astype(np.int64),
+            packed["conf"].astype(np.float32) / SCALE,
+            packed["xyxy"].astype(np.float32) / SCALE)
+
+
+def class_name(names, class_id):
+    return names.get(class_id, str(class_id)) if names else str(class_id)
+
+
+def composition(cls, conf, xyxy, names):
+    """Per class: count, summed box area as a fraction of the image (overlapping
+    boxes count twice), max and mean confidence. Largest share first."""
+    if len(conf) == 0:
+        return {}
+    ids, group = np.unique(cls, return_inverse=True)
+    counts = np.bincount(group)
+    areas = np.bincount(group, weights=(xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1]))
+    mean_conf = np.bincount(group, weights=conf) / counts
+    max_conf = np.zeros(len(ids), dtype=np.float32)
+    np.maximum.at(max_conf, group, conf)
+    order = np.argsort(-areas, kind="stable")
+    return {
+        class_name(names, int(ids[i])): {
+            "count": int(counts[i]),
+            "area_fraction": round(float(areas[i]), 4),
+            "max_confidence": round(float(max_conf[i]), 4),
+            "mean_confidence": round(float(mean_conf[i]), 4),
+        }
+        for i in order
+    }
+
+
+def describe(blob, names):
+    """Every box (most confident first) and the composition of a packed blob."""
+    cls, conf, xyxy = unpack(blob)
+    boxes = [
+        {"waste_type": class_name(names, class_id), "confidence": round(score, 4), "box": [round(v, 4) for v in box]}
+        for class_id, score, box in zip(cls.tolist(), conf.tolist(), xyxy.tolist())
+    ]
+    return {"detections": boxes, "composition": composition(cls, conf, xyxy, names)}
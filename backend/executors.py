@@ -0,0 +1,54 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# --- EXECUTION MODEL ---
+# The event loop only awaits. Anything that blocks runs on one of three
+# bounded pools so a slow scan can't stall /health or /centers:
+#   * inference: CPU-bound YOLO forward passes. Torch releases the GIL and
+#     already spreads one pass over its intra-op threads, so a small pool
+#     keeps cores busy without oversubscribing them. Each inference thread
+#     runs its own model replica (see main.start_model), so raising
+#     INFERENCE_WORKERS also multiplies the model's memory.
+#   * preprocess: decoding uploads. Pillow releases the GIL while decoding,
+#     so these run in parallel with each other and with inference.
+#   * io: Gemini calls and MySQL queries, which mostly wait on the network.
+
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(os.cpu_count() or 2)))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "16"))
+
+inference_pool = ThreadPoolExecutor(max_workers=max(1, INFERENCE_WORKERS), thread_name_prefix="inference")
+preprocess_pool = ThreadPoolExecutor(max_workers=max(1, PREPROCESS_WORKERS), thread_name_prefix="preprocess")
+io_pool = ThreadPoolExecutor(max_workers=max(1, IO_WORKERS), thread_name_prefix="io")
+
+
+async def run_inference(fn, *args, **kwargs):
+    """Run a CPU-bound call on the inference pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(inference_pool, functools.partial(fn, *args, **kwargs))
+
+
+async def run_preprocess(fn, *args, **kwargs):
+    """Run image decoding/resizing on the preprocess pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(preprocess_pool, functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking network/DB call on the I/O pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_pool, functools.partial(fn, *args, **kwargs))
+
+
+def stats():
+    """Per pool: worker count and tasks waiting for a worker (saturation)."""
+    pools = {"inference": inference_pool, "preprocess": preprocess_pool, "io": io_pool}
+    return {name: {"workers": pool._max_workers, "queued": pool._work_queue.qsize()} for name, pool in pools.items()}
+
+
+def shutdown(wait=True):
+    inference_pool.shutdown(wait=wait)
+    preprocess_pool.shutdown(wait=wait)
+    io_pool.shutdown(wait=wait)
@@ -1,48 +1,196 @@
 # -*- coding: utf-8 -*-
 import os
-import google.generativeai as genai
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+import time
+import asyncio
+import functools
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app) # Allows your React frontend to talk to this API
+# --- CONFIG ---
+# Every upstream call is bounded: at most GEMINI_MAX_CONCURRENCY run at once,
+# and a request that hasn't been answered within GEMINI_TIMEOUT_SECONDS
+# (queueing for a slot included) gets the canned protocol instead, still
+# answered with a 500 and status LINK_OFFLINE so callers can tell it apart.
+GEMINI_MODEL = os.getenv("GEMINI_ADVICE_MODEL", "gemini-1.5-flash")
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "4"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+# Circuit breaker: after this many consecutive failures stop calling Gemini
+# for GEMINI_BREAKER_RESET_SECONDS, then let a single probe through
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.getenv("GEMINI_BREAKER_RESET_SECONDS", "30"))
+
+app = FastAPI(title="SCWM Gemini Advice")
+
+app.add_middleware(
+    CORSMiddleware,  # Allows your React frontend to talk to this API
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 
 # 1. Configure Gemini
 # Ensure your .env file has: GEMINI_API_KEY=your_actual_key_here
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-1.5-flash')
+@functools.lru_cache(maxsize=1)
+def get_gemini_client():
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("⚠️ GEMINI_API_KEY not set - serving canned protocols only")
+        return None
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+
+# --- CANNED PROTOCOLS ---
+# Served when Gemini is slow, failing, or not configured
+FALLBACK_PROTOCOLS = {
+    "concrete": "ANALYSIS: Crush on-site to graded recycled aggregate for sub-base and non-structural concrete. Separate rebar magnetically for steel recovery. Each tonne reused offsets virgin quarrying and cuts haul emissions.",
+    "brick": "ANALYSIS: Clean and salvage intact units for reuse; crush broken fractions into fill or brick-aggregate. Keep free of gypsum and timber to preserve recovery grade.",
+    "metal": "ANALYSIS: Segregate ferrous and non-ferrous streams at source. Route to authorised scrap recovery for smelting; recycled steel cuts embodied carbon by over half versus virgin ore.",
+    "wood": "ANALYSIS: Denail and grade clean timber for reuse or engineered board feedstock. Treated or painted wood goes to licensed energy recovery, never open burning.",
+    "tile": "ANALYSIS: Crush ceramic and tile waste into fine aggregate for pavers and bedding layers. Keep separate from gypsum to avoid sulphate contamination.",
+    "plastic": "ANALYSIS: Bale clean pipes, sheeting and packaging by polymer type for mechanical recycling. Contaminated fractions go to authorised co-processing.",
+}
+DEFAULT_PROTOCOL = "ANALYSIS: Segregate {material} at source, keep it clean and dry, and route it to the nearest authorised C&D recycling facility in {location} for recovery as secondary material."
+
+
+def fallback_protocol(material, location):
+    key = material.lower()
+    for name, protocol in FALLBACK_PROTOCOLS.items():
+        if name in key:
+            return protocol
+    return DEFAULT_PROTOCOL.format(material=material, location=location)
+
+
+# --- CIRCUIT BREAKER ---
+class CircuitBreaker:
+    """closed -> (N failures) -> open -> (reset timeout) -> half-open: one probe decides."""
+
+    def __init__(self, failures=GEMINI_BREAKER_FAILURES, reset_seconds=GEMINI_BREAKER_RESET_SECONDS):
+        self.max_failures = max(1, failures)
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            print("✅ Gemini circuit closed")
+        self.failures, self.opened_at, self.probing = 0, None, False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.max_failures:
+            if self.opened_at is None or self.probing:
+                print(f"⚠️ Gemini circuit open for {self.reset_seconds:g}s after {self.failures} failures")
+            self.opened_at, self.probing = time.monotonic(), False
 
-@app.route('/api/gemini-advice', methods=['POST'])
-def get_advice():
-    try:
-        data = request.json
-        material = data.get('material', 'unknown')
-        location = data.get('city', 'India')
 
-        # 2. Futuristic Prompt Engineering
-        prompt = f"""
+breaker = CircuitBreaker()
+upstream_slots = asyncio.Semaphore(max(1, GEMINI_MAX_CONCURRENCY))
+# Identical prompts already on their way to Gemini: key -> Task
+in_flight = {}
+
+
+def build_prompt(material, location):
+    # 2. Futuristic Prompt Engineering
+    return f"""
         Role: Futuristic Sustainability AI Architect.
         Context: Construction & Demolition (C&D) waste management in {location}.
         Target Material: {material}.
-        
+
         Task: Provide a high-tech, actionable recycling protocol (max 45 words).
         Focus on: Industrial reuse, carbon offset potential, or recovery tech.
-        Tone: Cyberpunk, clinical, and innovative. 
+        Tone: Cyberpunk, clinical, and innovative.
         Start with 'ANALYSIS:'
         """
 
-        response = model.generate_content(prompt)
-        
-        return jsonify({
-            "advice": response.text.strip(),
-            "status": "NEURAL_LINK_ACTIVE"
-        })
 
+async def call_gemini(client, prompt):
+    async with upstream_slots:
+        response = await client.aio.models.generate_content(model=GEMINI_MODEL, contents=prompt)
+    return response.text.strip()
+
+
+async def fetch_advice(client, material, location):
+    """One bounded upstream call; feeds the breaker. Returns advice text or None."""
+    try:
+        advice = await asyncio.wait_for(call_gemini(client, build_prompt(material, location)), GEMINI_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        print(f"⚠️ Gemini timed out after {GEMINI_TIMEOUT_SECONDS:g}s ({material}, {location})")
+        breaker.record_failure()
+        return None
     except Exception as e:
-        return jsonify({"advice": f"System Error: {str(e)}", "status": "LINK_OFFLINE"}), 500
+        print(f"⚠️ Gemini call failed ({material}, {location}): {e}")
+        breaker.record_failure()
+        return None
+    breaker.record_success()
+    return advice or None
+
+
+async def get_advice_text(material, location):
+    """Live advice, or None. Concurrent requests for the same prompt share one call."""
+    client = get_gemini_client()
+    if client is None:
+        return None
+    key = (material.strip().lower(), location.strip().lower())
+    task = in_flight.get(key)
+    if task is None:
+        if not breaker.allow():
+            return None
+        task = asyncio.ensure_future(fetch_advice(client, material, location))
+        in_flight[key] = task
+        task.add_done_callback(lambda _: in_flight.pop(key, None))
+    # shield: a client disconnecting must not cancel the call others are waiting on
+    return await asyncio.shield(task)
+
+
+class AdviceRequest(BaseModel):
+    material: str = "unknown"
+    city: str = "India"
+
+
+@app.post("/api/gemini-advice")
+async def get_advice(data: AdviceRequest):
+    advice = await get_advice_text(data.material, data.city)
+    if advice is None:
+        return JSONResponse({"advice": fallback_protocol(data.material, data.city), "status": "LINK_OFFLINE"},
+                            status_code=500)
+    return {"advice": advice, "status": "NEURAL_LINK_ACTIVE"}
+
+
+@app.get("/health")
+def health():
+    return {
+        "status": "online",
+        "gemini_configured": get_gemini_client() is not None,
+        "circuit": breaker.state,
+        "in_flight": len(in_flight),
+    }
+
 
 if __name__ == "__main__":
-    app.run(port=5001, debug=True)
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=5001)
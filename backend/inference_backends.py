@@ -0,0 +1,205 @@
+import os
+import glob
+import time
+from preprocess import INFERENCE_IMGSZ, decode_image
+
+# --- INFERENCE BACKENDS ---
+# best.pt can be served as-is by PyTorch or exported once to a CPU-optimised
+# runtime. Ultralytics runs every format behind the same YOLO() interface, so
+# the rest of the backend doesn't care which one is loaded.
+#   torch     PyTorch eager (default)
+#   onnx      ONNX Runtime; INT8 via onnxruntime static quantization
+#   openvino  OpenVINO IR; INT8 via NNCF post-training quantization
+# Exported models are written next to the weights and reused on later starts
+# as long as they are newer than the weights.
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+MODEL_PATH = os.getenv("MODEL_PATH", "best.pt")
+INFERENCE_INT8 = os.getenv("INFERENCE_INT8", "0") == "1"
+# ONNX: a directory of images. OpenVINO: a dataset YAML (as used for training).
+INT8_CALIBRATION_DATA = os.getenv("INT8_CALIBRATION_DATA")
+INT8_CALIBRATION_IMAGES = int(os.getenv("INT8_CALIBRATION_IMAGES", "300"))
+# Intra-op threads for the model (torch, ONNX Runtime and OpenVINO on CPU);
+# 0 leaves the runtime's default (all cores)
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))
+# Dummy forward passes run at startup so the first real request doesn't pay
+# for lazy initialisation (graph optimisation, allocator growth, kernel picks)
+MODEL_WARMUP_RUNS = int(os.getenv("MODEL_WARMUP_RUNS", "2"))
+
+BACKENDS = ("torch", "onnx", "openvino")
+
+
+def _is_fresh(artifact, weights):
+    return os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(weights)
+
+
+def export_model(backend=INFERENCE_BACKEND, weights=MODEL_PATH, imgsz=INFERENCE_IMGSZ,
+                 int8=INFERENCE_INT8, calibration=INT8_CALIBRATION_DATA):
+    """Returns the path to load for `backend`, exporting/quantizing best.pt if needed."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' (expected one of {', '.join(BACKENDS)})")
+    if backend == "torch":
+        return weights
+
+    stem = os.path.splitext(weights)[0]
+    if backend == "openvino":
+        target = f"{stem}_int8_openvino_model" if int8 else f"{stem}_openvino_model"
+        if _is_fresh(target, weights):
+            return target
+        if int8 and not calibration:
+            raise ValueError("INT8 OpenVINO export needs INT8_CALIBRATION_DATA (dataset YAML)")
+        from ultralytics import YOLO
+        print(f"📦 Exporting {weights} to OpenVINO{' INT8' if int8 else ''}...")
+        return YOLO(weights).export(format="openvino", imgsz=imgsz, dynamic=True, int8=int8, data=calibration)
+
+    fp32 = f"{stem}.onnx"
+    if not _is_fresh(fp32, weights):
+        from ultralytics import YOLO
+        print(f"📦 Exporting {weights} to ONNX...")
+        fp32 = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    if not int8:
+        return fp32
+    target = f"{stem}_int8.onnx"
+    if not _is_fresh(target, fp32):
+        if not calibration or not os.path.isdir(calibration):
+            raise ValueError("INT8 ONNX quantization needs INT8_CALIBRATION_DATA (image directory)")
+        quantize_onnx(fp32, target, calibration, imgsz)
+    return target
+
+
+def _letterbox_array(path, imgsz):
+    """Image -> 1x3xHxW float32 in [0, 1], padded like Ultralytics' letterbox."""
+    import numpy as np
+    from PIL import Image
+    with open(path, "rb") as f:
+        image = decode_image(f, imgsz)
+    canvas = Image.new("RGB", (imgsz, imgsz), (114, 114, 114))
+    canvas.paste(image, ((imgsz - image.width) // 2, (imgsz - image.height) // 2))
+    return (np.asarray(canvas, dtype=np.float32) / 255.0).transpose(2, 0, 1)[None]
+
+
+def calibration_images(directory, limit=INT8_CALIBRATION_IMAGES):
+    files = []
+    for pattern in ("*.jpg", "*.jpeg", "*.png"):
+        files.extend(glob.glob(os.path.join(directory, "**", pattern), recursive=True))
+    return sorted(files)[:limit]
+
+
+def quantize_onnx(fp32_path, int8_path, calibration_dir, imgsz=INFERENCE_IMGSZ):
+    """Static INT8 quantization (QDQ, per-channel weights) calibrated on site photos."""
+    import onnxruntime
+    from onnxruntime.quantization import quantize_static, CalibrationDataReader, QuantFormat, QuantType
+
+    files = calibration_images(calibration_dir)
+    if not files:
+        raise ValueError(f"No calibration images found in {calibration_dir}")
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class SitePhotoReader(CalibrationDataReader):
+        def __init__(self):
+            self._files = iter(files)
+
+        def get_next(self):
+            path = next(self._files, None)
+            return None if path is None else {input_name: _letterbox_array(path, imgsz)}
+
+    print(f"⚖️ Quantizing {fp32_path} to INT8 with {len(files)} calibration images...")
+    quantize_static(
+        fp32_path, int8_path, SitePhotoReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    return int8_path
+
+
+def pin_threads(threads):
+    """Sets torch's intra-op thread count (0 leaves the default)."""
+    if threads <= 0:
+        return
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _runtime(model):
+    """The object holding the runtime session: the predictor's AutoBackend, or
+    on newer Ultralytics the format backend inside it."""
+    from PIL import Image
+    model(Image.new("RGB", (32, 32)), verbose=False)  # creates the predictor and its session
+    backend = model.predictor.model
+    return getattr(backend, "backend", backend)
+
+
+def _pin_onnx_threads(model, path, threads):
+    """Ultralytics builds its ONNX Runtime session with default options; swap
+    in one limited to `threads` intra-op threads."""
+    if threads <= 0:
+        return
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    backend = _runtime(model)
+    backend.session = onnxruntime.InferenceSession(path, options, providers=backend.session.get_providers())
+
+
+def _pin_openvino_threads(model, path, threads):
+    """Ultralytics compiles OpenVINO models with only a LATENCY hint, which
+    spreads one inference over every core; recompile with INFERENCE_NUM_THREADS."""
+    if threads <= 0:
+        return
+    import functools
+    import openvino
+    backend = _runtime(model)
+    devices = backend.ov_compiled_model.get_property("EXECUTION_DEVICES")
+    if any(not device.startswith("CPU") for device in devices):
+        print(f"⚠️ INFERENCE_THREADS={threads} only applies to OpenVINO on CPU; running on {', '.join(devices)}")
+        return
+    xml = path if path.endswith(".xml") else glob.glob(os.path.join(path, "*.xml"))[0]
+    core = openvino.Core()
+    config = {"PERFORMANCE_HINT": "LATENCY", "INFERENCE_NUM_THREADS": threads}
+    backend.ov_compiled_model = core.compile_model(core.read_model(xml), "CPU", config)
+    if hasattr(backend, "compile_model"):
+        # Newer Ultralytics recompiles per input shape for some INT8 models
+        backend.compile_model = functools.partial(core.compile_model, device_name="CPU", config=config)
+
+
+def load_model(backend=INFERENCE_BACKEND, weights=MODEL_PATH, imgsz=INFERENCE_IMGSZ,
+               int8=INFERENCE_INT8, threads=INFERENCE_THREADS):
+    """Loads the detector for the configured backend. Raises if it can't."""
+    from ultralytics import YOLO
+    pin_threads(threads)
+    path = export_model(backend, weights, imgsz, int8)
+    model = YOLO(path, task="detect")
+    if backend == "onnx":
+        _pin_onnx_threads(model, path, threads)
+    elif backend == "openvino":
+        _pin_openvino_threads(model, path, threads)
+    label = f"{backend}{' int8' if int8 and backend != 'torch' else ''}"
+    print(f"✅ YOLO model loaded: {path} ({label}, imgsz={imgsz}, threads={threads or 'default'})")
+    return model
+
+
+def warm_up(model, runs=MODEL_WARMUP_RUNS, imgsz=INFERENCE_IMGSZ):
+    """Runs `runs` predictions on a blank full-size frame; returns the last one's ms."""
+    from PIL import Image
+    blank = Image.new("RGB", (imgsz, imgsz), (114, 114, 114))
+    elapsed = 0.0
+    for _ in range(max(0, runs)):
+        start = time.perf_counter()
+        model(blank, imgsz=imgsz, verbose=False)
+        elapsed = (time.perf_counter() - start) * 1000
+    return elapsed
+
+
+def time_predictions(model, images, imgsz=INFERENCE_IMGSZ, warmup=3):
+    """Per-image latency in ms for `images` (PIL), after a few warm-up runs."""
+    for image in images[:warmup]:
+        model(image, imgsz=imgsz, verbose=False)
+    latencies = []
+    for image in images:
+        start = time.perf_counter()
+        model(image, imgsz=imgsz, verbose=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
@@ -1,6 +1,8 @@
+import sys
 import mysql.connector
 from mysql.connector import Error
 import json
+from schema import upgrade, SchemaUpgradeError
 
 # Connection Config for AWS RDS MySQL
 DB_CONFIG = {
@@ -70,6 +72,9 @@ def init_db():
             );
         """)
 
+        # Bring tables created by older versions up to date
+        upgrade(cur)
+
         conn.commit()
         
         # --- SEED DATA ---
@@ -100,6 +105,9 @@ def init_db():
         print(f"Error Code: {e.errno}")
         print(f"Message: {e.msg}")
         print("Tips: Check AWS Security Group (Port 3306) and Public Accessibility.")
+    except SchemaUpgradeError as e:
+        print(f"\n❌ SCHEMA UPGRADE STOPPED: {e}")
+        sys.exit(1)
     except Exception as e:
         print(f"\n❌ GENERIC ERROR: {e}")
     finally:
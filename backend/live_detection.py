@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+from fastapi import WebSocketDisconnect
+from preprocess import decode_bytes, image_signature, hamming, ImageRejected
+from executors import run_preprocess, run_io
+from batcher import QueueFull
+
+# --- LIVE CAMERA DETECTION ---
+# A site camera sends encoded frames (JPEG/PNG) over a WebSocket. Only the
+# newest frame is ever waiting: frames that arrive while the previous one is
+# still being analyzed replace it, so a slow server drops frames instead of
+# building a backlog. Frames that look the same as the last analyzed one
+# (perceptual hash within STREAM_REUSE_DISTANCE bits) reuse its result.
+# Detections are aggregated per class and saved as one scan row per class
+# every STREAM_PERSIST_SECONDS, not one row per frame.
+
+STREAM_MAX_FPS = float(os.getenv("STREAM_MAX_FPS", "5"))
+STREAM_REUSE_DISTANCE = int(os.getenv("STREAM_REUSE_DISTANCE", "4"))
+STREAM_PERSIST_SECONDS = float(os.getenv("STREAM_PERSIST_SECONDS", "60"))
+STREAM_MIN_CONFIDENCE = float(os.getenv("STREAM_MIN_CONFIDENCE", "0.25"))
+
+
+class LiveDetectionSession:
+    def __init__(self, websocket, predict, summarize, advice_for, save_scan):
+        self.websocket = websocket
+        self.predict = predict          # async image -> ultralytics Results
+        self.summarize = summarize      # Results -> (class name, confidence)
+        self.advice_for = advice_for    # class name -> advice text
+        self.save_scan = save_scan      # blocking record -> ref
+        self._latest = None
+        self._arrived = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+        self.analyzed = 0
+        self.reused = 0
+        self._last_hash = None
+        self._last_detection = None
+        self._totals = {}  # class -> [frames, confidence sum]
+        self._last_persist = time.monotonic()
+
+    async def run(self):
+        receiver = asyncio.ensure_future(self._receive())
+        try:
+            await self._process()
+        finally:
+            receiver.cancel()
+            await self._persist()
+
+    async def _receive(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                data = message.get("bytes")
+                if not data:
+                    continue  # text/control messages are ignored
+                self.received += 1
+                if self._latest is not None:
+                    self.dropped += 1  # never analyzed, superseded by a newer frame
+                self._latest = (self.received, data)
+                self._arrived.set()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self._closed = True
+            self._arrived.set()
+
+    async def _process(self):
+        min_interval = 1.0 / STREAM_MAX_FPS if STREAM_MAX_FPS > 0 else 0.0
+        last_started = 0.0
+        while True:
+            await self._arrived.wait()
+            self._arrived.clear()
+            if self._closed:
+                return
+            # Cap the analysis rate; frames arriving meanwhile keep replacing _latest
+            wait = last_started + min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                if self._closed:
+                    return
+            latest, self._latest = self._latest, None
+            if latest is None:
+                continue
+            sequence, frame = latest
+            last_started = time.monotonic()
+
+            try:
+                reply = await self._analyze(frame)
+            except ImageRejected as e:
+                reply = {"error": str(e)}
+            except QueueFull:
+                # Inference is saturated: drop this frame like any other skipped one
+                self.dropped += 1
+                continue
+            reply.update(frame=sequence, dropped=self.dropped)
+            try:
+                await self.websocket.send_json(reply)
+            except Exception:
+                return  # client is gone
+
+            if time.monotonic() - self._last_persist >= STREAM_PERSIST_SECONDS:
+                await self._persist()
+
+    async def _analyze(self, frame):
+        image = await run_preprocess(decode_bytes, frame)
+        signature = await run_preprocess(image_signature, image)
+        if (signature is not None and self._last_hash is not None
+                and hamming(signature, self._last_hash) <= STREAM_REUSE_DISTANCE):
+            self.reused += 1
+            detected_class, confidence = self._last_detection
+            reused = True
+        else:
+            result = await self.predict(image)
+            detected_class, confidence = self.summarize(result)
+            self._last_hash, self._last_detection = signature, (detected_class, confidence)
+            self.analyzed += 1
+            reused = False
+
+        if detected_class != "Unknown" and confidence >= STREAM_MIN_CONFIDENCE:
+            totals = self._totals.setdefault(detected_class, [0, 0.0])
+            totals[0] += 1
+            totals[1] += confidence
+        return {"waste_type": detected_class, "confidence": confidence, "reused": reused}
+
+    async def _persist(self):
+        """Saves one scan per detected class with its mean confidence over the window."""
+        totals, self._totals = self._totals, {}
+        self._last_persist = time.monotonic()
+        for detected_class, (frames, confidence_sum) in totals.items():
+            record = {
+                "waste_type": detected_class,
+                "confidence": confidence_sum / frames,
+                "gemini_advice": self.advice_for(detected_class),
+            }
+            try:
+                await run_io(self.save_scan, record)
+            except Exception as e:
+                print(f"⚠️ Could not save live detection for {detected_class}: {e}")
+        if totals:
+            print(f"📹 Live session saved {len(totals)} classes "
+                  f"({self.analyzed} analyzed, {self.reused} reused, {self.dropped} dropped)")
@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+"""Loads recycling centers from CSV or GeoJSON files into recycling_centers.
+
+    python load_centers.py data/centers_india.csv              # upsert (append)
+    python load_centers.py registry.geojson --mode replace     # swap in a new map
+    python load_centers.py big.csv --method infile             # LOAD DATA LOCAL INFILE
+    python load_centers.py --dedupe-existing --merge-nearby-m 50 --dry-run
+                                                               # report same-name pins within 50 m
+
+Files are streamed, so their size doesn't matter. CSV needs name, address,
+latitude and longitude columns (lat/lon/lng also work); contact_info and
+accepted_materials (";"-separated) are optional. GeoJSON may be a
+FeatureCollection (streamed with ijson when it's installed) or one Feature
+per line (.geojsonl/.ndjson), with Point geometries.
+
+Rows are upserted on their natural key (name + address, case-insensitive);
+only rows with the same name and address are the same center. Sources with
+real coordinates can also merge a row into a same-name center within
+--merge-nearby-m meters (off by default: the bundled data gives distinct
+facilities the same placeholder coordinates). Each merge is listed, so run
+with --dry-run first.
+  append   upserts in --chunk-size transactions; the map stays live and the
+           backend's spatial index picks the changes up on its next sync.
+  replace  loads into recycling_centers_next and atomically renames it over
+           recycling_centers, so readers never see a half-loaded table.
+"""
+import os
+import csv
+import json
+import math
+import time
+import argparse
+import tempfile
+from contextlib import contextmanager
+import db
+from spatial_index import haversine_km
+
+# Merge same-name centers closer than this even if their addresses differ; 0 = off
+CENTERS_DEDUPE_METERS = float(os.getenv("CENTERS_DEDUPE_METERS", "0"))
+CENTERS_CHUNK_SIZE = int(os.getenv("CENTERS_CHUNK_SIZE", "5000"))
+
+TABLE = "recycling_centers"
+STAGING_TABLE = "recycling_centers_next"
+RETIRED_TABLE = "recycling_centers_old"
+COLUMNS = ("name", "address", "latitude", "longitude", "contact_info", "accepted_materials")
+ON_DUPLICATE = (
+    "ON DUPLICATE KEY UPDATE latitude = VALUES(latitude), longitude = VALUES(longitude), "
+    "contact_info = COALESCE(VALUES(contact_info), contact_info), "
+    "accepted_materials = COALESCE(VALUES(accepted_materials), accepted_materials)"
+)
+
+METERS_PER_DEGREE = 111_320
+
+
+# --- READING ---
+
+def _first(record, *names):
+    for name in names:
+        value = record.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _materials(raw):
+    """accepted_materials as a JSON array string, or None."""
+    if raw in (None, ""):
+        return None
+    if isinstance(raw, str):
+        raw = raw.split(";")
+    materials = [str(m).strip() for m in raw if str(m).strip()]
+    return json.dumps(materials) if materials else None
+
+
+def _center(record, lat, lon):
+    """Normalised center tuple (COLUMNS order), or None if it can't be used."""
+    name = (_first(record, "name") or "").strip()
+    address = (_first(record, "address") or "").strip()
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not name or not address or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    contact = _first(record, "contact_info", "contact", "phone")
+    return (name[:255], address, lat, lon, str(contact).strip()[:255] if contact else None,
+            _materials(_first(record, "accepted_materials", "materials")))
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            row = {(k or "").strip().lower(): v for k, v in row.items()}
+            yield _center(row, _first(row, "latitude", "lat"), _first(row, "longitude", "lon", "lng"))
+
+
+def _feature_center(feature):
+    geometry = feature.get("geometry") or {}
+    if geometry.get("type") != "Point" or len(geometry.get("coordinates") or ()) < 2:
+        return None
+    lon, lat = geometry["coordinates"][:2]
+    return _center(feature.get("properties") or {}, lat, lon)
+
+
+def read_geojson(path):
+    if path.lower().endswith((".geojsonl", ".ndjson", ".jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip().lstrip("\x1e")  # RFC 8142 record separators
+                if line:
+                    yield _feature_center(json.loads(line))
+        return
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+    with open(path, "rb") as f:
+        if ijson is None:
+            print("⚠️ ijson not installed; reading the whole GeoJSON file into memory")
+            features = json.load(f).get("features", [])
+        else:
+            features = ijson.items(f, "features.item", use_float=True)
+        for feature in features:
+            yield _feature_center(feature)
+
+
+def read_centers(path):
+    if path.lower().endswith(".csv"):
+        return read_csv(path)
+    if path.lower().endswith((".geojson", ".json", ".geojsonl", ".ndjson", ".jsonl")):
+        return read_geojson(path)
+    raise ValueError(f"Don't know how to read {path} (expected .csv or .geojson)")
+
+
+# --- DEDUPLICATION ---
+
+def natural_key(name, address):
+    # Mirrors the natural_key column: LOWER(TRIM(name)) | LOWER(TRIM(address))
+    return f"{name.strip(' ').lower()}|{address.strip(' ').lower()}"
+
+
+class Deduper:
+    """Finds a known center with the same name within `tolerance_m` meters."""
+
+    def __init__(self, tolerance_m=CENTERS_DEDUPE_METERS):
+        self.tolerance_km = tolerance_m / 1000
+        self.cell_deg = max(tolerance_m, 1) / METERS_PER_DEGREE
+        self._cells = {}  # (name, cell_lat, cell_lon) -> [(lat, lon, natural key, name, address)]
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def add(self, name, address, lat, lon):
+        if self.tolerance_km <= 0:
+            return
+        cell_lat, cell_lon = self._cell(lat, lon)
+        entry = (lat, lon, natural_key(name, address), name, address)
+        self._cells.setdefault((name.strip().lower(), cell_lat, cell_lon), []).append(entry)
+
+    def match(self, name, lat, lon):
+        """(natural key, name, address) of the closest same-name center within tolerance, or None."""
+        if self.tolerance_km <= 0:
+            return None
+        folded = name.strip().lower()
+        cell_lat, cell_lon = self._cell(lat, lon)
+        # A degree of longitude shrinks towards the poles, so look further east/west
+        span = min(1000, math.ceil(1 / max(math.cos(math.radians(lat)), 1e-3)))
+        best, best_km = None, self.tolerance_km
+        for dlat in (-1, 0, 1):
+            for dlon in range(-span, span + 1):
+                for entry in self._cells.get((folded, cell_lat + dlat, cell_lon + dlon), ()):
+                    km = haversine_km(lat, lon, entry[0], entry[1])
+                    if km <= best_km:
+                        best, best_km = entry[2:], km
+        return best
+
+
+def unique_centers(rows, deduper, stats, known=None, merges=None):
+    """Drops unusable rows and duplicates. A row the deduper matches to a
+    nearby center is rewritten to that center's name and address, so the
+    upsert updates it; each such merge is appended to `merges` as
+    (name, address, merged-into address)."""
+    known = known if known is not None else set()
+    emitted = set()
+    for row in rows:
+        stats["read"] += 1
+        if row is None:
+            stats["rejected"] += 1
+            continue
+        name, address, lat, lon = row[:4]
+        key = natural_key(name, address)
+        if key not in known and key not in emitted:
+            match = deduper.match(name, lat, lon)
+            if match is not None:
+                stats["merged"] += 1
+                if merges is not None:
+                    merges.append((name, address, match[2]))
+                key, name, address = match
+                row = (name, address) + row[2:]
+        if key in emitted:
+            stats["duplicates"] += 1
+            continue
+        if key not in known:
+            deduper.add(name, address, lat, lon)
+        emitted.add(key)
+        yield row
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- WRITING ---
+
+@contextmanager
+def loader_connection(method):
+    if method != "infile":
+        with db.connection() as conn:
+            yield conn
+        return
+    import mysql.connector
+    # LOAD DATA LOCAL needs the client-side opt-in (and local_infile=ON on the server)
+    conn = mysql.connector.connect(**db.db_config(), allow_local_infile=True)
+    try:
+        yield conn
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def insert_chunks(conn, table, rows, chunk_size, stats):
+    """Upserts `rows` with one multi-row INSERT per chunk, committing each."""
+    sql = (f"INSERT INTO {table} ({', '.join(COLUMNS)}) VALUES ({', '.join(['%s'] * len(COLUMNS))}) "
+           + ON_DUPLICATE)
+    cursor = conn.cursor()
+    for chunk in _chunks(rows, chunk_size):
+        cursor.executemany(sql, chunk)
+        conn.commit()
+        stats["written"] += len(chunk)
+        print(f"   ... {stats['written']} centers written")
+    cursor.close()
+
+
+def _tsv_field(value):
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def load_infile(conn, table, rows, stats):
+    """Spools `rows` to a TSV file, bulk-loads it with LOAD DATA LOCAL INFILE
+    into a temporary table and upserts from there in one statement."""
+    with tempfile.NamedTemporaryFile("w", suffix=".tsv", encoding="utf-8", newline="", delete=False) as f:
+        spool = f.name
+        for row in rows:
+            f.write("\t".join(_tsv_field(value) for value in row) + "\n")
+            stats["written"] += 1
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "CREATE TEMPORARY TABLE centers_load (name VARCHAR(255) NOT NULL, address TEXT NOT NULL, "
+            "latitude FLOAT NOT NULL, longitude FLOAT NOT NULL, contact_info VARCHAR(255), accepted_materials JSON)"
+        )
+        cursor.execute(
+            "LOAD DATA LOCAL INFILE %s INTO TABLE centers_load CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+            f"({', '.join(COLUMNS)})",
+            (spool,)
+        )
+        cursor.execute(f"INSERT INTO {table} ({', '.join(COLUMNS)}) SELECT {', '.join(COLUMNS)} FROM centers_load "
+                       + ON_DUPLICATE)
+        cursor.execute("DROP TEMPORARY TABLE centers_load")
+        conn.commit()
+        cursor.close()
+    finally:
+        os.remove(spool)
+
+
+def existing_centers(conn, deduper):
+    """Registers every stored center with the deduper; returns their natural keys."""
+    known = set()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT name, address, latitude, longitude FROM {TABLE}")
+    for name, address, lat, lon in cursor:
+        deduper.add(name, address, lat, lon)
+        known.add(natural_key(name, address))
+    cursor.close()
+    return known
+
+
+def load_centers(paths, mode="append", method="insert", tolerance_m=CENTERS_DEDUPE_METERS,
+                 chunk_size=CENTERS_CHUNK_SIZE, dry_run=False):
+    """Loads every file in `paths`; returns counts of rows read/rejected/duplicate/written."""
+    if mode not in ("append", "replace"):
+        raise ValueError(f"Unknown mode '{mode}'")
+    start = time.perf_counter()
+    stats = {"read": 0, "rejected": 0, "duplicates": 0, "merged": 0, "written": 0}
+    deduper = Deduper(tolerance_m)
+    merges = []
+
+    def rows(known):
+        for path in paths:
+            print(f"📥 Reading {path}...")
+            yield from unique_centers(read_centers(path), deduper, stats, known, merges)
+
+    with loader_connection(method) as conn:
+        known = existing_centers(conn, deduper) if mode == "append" else set()
+        if dry_run:
+            for _ in rows(known):
+                stats["written"] += 1
+            for name, address, into in merges:
+                print(f"   would merge {name}, {address} into {into}")
+            print(f"🔍 Dry run: {stats}")
+            return stats
+
+        cursor = conn.cursor()
+        table = TABLE
+        if mode == "replace":
+            table = STAGING_TABLE
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            cursor.execute(f"CREATE TABLE {STAGING_TABLE} LIKE {TABLE}")
+
+        if method == "infile":
+            load_infile(conn, table, rows(known), stats)
+        else:
+            insert_chunks(conn, table, rows(known), chunk_size, stats)
+
+        if mode == "replace":
+            if not stats["written"]:
+                cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+                raise ValueError("No usable centers in the input; keeping the current table")
+            # One atomic RENAME: readers see either the old table or the new one
+            cursor.execute(f"DROP TABLE IF EXISTS {RETIRED_TABLE}")
+            cursor.execute(f"RENAME TABLE {TABLE} TO {RETIRED_TABLE}, {STAGING_TABLE} TO {TABLE}")
+            cursor.execute(f"DROP TABLE {RETIRED_TABLE}")
+        cursor.close()
+
+    print(f"✅ Loaded {stats['written']} centers in {time.perf_counter() - start:.1f}s "
+          f"({stats['read']} read, {stats['duplicates']} duplicates, {stats['merged']} merged "
+          f"within {tolerance_m:g} m, {stats['rejected']} rejected)")
+    return stats
+
+
+def dedupe_existing(tolerance_m=CENTERS_DEDUPE_METERS, dry_run=False):
+    """Deletes stored centers with the same name as an older one within
+    `tolerance_m`, whatever their address; returns how many were (or with
+    dry_run, would be) removed. Exact name + address duplicates are
+    dedupe_centers.py's job."""
+    if tolerance_m <= 0:
+        raise ValueError("Merging nearby centers needs a distance (--merge-nearby-m)")
+    deduper = Deduper(tolerance_m)
+    duplicate_ids = []
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT id, name, address, latitude, longitude FROM {TABLE} ORDER BY id")
+        for center_id, name, address, lat, lon in cursor.fetchall():
+            match = deduper.match(name, lat, lon)
+            if match is not None:
+                duplicate_ids.append(center_id)
+                print(f"   {'would remove' if dry_run else 'removing'} #{center_id} {name}, {address} "
+                      f"(kept: {match[2]})")
+            else:
+                deduper.add(name, address, lat, lon)
+        if dry_run:
+            cursor.close()
+            print(f"🔍 Dry run: {len(duplicate_ids)} centers would be removed")
+            return len(duplicate_ids)
+        for chunk in _chunks(duplicate_ids, 1000):
+            cursor.execute(f"DELETE FROM {TABLE} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        conn.commit()
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLE}")
+        remaining = cursor.fetchone()[0]
+        cursor.close()
+    print(f"✨ Removed {len(duplicate_ids)} duplicate centers; {remaining} remain")
+    return len(duplicate_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="CSV / GeoJSON files")
+    parser.add_argument("--mode", choices=("append", "replace"), default="append")
+    parser.add_argument("--method", choices=("insert", "infile"), default="insert")
+    parser.add_argument("--merge-nearby-m", dest="tolerance_m", type=float, default=CENTERS_DEDUPE_METERS,
+                        help="also merge same-name centers closer than this, whatever their address "
+                             "(default %(default)g = off)")
+    parser.add_argument("--chunk-size", type=int, default=CENTERS_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="read and dedupe (or report) only")
+    parser.add_argument("--dedupe-existing", action="store_true",
+                        help="remove same-name centers within --merge-nearby-m already in the table")
+    args = parser.parse_args()
+
+    if args.dedupe_existing:
+        if args.tolerance_m <= 0:
+            parser.error("--dedupe-existing needs --merge-nearby-m")
+        dedupe_existing(args.tolerance_m, args.dry_run)
+    if args.paths:
+        load_centers(args.paths, args.mode, args.method, args.tolerance_m, max(1, args.chunk_size), args.dry_run)
+    elif not args.dedupe_existing:
+        parser.error("give at least one file, or --dedupe-existing")
+
+
+if __name__ == "__main__":
+    main()
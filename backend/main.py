@@ -1,38 +1,166 @@
 import os
-import io
 import json
-import uvicorn
-import mysql.connector
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import base64
+import time
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional, List
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, Query, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
-from PIL import Image
-from ultralytics import YOLO
-from google import genai
+from batcher import InferenceBatcher, QueueFull, DeadlineExceeded
+from admission import Admission, AdmissionMiddleware, ADMISSION_RETRY_AFTER
+from inference_backends import load_model, warm_up, MODEL_PATH, INFERENCE_BACKEND, INFERENCE_INT8, MODEL_WARMUP_RUNS
+from preprocess import INFERENCE_IMGSZ, upload_digest, decode_with_signature, load_source, expand_uploads, ImageRejected, UploadLimitMiddleware
+from executors import run_inference, run_io, run_preprocess, shutdown as shutdown_executors, INFERENCE_WORKERS
+from advice_cache import AdviceCache
+from advice_jobs import AdviceJobs
+from result_cache import ResultCache
+import tiling
+from detections import PACK_VERSION, box_arrays, pack, describe as describe_detections
+import metrics
+from profiler import SamplingProfiler
+from scan_writer import ScanWriter, BufferFull
+from live_detection import LiveDetectionSession
+from spatial_index import CenterIndex
+from clustering import ClusterCache, MAX_ZOOM
+from storage import store, local_store
+import db
 
 # --- 1. CONFIGURATION ---
 load_dotenv() 
 
 # A. Configure Gemini (Only for advice, not detection)
+# google-genai is imported on first use, off the startup path
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
-gemini_client = None
-if GEMINI_API_KEY:
+
+@functools.lru_cache(maxsize=1)
+def get_gemini_client():
+    if not GEMINI_API_KEY:
+        return None
     try:
-        gemini_client = genai.Client(api_key=GEMINI_API_KEY)
-    except:
-        pass
+        from google import genai
+        return genai.Client(api_key=GEMINI_API_KEY)
+    except Exception as e:
+        print(f"⚠️ Gemini client unavailable: {e}")
+        return None
 
 # B. Configure YOLO (Your Custom Model)
-try:
-    # Load YOUR trained model
-    model = YOLO("best.pt") 
-    print("✅ Custom YOLO Model (best.pt) Loaded Successfully!")
-except Exception as e:
-    print(f"❌ Error loading best.pt: {e}")
-    print("   Make sure 'best.pt' is in the backend folder.")
-    model = None
+# INFERENCE_BACKEND picks PyTorch, ONNX Runtime or OpenVINO (optionally INT8).
+# The model is loaded and warmed in the background once the server is up, so
+# /livez answers immediately and /readyz flips to 200 only when it's hot.
+model = None
+batcher = None
+model_state = {"status": "loading", "error": None, "load_ms": None, "warmup_ms": None}
+# Set by preload_model() when serve.py loads the weights before forking workers
+preloaded_model = None
+
+def predictor(loaded):
+    """predict(list of images) on one model instance."""
+    return lambda images: loaded(images, imgsz=INFERENCE_IMGSZ, verbose=False)
+
+def load_replica():
+    loaded = load_model()
+    warm_up(loaded)
+    return loaded
+
+def preload_model(**kwargs):
+    """Loads the model now, in this process, for load_and_warm_model() to pick
+    up later. serve.py calls it in the parent so forked workers share the
+    weights copy-on-write instead of each loading their own.
+    One prediction runs here too: the first one builds the predictor, which
+    fuses Conv+BN and converts the weights to channels-last, i.e. replaces
+    every weight tensor. Done after the fork, each worker would own a copy."""
+    global preloaded_model
+    start = time.perf_counter()
+    preloaded_model = load_model(**kwargs)
+    warm_up(preloaded_model, runs=1)
+    model_state["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return preloaded_model
+
+def load_and_warm_model():
+    """Blocking: loads the configured backend (unless preloaded) and runs MODEL_WARMUP_RUNS dummy passes."""
+    if preloaded_model is not None:
+        loaded = preloaded_model
+    else:
+        start = time.perf_counter()
+        loaded = load_model()
+        model_state["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    model_state["warmup_ms"] = round(warm_up(loaded), 1)
+    print(f"🔥 Model warm after {MODEL_WARMUP_RUNS} runs (last {model_state['warmup_ms']} ms)")
+    return loaded
+
+async def start_model():
+    global model, batcher
+    try:
+        # On the inference pool, so warm-up runs on the thread that serves predictions
+        loaded = await run_inference(load_and_warm_model)
+    except Exception as e:
+        print(f"❌ Error loading {MODEL_PATH} ({INFERENCE_BACKEND}): {e}")
+        print("   Make sure 'best.pt' is in the backend folder.")
+        model_state.update(status="failed", error=str(e))
+        return
+    model = loaded
+    # A YOLO object keeps per-call state in its predictor, so every inference
+    # thread beyond the first gets its own copy of the model
+    replicas = [loaded]
+    for _ in range(INFERENCE_WORKERS - 1):
+        try:
+            replicas.append(await run_inference(load_replica))
+        except Exception as e:
+            print(f"⚠️ Could not load another model replica, running {len(replicas)}: {e}")
+            break
+    # C. Micro-batch concurrent uploads into one forward pass
+    batcher = InferenceBatcher([predictor(replica) for replica in replicas])
+    model_state["status"] = "ready"
+    await run_io(advice_cache.warm, list(model.names.values()))
+
+def require_model():
+    """503 (retry shortly) while the model is loading, 500 if it failed to load."""
+    if model_state["status"] == "loading":
+        raise HTTPException(status_code=503, detail="YOLO Model is still loading", headers={"Retry-After": "5"})
+    if model_state["status"] != "ready":
+        raise HTTPException(status_code=500, detail="YOLO Model not loaded. Check server logs.")
+
+@asynccontextmanager
+async def lifespan(app):
+    if local_store:
+        local_store.start()
+    scan_writer.start()
+    center_index.start()
+    advice_cache.start()
+    result_cache.start()
+    loader = asyncio.ensure_future(start_model())
+    yield
+    loader.cancel()
+    advice_jobs.close()
+    # Flush buffered scans before the pools go away
+    scan_writer.close()
+    if local_store:
+        local_store.stop()
+    center_index.stop()
+    advice_cache.stop()
+    result_cache.close()
+    profiler.stop()
+    if batcher:
+        await batcher.close()
+    shutdown_executors(wait=False)
+
+app = FastAPI(title="Smart Construction Waste Manager", lifespan=lifespan)
 
-app = FastAPI(title="Smart Construction Waste Manager")
+# Refuse oversized uploads before their body is read (CORS is added after, so it wraps this)
+app.add_middleware(UploadLimitMiddleware)
+
+# Shed analyze requests beyond capacity (429/503 + Retry-After), also before the body is read
+admission = Admission(saturated=lambda lane: batcher is not None and batcher.saturated(lane))
+app.add_middleware(AdmissionMiddleware, admission=admission)
+
+# Outermost but CORS: request latency includes rejected uploads
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,137 +168,532 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
 
-def get_db_connection():
-    try:
-        return mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASS"),
-            database=os.getenv("DB_NAME"),
-            port=int(os.getenv("DB_PORT"))
-        )
-    except Exception as e:
-        print(f"❌ DB Connection Error: {e}")
-        return None
-
 # --- 2. HELPER: GET ADVICE ---
 def get_recycling_advice(waste_type):
-    """Uses Gemini to generate advice based on YOLO's detection"""
+    """Uses Gemini to generate advice based on YOLO's detection.
+    Slow (network call) - only the advice cache calls this, in the background."""
+    gemini_client = get_gemini_client()
     if not gemini_client:
-        return "Recycle according to local construction guidelines."
+        return None
     
-    try:
-        response = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=f"Give me 2 short sentences on how to recycle construction waste of type: {waste_type}."
-        )
-        return response.text.strip()
-    except:
-        return "Standard recovery protocol applies."
+    response = gemini_client.models.generate_content(
+        model="gemini-2.0-flash",
+        contents=f"Give me 2 short sentences on how to recycle construction waste of type: {waste_type}."
+    )
+    return response.text.strip()
 
-# --- 3. API ENDPOINTS ---
+advice_cache = AdviceCache(get_recycling_advice)
 
-@app.post("/analyze")
-async def analyze_image(file: UploadFile = File(...)):
-    if not model:
-        raise HTTPException(status_code=500, detail="YOLO Model not loaded. Check server logs.")
+# /analyze?advice=deferred: answer after detection, deliver uncached advice later
+ADVICE_MODE = os.getenv("ADVICE_MODE", "inline")
+ADVICE_SSE_KEEPALIVE = 15
+advice_jobs = AdviceJobs(advice_cache)
 
-    # 1. Read Image
-    contents = await file.read()
-    image = Image.open(io.BytesIO(contents))
+# Detections for re-uploaded and near-duplicate photos, keyed to this model build
+def model_fingerprint():
+    mtime = os.path.getmtime(MODEL_PATH) if os.path.exists(MODEL_PATH) else 0
+    return (f"{MODEL_PATH}|{mtime:.0f}|{INFERENCE_BACKEND}|{'int8' if INFERENCE_INT8 else 'fp32'}|{INFERENCE_IMGSZ}"
+            f"|det{PACK_VERSION}")
 
-    # 2. Run YOLO Inference (The "Prediction" step)
-    print("🤖 Running best.pt inference...")
-    results = model(image)
-    
-    # 3. Process Results
-    detected_class = "Unknown"
-    confidence = 0.0
-    
-    # Get the object with highest confidence
-    if len(results) > 0 and len(results[0].boxes) > 0:
-        box = results[0].boxes[0]
-        class_id = int(box.cls[0])
-        detected_class = model.names[class_id] # e.g., "Concrete"
-        confidence = float(box.conf[0])
-    
-    print(f"✅ YOLO Detected: {detected_class} ({confidence:.2f})")
+result_cache = ResultCache(namespace=model_fingerprint())
+
+# --- 3. HELPER: SAVE SCANS ---
+# With write-behind on (default) scans are buffered and flushed in batches;
+# the response carries a provisional scan_ref instead of the row id.
+# With STORAGE_BACKEND=sqlite a direct insert is already local, so it's off.
+SCAN_WRITE_BEHIND = os.getenv("SCAN_WRITE_BEHIND", "0" if local_store else "1") == "1"
+scan_writer = ScanWriter()
 
-    # 4. Get Advice (Optional, from Gemini)
-    advice = get_recycling_advice(detected_class)
+# In-memory spatial index over recycling_centers for /centers/nearest
+center_index = CenterIndex()
 
-    # 5. Save to AWS Database
+# Component gauges/counters for /metrics, read at scrape time
+metrics.register(metrics.ComponentCollector(model_state, lambda: batcher, scan_writer, result_cache, admission,
+                                            local_store))
+
+# On-demand stack sampling, behind /debug/profiler (disabled unless DEBUG_TOKEN is set)
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+profiler = SamplingProfiler()
+# Per-zoom map clusters derived from the index, rebuilt when centers change
+center_clusters = ClusterCache(center_index)
+
+def save_scan(detected_class, confidence, advice, latitude=None, longitude=None, packed=None):
+    """Inserts one scan row and returns its id, or None if the DB is unreachable."""
     try:
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            query = "INSERT INTO scans (waste_type, confidence, gemini_advice) VALUES (%s, %s, %s)"
-            cursor.execute(query, (detected_class, confidence, advice))
-            conn.commit()
-            scan_id = cursor.lastrowid
-            cursor.close()
-            conn.close()
-            return {
-                "scan_id": scan_id,
-                "waste_type": detected_class,
-                "confidence": confidence,
-                "advice": advice
-            }
+        return store.insert_scan(detected_class, confidence, advice, latitude, longitude, packed)
     except Exception as e:
         print(f"⚠️ DB Save Error: {e}")
-    
-    return {
-        "waste_type": detected_class,
-        "confidence": confidence,
-        "advice": advice,
-        "note": "Data not saved to DB due to connection error"
-    }
+    return None
 
-if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+def queue_records(records):
+    """Hands scan records to the write-behind writer until its buffer is full; returns how many it took."""
+    queued = 0
+    for record in records:
+        try:
+            scan_writer.submit(record)
+        except BufferFull:
+            break
+        queued += 1
+    return queued
+
+def queue_scan(detected_class, confidence, advice, latitude=None, longitude=None, packed=None):
+    """Buffers one scan for the write-behind flusher; returns its provisional ref or None."""
+    try:
+        return scan_writer.submit({
+            "waste_type": detected_class,
+            "confidence": confidence,
+            "gemini_advice": advice,
+            "latitude": latitude,
+            "longitude": longitude,
+            "detections": packed
+        })
+    except BufferFull as e:
+        print(f"⚠️ Scan buffer full: {e}")
+    return None
+
+def top_detection(result):
+    """(class name, confidence) of the most confident box, or ("Unknown", 0.0)"""
+    boxes = result.boxes  # sorted by confidence
+    if len(boxes) > 0:
+        class_id = int(boxes.cls[0])
+        return model.names[class_id], float(boxes.conf[0]) # e.g., "Concrete"
+    return "Unknown", 0.0
+
+# --- 4. API ENDPOINTS ---
+
+def overloaded(e):
+    """503 for work the inference queue couldn't take (full, or past the request deadline)."""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+
+@app.post("/analyze")
+async def analyze_image(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(...),
+    latitude: Optional[float] = Form(None, ge=-90, le=90),
+    longitude: Optional[float] = Form(None, ge=-180, le=180),
+    advice_mode: str = Query(ADVICE_MODE, alias="advice", pattern="^(inline|deferred)$"),
+    tiled: bool = Query(False),
+    tile_size: int = Query(tiling.TILE_SIZE, ge=160, le=2048),
+    tile_overlap: float = Query(tiling.TILE_OVERLAP, ge=0, le=0.5)
+):
+    require_model()
+    timer = metrics.MeteredStageTimer("analyze")
+
+    # 1. Same bytes as a recent upload? Reuse its detection without decoding
+    try:
+        with timer.stage("read"):
+            digest = await run_preprocess(upload_digest, file)
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    # Tiled results depend on the tiling parameters, so they bypass the cache
+    cache = "off" if tiled else "exact"
+    cached = None
+    if not tiled:
+        with timer.stage("cache"):
+            cached = await run_io(result_cache.get, digest)
+
+    if cached is None:
+        # 2. Decode the upload straight to model resolution (size-checked, EXIF-upright);
+        # tiled requests keep enough pixels for a grid of tiles
+        target = tiling.decode_target(tile_size, tile_overlap) if tiled else INFERENCE_IMGSZ
+        try:
+            with timer.stage("decode"):
+                image, signature = await run_preprocess(decode_with_signature, file, target)
+        except ImageRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+
+        # 3. Near-duplicate (burst shot, re-encoded copy) of a recent photo?
+        if not tiled:
+            cache = "similar"
+            with timer.stage("cache"):
+                cached = result_cache.get_similar(signature)
+        if cached is None:
+            # 4. Run YOLO Inference (The "Prediction" step)
+            print("🤖 Running best.pt inference...")
+            deadline = getattr(request.state, "deadline", None)
+            try:
+                with timer.stage("inference"):
+                    if tiled:
+                        predict = functools.partial(batcher.predict, lane="bulk", deadline=deadline)
+                        result = await tiling.predict_tiled(predict, image, tile_size, tile_overlap)
+                    else:
+                        result = await batcher.predict(image, deadline=deadline)
+            except (QueueFull, DeadlineExceeded) as e:
+                raise overloaded(e)
+            # The most confident object names the scan; every box is kept, packed
+            detected_class, confidence = top_detection(result)
+            packed = pack(*box_arrays(result))
+            cached = {"waste_type": detected_class, "confidence": confidence,
+                      "detections": base64.b64encode(packed).decode("ascii")}
+            cache = "off" if tiled else "miss"
+        if not tiled:
+            with timer.stage("cache"):
+                await run_io(result_cache.put, digest, signature, cached)
+
+    metrics.CACHE_LOOKUPS.labels(cache).inc()
+    detected_class, confidence = cached["waste_type"], cached["confidence"]
+    packed = base64.b64decode(cached["detections"])
+    print(f"✅ YOLO Detected: {detected_class} ({confidence:.2f}){f' [cached: {cache}]' if cache in ('exact', 'similar') else ''}")
+
+    # 5. Get Advice (precomputed per class, never waits on Gemini).
+    # Deferred mode doesn't settle for the default text on a miss: the advice
+    # job below delivers the real advice once it has been generated.
+    with timer.stage("advice"):
+        deferred = advice_mode == "deferred" and advice_cache.peek(detected_class) is None
+        advice = None if deferred else advice_cache.get(detected_class)
+
+    # 6. Save to AWS Database (cached or not, every upload is a scan)
+    payload = {"waste_type": detected_class, "confidence": confidence, "advice": advice, "cache": cache,
+               **describe_detections(packed, model.names)}
+    with timer.stage("db"):
+        if SCAN_WRITE_BEHIND:
+            scan_ref = await run_io(queue_scan, detected_class, confidence, advice, latitude, longitude, packed)
+            scan_id = None
+        else:
+            scan_ref = None
+            scan_id = await run_io(save_scan, detected_class, confidence, advice, latitude, longitude, packed)
+    response.headers["Server-Timing"] = timer.server_timing()
+
+    if deferred:
+        if scan_ref is not None:
+            save_advice = functools.partial(scan_writer.update_advice, scan_ref)
+        elif scan_id is not None:
+            save_advice = functools.partial(store.update_scan_advice, scan_id)
+        else:
+            save_advice = None
+        payload["advice_job"] = advice_jobs.submit(detected_class, save_advice).id
+
+    if scan_ref is not None:
+        return {"scan_ref": scan_ref, **payload}
+    if scan_id is not None:
+        return {"scan_id": scan_id, **payload}
+    return {**payload, "note": "Data not saved to DB due to connection error"}
+
+# Images of one batch request decoded/queued at the same time (bounds memory)
+BATCH_IN_FLIGHT = int(os.getenv("BATCH_IN_FLIGHT", "16"))
+
+@app.post("/analyze/batch")
+async def analyze_batch(
+    files: List[UploadFile] = File(...),
+    latitude: Optional[float] = Form(None, ge=-90, le=90),
+    longitude: Optional[float] = Form(None, ge=-180, le=180)
+):
+    """Analyzes many images (or .zip archives of images) from one site in one
+    request. Streams one NDJSON line per image as it finishes, then a summary
+    line; all scans are saved with a single bulk insert at the end."""
+    require_model()
+    try:
+        sources = await run_preprocess(expand_uploads, files)
+    except ImageRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    slots = asyncio.Semaphore(BATCH_IN_FLIGHT)
+
+    async def analyze_one(index, filename, open_fn):
+        """(NDJSON item, scan record or None)"""
+        async with slots:
+            try:
+                image = await run_preprocess(load_source, open_fn)
+                # Concurrent predictions from here share forward passes in the batcher
+                result = await batcher.predict(image, lane="bulk")
+            except ImageRejected as e:
+                return {"index": index, "filename": filename, "error": str(e)}, None
+            except QueueFull:
+                return {"index": index, "filename": filename, "error": "Server busy, retry later"}, None
+            except Exception as e:
+                print(f"⚠️ Batch item {filename} failed: {e}")
+                return {"index": index, "filename": filename, "error": "Inference failed"}, None
+        detected_class, confidence = top_detection(result)
+        advice = advice_cache.get(detected_class)
+        item = {
+            "index": index,
+            "filename": filename,
+            "waste_type": detected_class,
+            "confidence": confidence,
+            "advice": advice
+        }
+        # Same columns as a single /analyze scan
+        record = {
+            "waste_type": detected_class,
+            "confidence": confidence,
+            "gemini_advice": advice,
+            "latitude": latitude,
+            "longitude": longitude,
+            "detections": pack(*box_arrays(result))
+        }
+        return item, record
+
+    async def stream():
+        tasks = [asyncio.ensure_future(analyze_one(i, name, open_fn)) for i, (name, open_fn) in enumerate(sources)]
+        records = []
+        try:
+            for finished in asyncio.as_completed(tasks):
+                item, record = await finished
+                if record is not None:
+                    records.append(record)
+                yield json.dumps(item) + "\n"
+        finally:
+            # Client went away mid-stream: stop the remaining work
+            for task in tasks:
+                task.cancel()
+
+        summary = {"images": len(sources), "analyzed": len(records), "saved": 0}
+        if records:
+            try:
+                first_id = await run_io(store.insert_scans, records)
+                summary.update(saved=len(records), first_scan_id=first_id)
+            except Exception as e:
+                # Hand them to the write-behind writer, which retries (and spills on shutdown)
+                print(f"⚠️ Batch insert failed, queueing {len(records)} scans: {e}")
+                # submit() can block on a full buffer, so not on the event loop
+                summary["queued"] = await run_io(queue_records, records)
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.websocket("/ws/detect")
+async def detect_stream(websocket: WebSocket):
+    """Live detection: send encoded frames as binary messages, receive one JSON
+    result per analyzed frame. Frames are skipped under load."""
+    await websocket.accept()
+    if model_state["status"] != "ready":
+        await websocket.close(code=1013 if model_state["status"] == "loading" else 1011, reason="YOLO Model not loaded")
+        return
+    session = LiveDetectionSession(websocket, batcher.predict, top_detection, advice_cache.get, scan_writer.submit)
+    await session.run()
+
+@app.get("/advice/{job_id}")
+async def get_advice_job(job_id: str, wait: float = Query(0, ge=0, le=30)):
+    """Deferred advice by polling. `wait` long-polls up to that many seconds."""
+    job = advice_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired advice job")
+    if wait and not job.done.is_set():
+        try:
+            await asyncio.wait_for(job.done.wait(), wait)
+        except asyncio.TimeoutError:
+            pass
+    return job.to_dict()
+
+@app.get("/advice/{job_id}/events")
+async def stream_advice_job(job_id: str):
+    """Deferred advice over Server-Sent Events: one `advice` event, then the stream ends."""
+    job = advice_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired advice job")
+
+    async def events():
+        while not job.done.is_set():
+            try:
+                await asyncio.wait_for(job.done.wait(), ADVICE_SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+        yield f"event: advice\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/scans/{scan_ref}")
+def get_scan_status(scan_ref: str):
+    """Maps a provisional scan_ref from /analyze to the saved row id once flushed"""
+    status, scan_id = scan_writer.resolve(scan_ref)
+    if status == "unknown":
+        raise HTTPException(status_code=404, detail="Unknown or expired scan_ref")
+    return {"scan_ref": scan_ref, "status": status, "scan_id": scan_id}
 
 # --- PHASE 4 UPDATES ---
 
 @app.get("/centers")
 def get_recycling_centers():
-    """Fetch all recycling centers from AWS RDS"""
+    """Fetch all recycling centers from AWS RDS (or the local mirror)"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return []
-        
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT name, address, latitude, longitude, contact_info FROM recycling_centers")
-        centers = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        return centers
+        return store.fetch_centers()
     except Exception as e:
         print(f"Error fetching centers: {e}")
         return []
 
+@app.get("/centers/nearest")
+def get_nearest_centers(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100),
+    material: Optional[str] = None
+):
+    """k closest recycling centers to (lat, lon), optionally only those accepting `material`"""
+    if not center_index.loaded:
+        raise HTTPException(status_code=503, detail="Center index is still loading")
+    return [
+        {
+            "name": center["name"],
+            "address": center["address"],
+            "latitude": center["latitude"],
+            "longitude": center["longitude"],
+            "contact_info": center["contact_info"],
+            "accepted_materials": center["materials"],
+            "distance_km": round(distance, 3)
+        }
+        for distance, center in center_index.nearest(lat, lon, k, material)
+    ]
+
+@app.get("/centers/tiles/{z}/{x}/{y}")
+def get_center_tile(z: int, x: int, y: int):
+    """Pre-clustered centers for one z/x/y map tile (same scheme as the OSM tile layer)"""
+    if not 0 <= z <= MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    if not center_index.loaded:
+        raise HTTPException(status_code=503, detail="Center index is still loading")
+    return Response(
+        content=center_clusters.tile_json(z, x, y),
+        media_type="application/json",
+        headers={"Cache-Control": "public, max-age=60", "ETag": f'"{center_index.version}-{z}-{x}-{y}"'}
+    )
+
+@app.get("/centers/clusters")
+def get_center_clusters(
+    zoom: int = Query(..., ge=0, le=MAX_ZOOM),
+    bbox: str = Query(..., description="west,south,east,north")
+):
+    """Pre-clustered centers for the current map viewport"""
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    # west > east is a viewport across the antimeridian, not an error
+    if south > north:
+        raise HTTPException(status_code=400, detail="bbox must be west,south,east,north")
+    if not center_index.loaded:
+        raise HTTPException(status_code=503, detail="Center index is still loading")
+    try:
+        return center_clusters.bbox(zoom, west, south, east, north)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+HISTORY_EXPORT_PAGE = 1000
+
 @app.get("/history")
-def get_scan_history():
-    """Fetch last 10 scans"""
+def get_scan_history(
+    response: Response,
+    limit: int = Query(10, ge=1, le=500),
+    cursor: Optional[int] = Query(None, description="X-Next-Cursor from the previous page"),
+    waste_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    detections: bool = Query(False, description="include every box and the per-class composition")
+):
+    """Newest scans first, one page at a time. The next page's cursor is sent
+    in the X-Next-Cursor header (absent on the last page)."""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return []
-        
-        cursor = conn.cursor(dictionary=True)
-        # Order by newest first
-        cursor.execute("SELECT id, waste_type, confidence, timestamp, gemini_advice FROM scans ORDER BY id DESC LIMIT 10")
-        history = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        return history
+        # Fetch one extra row to know whether another page exists
+        history = store.fetch_history(limit + 1, cursor, waste_type, since, until, min_confidence, detections)
     except Exception as e:
         print(f"Error fetching history: {e}")
         return []
+    if len(history) > limit:
+        history = history[:limit]
+        response.headers["X-Next-Cursor"] = str(history[-1]["id"])
+    if detections:
+        names = model.names if model is not None else None
+        for scan in history:
+            scan.update(describe_detections(scan.pop("detections"), names))
+    return history
+
+@app.get("/history/export")
+def export_scan_history(
+    waste_type: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_confidence: Optional[float] = Query(None, ge=0, le=1)
+):
+    """Streams every matching scan as NDJSON, newest first, without building it in memory"""
+    def rows():
+        before_id = None
+        while True:
+            # Each page borrows a pooled connection only for its own query
+            page = store.fetch_history(HISTORY_EXPORT_PAGE, before_id, waste_type, since, until, min_confidence)
+            for scan in page:
+                yield json.dumps(jsonable_encoder(scan)) + "\n"
+            if len(page) < HISTORY_EXPORT_PAGE:
+                return
+            before_id = page[-1]["id"]
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+# --- STATISTICS ---
+def summarize_rollup(row):
+    return {
+        "scans": row["scan_count"],
+        "mean_confidence": row["confidence_sum"] / row["scan_count"],
+        "min_confidence": row["confidence_min"],
+        "max_confidence": row["confidence_max"],
+    }
+
+@app.get("/stats")
+def get_scan_stats(
+    bucket: str = Query("day", pattern="^(day|hour)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    waste_type: Optional[str] = None
+):
+    """Scan counts and confidence per waste type, overall and per day/hour.
+    Reads the pre-aggregated rollups, never the scans table."""
+    try:
+        rows = db.fetch_stats(bucket, since, until, waste_type)
+    except Exception as e:
+        print(f"Error fetching stats: {e}")
+        raise HTTPException(status_code=503, detail="Statistics unavailable")
+
+    series, totals = [], {}
+    for row in rows:
+        series.append({"bucket": row["bucket"], "waste_type": row["waste_type"], **summarize_rollup(row)})
+        total = totals.setdefault(row["waste_type"], {
+            "waste_type": row["waste_type"],
+            "scan_count": 0,
+            "confidence_sum": 0.0,
+            "confidence_min": row["confidence_min"],
+            "confidence_max": row["confidence_max"],
+        })
+        total["scan_count"] += row["scan_count"]
+        total["confidence_sum"] += row["confidence_sum"]
+        total["confidence_min"] = min(total["confidence_min"], row["confidence_min"])
+        total["confidence_max"] = max(total["confidence_max"], row["confidence_max"])
+
+    by_type = sorted(totals.values(), key=lambda t: t["scan_count"], reverse=True)
+    return {
+        "bucket": bucket,
+        "scans": sum(t["scan_count"] for t in by_type),
+        "totals": [{"waste_type": t["waste_type"], **summarize_rollup(t)} for t in by_type],
+        "series": series,
+    }
+
+@app.get("/stats/geo")
+def get_geo_stats(
+    waste_type: Optional[str] = None,
+    south: Optional[float] = Query(None, ge=-90, le=90),
+    west: Optional[float] = Query(None, ge=-180, le=180),
+    north: Optional[float] = Query(None, ge=-90, le=90),
+    east: Optional[float] = Query(None, ge=-180, le=180)
+):
+    """Scans per STATS_CELL_DEG grid cell (located scans only), as cell centers."""
+    try:
+        rows = db.fetch_geo_stats(waste_type, south, west, north, east)
+    except Exception as e:
+        print(f"Error fetching geo stats: {e}")
+        raise HTTPException(status_code=503, detail="Statistics unavailable")
+    cell = db.STATS_CELL_DEG
+    return {
+        "cell_deg": cell,
+        "cells": [{
+            "latitude": (row["cell_lat"] + 0.5) * cell,
+            "longitude": (row["cell_lon"] + 0.5) * cell,
+            "waste_type": row["waste_type"],
+            **summarize_rollup(row)
+        } for row in rows],
+    }
 
 # --- HEALTH CHECK ENDPOINT ---
 @app.get("/health")
@@ -179,27 +702,92 @@ def check_data_connectivity():
     Robust health check: Validates actual SQL execution.
     """
     try:
-        # 1. Attempt to connect
-        conn = get_db_connection()
-        if not conn:
-            raise HTTPException(status_code=503, detail="Database Connection Failed")
-        
-        # 2. Attempt to run a real query
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        result = cursor.fetchone()
-        
-        # 3. Clean up
-        cursor.close()
-        conn.close()
-        
+        # Borrow a pooled connection and run a real query on it
+        result = store.ping()
+
+        if local_store:
+            return {
+                "status": "online",
+                "database": "SQLite (local, synced to AWS RDS)",
+                "data_flow": "active",
+                "query_result": result,
+                "sync": local_store.stats()
+            }
         return {
             "status": "online", 
             "database": "AWS RDS (MySQL)", 
             "data_flow": "active", 
-            "query_result": result[0]
+            "query_result": result
         }
         
     except Exception as e:
         print(f"❌ Connectivity Error: {e}")
         raise HTTPException(status_code=500, detail=f"Data Connectivity Error: {str(e)}")
+
+# --- LIVENESS / READINESS ---
+@app.get("/livez")
+def liveness():
+    """The process is up and the event loop is answering. Never touches the model or DB."""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readiness():
+    """200 once the model is loaded and warmed; 503 until then (or if loading failed)."""
+    body = {
+        "status": model_state["status"],
+        "backend": INFERENCE_BACKEND,
+        "load_ms": model_state["load_ms"],
+        "warmup_ms": model_state["warmup_ms"],
+    }
+    if model_state["status"] != "ready":
+        body["error"] = model_state["error"]
+        return JSONResponse(status_code=503, content=body, headers={"Retry-After": "5"})
+    return body
+
+# --- METRICS ---
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint: request/stage latency histograms and component state."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+# --- DEBUG: SAMPLING PROFILER ---
+def require_debug_token(token):
+    # Hidden entirely unless DEBUG_TOKEN is configured
+    if not DEBUG_TOKEN or token != DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.post("/debug/profiler/start")
+def start_profiler(
+    interval_ms: float = Query(10, ge=1, le=1000),
+    seconds: float = Query(60, gt=0),
+    x_debug_token: Optional[str] = Header(None)
+):
+    """Starts sampling every thread's stack. Stops by itself after `seconds`."""
+    require_debug_token(x_debug_token)
+    if not profiler.start(interval_ms, seconds):
+        raise HTTPException(status_code=409, detail="Profiler already running")
+    return profiler.status()
+
+@app.post("/debug/profiler/stop")
+def stop_profiler(x_debug_token: Optional[str] = Header(None)):
+    require_debug_token(x_debug_token)
+    profiler.stop()
+    return {**profiler.status(), "top": profiler.top()}
+
+@app.get("/debug/profiler")
+def profiler_report(
+    format: str = Query("top", pattern="^(top|collapsed)$"),
+    limit: int = Query(50, ge=1, le=5000),
+    x_debug_token: Optional[str] = Header(None)
+):
+    """`top`: hottest frames. `collapsed`: flamegraph.pl / speedscope input."""
+    require_debug_token(x_debug_token)
+    if format == "collapsed":
+        return Response(content=profiler.collapsed(limit), media_type="text/plain")
+    return {**profiler.status(), "top": profiler.top(limit)}
+
+# Development server (auto-reload, one process). Production: python serve.py
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,206 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+import db
+import executors
+from timing import StageTimer
+
+# --- PROMETHEUS METRICS ---
+# Request latency and per-stage timings are observed as they happen. Component
+# state (DB pool, executors, batcher, write-behind buffer, result cache) is
+# kept as plain counters by each component and read here at scrape time, so
+# none of them depend on prometheus_client.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+REQUEST_SECONDS = Histogram(
+    "scwm_http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS)
+# livesum: under serve.py's worker processes, in-flight gauges add up across workers
+REQUESTS_IN_FLIGHT = Gauge("scwm_http_requests_in_flight", "HTTP requests being handled", multiprocess_mode="livesum")
+STAGE_SECONDS = Histogram(
+    "scwm_stage_duration_seconds", "Time spent in each pipeline stage",
+    ["endpoint", "stage"], buckets=STAGE_BUCKETS)
+STAGES_IN_FLIGHT = Gauge("scwm_stage_in_flight", "Requests currently inside a pipeline stage", ["endpoint", "stage"],
+                         multiprocess_mode="livesum")
+CACHE_LOOKUPS = Counter("scwm_result_cache_lookups_total", "/analyze result cache outcomes", ["outcome"])
+
+
+class MetricsMiddleware:
+    """Times every HTTP request, labelled with its route template (not the raw
+    path, which would explode label cardinality)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_SECONDS.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - start)
+
+
+class MeteredStageTimer(StageTimer):
+    """StageTimer that also feeds the per-stage histogram and in-flight gauge."""
+
+    def __init__(self, endpoint):
+        super().__init__()
+        self.endpoint = endpoint
+
+    @contextmanager
+    def stage(self, name):
+        in_flight = STAGES_IN_FLIGHT.labels(self.endpoint, name)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            with super().stage(name):
+                yield
+        finally:
+            in_flight.dec()
+            STAGE_SECONDS.labels(self.endpoint, name).observe(time.perf_counter() - start)
+
+
+class ComponentCollector:
+    """Reads component counters at scrape time."""
+
+    def __init__(self, model_state, batcher, scan_writer, result_cache, admission=None, local_store=None):
+        self.model_state = model_state
+        self.batcher = batcher  # callable: the batcher exists only once the model is loaded
+        self.scan_writer = scan_writer
+        self.result_cache = result_cache
+        self.admission = admission
+        self.local_store = local_store
+
+    def collect(self):
+        ready = GaugeMetricFamily("scwm_model_ready", "1 once the model is loaded and warm")
+        ready.add_metric([], 1 if self.model_state["status"] == "ready" else 0)
+        yield ready
+
+        model_errors = CounterMetricFamily("scwm_model_errors", "Model load and inference failures", labels=["kind"])
+        model_errors.add_metric(["load"], 1 if self.model_state["status"] == "failed" else 0)
+        batcher = self.batcher()
+        batch = batcher.stats() if batcher is not None else None
+        model_errors.add_metric(["inference"], batch["errors"] if batch else 0)
+        yield model_errors
+
+        if batch:
+            queued = GaugeMetricFamily("scwm_inference_queued_images", "Images waiting for a batch", labels=["lane"])
+            rejected = CounterMetricFamily("scwm_inference_rejected", "Images refused because their lane was full", labels=["lane"])
+            for lane, depth in batch["queued"].items():
+                queued.add_metric([lane], depth)
+                rejected.add_metric([lane], batch["rejected"][lane])
+            yield queued
+            yield rejected
+            expired = CounterMetricFamily("scwm_inference_expired", "Queued images dropped after their request deadline")
+            expired.add_metric([], batch["expired"])
+            yield expired
+            in_flight = GaugeMetricFamily("scwm_inference_batches_in_flight", "Batches running on the inference pool")
+            in_flight.add_metric([], batch["in_flight"])
+            yield in_flight
+            batches = CounterMetricFamily("scwm_inference_batches", "Forward passes run")
+            batches.add_metric([], batch["batches"])
+            yield batches
+            images = CounterMetricFamily("scwm_inference_images", "Images inferred (images / batches = mean batch size)")
+            images.add_metric([], batch["images"])
+            yield images
+            busy = CounterMetricFamily("scwm_inference_busy_seconds", "Time spent in forward passes")
+            busy.add_metric([], batch["busy_seconds"])
+            yield busy
+
+        if self.admission is not None:
+            active = GaugeMetricFamily("scwm_admission_active", "Analyze requests admitted and in progress", labels=["lane"])
+            limit = GaugeMetricFamily("scwm_admission_limit", "Concurrent analyze requests allowed", labels=["lane"])
+            shed = CounterMetricFamily("scwm_admission_rejected", "Analyze requests shed with 429/503", labels=["lane"])
+            for lane, stats in self.admission.stats().items():
+                active.add_metric([lane], stats["active"])
+                limit.add_metric([lane], stats["limit"])
+                shed.add_metric([lane], stats["rejected"])
+            yield active
+            yield limit
+            yield shed
+
+        pool = db.pool_stats()
+        for name, kind, help_text in (
+            ("size", GaugeMetricFamily, "Configured DB pool size"),
+            ("in_use", GaugeMetricFamily, "DB connections checked out"),
+            ("checkouts", CounterMetricFamily, "DB connection checkouts"),
+            ("wait_seconds", CounterMetricFamily, "Time spent waiting for a free DB connection"),
+            ("timeouts", CounterMetricFamily, "Checkouts that gave up waiting for a connection"),
+            ("errors", CounterMetricFamily, "Failed DB operations (connect, query, pool timeout)"),
+        ):
+            family = kind(f"scwm_db_pool_{name}", help_text)
+            family.add_metric([], pool[name])
+            yield family
+
+        workers = GaugeMetricFamily("scwm_executor_workers", "Threads per executor pool", labels=["pool"])
+        queued = GaugeMetricFamily("scwm_executor_queued_tasks", "Tasks waiting for an executor thread", labels=["pool"])
+        for name, stats in executors.stats().items():
+            workers.add_metric([name], stats["workers"])
+            queued.add_metric([name], stats["queued"])
+        yield workers
+        yield queued
+
+        pending = GaugeMetricFamily("scwm_scan_writer_pending", "Scans buffered for the next flush")
+        pending.add_metric([], self.scan_writer.pending())
+        yield pending
+
+        cache = self.result_cache.stats()
+        for name, help_text in (("entries", "Cached detections"), ("bytes", "Approximate result cache size")):
+            family = GaugeMetricFamily(f"scwm_result_cache_{name}", help_text)
+            family.add_metric([], cache[name])
+            yield family
+
+        if self.local_store is not None:
+            sync = self.local_store.stats()
+            link = GaugeMetricFamily("scwm_local_sync_link_up", "1 while the last sync to MySQL succeeded")
+            link.add_metric([], 1 if sync["link"] == "up" else 0)
+            yield link
+            for name, help_text in (("pending_scans", "Local scans not yet in MySQL"),
+                                    ("pending_advice", "Synced scans whose later advice isn't in MySQL yet")):
+                family = GaugeMetricFamily(f"scwm_local_sync_{name}", help_text)
+                family.add_metric([], sync[name])
+                yield family
+            synced = CounterMetricFamily("scwm_local_sync_scans", "Local scans pushed to MySQL by this process")
+            synced.add_metric([], sync["synced"])
+            yield synced
+
+
+_components = []
+
+
+def register(collector):
+    _components.append(collector)
+    REGISTRY.register(collector)
+
+
+def render():
+    """(body, content type) for GET /metrics. Under a multi-process server
+    (PROMETHEUS_MULTIPROC_DIR set) the histograms are merged across workers;
+    component state is that of the worker answering the scrape."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _components:
+            registry.register(collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
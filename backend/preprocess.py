@@ -0,0 +1,215 @@
+import os
+import io
+import zipfile
+import hashlib
+import warnings
+from PIL import Image, ImageOps, ImageStat, UnidentifiedImageError
+
+# --- UPLOAD DECODE & PREPROCESSING ---
+# Site photos are 12-50 MP but YOLO only looks at INFERENCE_IMGSZ pixels on
+# the long side. JPEGs are decoded in draft mode, which lets libjpeg scale by
+# 1/2, 1/4 or 1/8 while decoding, so the full-resolution bitmap never exists.
+# The upload is decoded straight from its spooled temp file (no bytes copy).
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(64_000_000)))
+INFERENCE_IMGSZ = int(os.getenv("INFERENCE_IMGSZ", "640"))
+# /analyze/batch: whole request body, and images per request after unzipping
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(512 * 1024 * 1024)))
+MAX_BATCH_IMAGES = int(os.getenv("MAX_BATCH_IMAGES", "500"))
+
+# A dHash only tells textured images apart: flat or smooth ones (a blank
+# wall, sky, a plain gradient) all hash to nearly 0 (or all ones). Those get
+# no signature and are only ever matched on their exact bytes.
+DHASH_MIN_STDDEV = float(os.getenv("DHASH_MIN_STDDEV", "6"))
+DHASH_MIN_BITS = int(os.getenv("DHASH_MIN_BITS", "8"))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+
+# Pillow's own decompression-bomb guard, in case something decodes outside decode_image()
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+class ImageRejected(Exception):
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+def decode_image(fp, target=INFERENCE_IMGSZ):
+    """Decodes an image file object to RGB, upright, with its long side at most `target`."""
+    try:
+        with warnings.catch_warnings():
+            # Between 1x and 2x the limit Pillow only warns; the size check below rejects those
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            image = Image.open(fp)  # reads the header only
+    except UnidentifiedImageError:
+        raise ImageRejected(400, "Upload is not a supported image")
+    except Image.DecompressionBombError as e:
+        # Over 2x the limit Pillow refuses to open it at all
+        raise ImageRejected(413, f"Image is too large: {e}")
+
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageRejected(413, f"Image is {width}x{height}; limit is {MAX_IMAGE_PIXELS} pixels")
+
+    long_side = max(width, height)
+    if long_side > target:
+        # Draft keeps both sides >= the requested size, so ask for the
+        # aspect-correct box whose long side is `target`
+        image.draft("RGB", (max(1, width * target // long_side), max(1, height * target // long_side)))
+
+    try:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+    except (OSError, SyntaxError) as e:
+        raise ImageRejected(400, f"Could not decode image: {e}")
+
+    if max(image.size) > target:
+        image.thumbnail((target, target), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return image
+
+
+def decode_bytes(data, target=INFERENCE_IMGSZ):
+    """decode_image() for an in-memory payload (e.g. a WebSocket frame)."""
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ImageRejected(413, f"Frame is {len(data)} bytes; limit is {MAX_UPLOAD_BYTES}")
+    return decode_image(io.BytesIO(data), target)
+
+
+def _dhash_thumbnail(image, size=8):
+    return image.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR)
+
+
+def _dhash_bits(small, size=8):
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def dhash(image, size=8):
+    """64-bit difference hash: near-identical images differ in only a few bits."""
+    return _dhash_bits(_dhash_thumbnail(image, size), size)
+
+
+def image_signature(image, size=8):
+    """dhash() of `image`, or None if it's too flat for the hash to mean anything."""
+    small = _dhash_thumbnail(image, size)
+    if ImageStat.Stat(small).stddev[0] < DHASH_MIN_STDDEV:
+        return None
+    bits = _dhash_bits(small, size)
+    set_bits = bin(bits).count("1")
+    if set_bits < DHASH_MIN_BITS or set_bits > size * size - DHASH_MIN_BITS:
+        return None
+    return bits
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _checked_upload_file(upload):
+    """The UploadFile's underlying file, rewound, after checking its size."""
+    fp = upload.file
+    size = upload.size
+    if size is None:
+        fp.seek(0, os.SEEK_END)
+        size = fp.tell()
+    if size > MAX_UPLOAD_BYTES:
+        raise ImageRejected(413, f"Upload is {size} bytes; limit is {MAX_UPLOAD_BYTES}")
+    fp.seek(0)
+    return fp
+
+
+def load_upload(upload, target=INFERENCE_IMGSZ):
+    """Size-checks a FastAPI UploadFile and decodes it from its underlying file."""
+    return decode_image(_checked_upload_file(upload), target)
+
+
+def upload_digest(upload):
+    """BLAKE2b of the upload bytes, read in chunks (hashlib releases the GIL)."""
+    fp = _checked_upload_file(upload)
+    digest = hashlib.blake2b(digest_size=20)
+    for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+        digest.update(chunk)
+    fp.seek(0)
+    return digest.hexdigest()
+
+
+def decode_with_signature(upload, target=INFERENCE_IMGSZ):
+    """load_upload() plus the decoded image's image_signature(), in one pool hop."""
+    image = load_upload(upload, target)
+    return image, image_signature(image)
+
+
+def _is_zip(upload):
+    return (upload.filename or "").lower().endswith(".zip") or upload.content_type in (
+        "application/zip", "application/x-zip-compressed")
+
+
+def expand_uploads(uploads):
+    """Lists every image in a batch upload as (filename, open_fn), unpacking
+    .zip archives. Nothing is decoded here; open_fn() is called per image."""
+    sources = []
+    for upload in uploads:
+        if not _is_zip(upload):
+            sources.append((upload.filename, lambda upload=upload: upload))
+            continue
+        try:
+            archive = zipfile.ZipFile(upload.file)
+        except zipfile.BadZipFile:
+            raise ImageRejected(400, f"{upload.filename} is not a valid zip archive")
+        for member in archive.infolist():
+            if member.is_dir() or not member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            if os.path.basename(member.filename).startswith("."):
+                continue  # macOS resource forks and similar
+            sources.append((member.filename, lambda archive=archive, member=member: (archive, member)))
+        if len(sources) > MAX_BATCH_IMAGES:
+            break
+    if len(sources) > MAX_BATCH_IMAGES:
+        raise ImageRejected(413, f"Batch has more than {MAX_BATCH_IMAGES} images")
+    return sources
+
+
+def load_source(open_fn, target=INFERENCE_IMGSZ):
+    """Decodes one entry returned by expand_uploads()."""
+    source = open_fn()
+    if isinstance(source, tuple):
+        archive, member = source
+        # Check the declared size before inflating anything (zip bombs)
+        if member.file_size > MAX_UPLOAD_BYTES:
+            raise ImageRejected(413, f"{member.filename} is {member.file_size} bytes; limit is {MAX_UPLOAD_BYTES}")
+        with archive.open(member) as fp:
+            return decode_image(fp, target)
+    return load_upload(source, target)
+
+
+class UploadLimitMiddleware:
+    """Rejects oversized uploads from their Content-Length header, before the
+    multipart body is read and spooled."""
+
+    def __init__(self, app, limits=None):
+        self.app = app
+        limits = limits or {"/analyze": MAX_UPLOAD_BYTES, "/analyze/batch": MAX_BATCH_BYTES}
+        # Multipart framing adds a little on top of the files themselves
+        self.limits = {path: max_bytes + 64 * 1024 for path, max_bytes in limits.items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.limits:
+            length = dict(scope["headers"]).get(b"content-length")
+            if length is not None and length.isdigit() and int(length) > self.limits[scope["path"]]:
+                body = b'{"detail":"Upload too large"}'
+                await send({
+                    "type": "http.response.start",
+                    "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+                })
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,112 @@
+import os
+import re
+import sys
+import time
+import threading
+from collections import Counter
+
+# --- ON-DEMAND SAMPLING PROFILER ---
+# Off by default and free when off. Once started (POST /debug/profiler/start)
+# a background thread snapshots every thread's Python stack each
+# PROFILER_INTERVAL_MS and counts identical stacks, until stopped or
+# PROFILER_MAX_SECONDS pass. The result is in "collapsed stack" format,
+# which flamegraph.pl and speedscope read directly. Time spent inside C
+# extensions (torch, Pillow, the MySQL driver) shows up on the Python frame
+# that called them.
+
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "10"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+PROFILER_MAX_DEPTH = 64
+
+
+def _thread_group(name):
+    # "inference_0", "preprocess_3" -> one flame per pool, not per thread
+    return re.sub(r"_\d+$", "", name)
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._stacks = Counter()
+        self.samples = 0
+        self.interval_ms = PROFILER_INTERVAL_MS
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=PROFILER_INTERVAL_MS, seconds=PROFILER_MAX_SECONDS):
+        """Starts a fresh profile. Returns False if one is already running."""
+        with self._lock:
+            if self.running:
+                return False
+            self._stacks = Counter()
+            self.samples = 0
+            self.interval_ms = max(1.0, interval_ms)
+            self.started_at, self.stopped_at = time.time(), None
+            self._stop.clear()
+            deadline = time.monotonic() + min(seconds, PROFILER_MAX_SECONDS)
+            self._thread = threading.Thread(target=self._run, args=(deadline,), name="profiler", daemon=True)
+            self._thread.start()
+        print(f"🔬 Sampling profiler started ({self.interval_ms:g} ms interval)")
+        return True
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self, deadline):
+        me = threading.get_ident()
+        interval = self.interval_ms / 1000
+        while not self._stop.wait(interval) and time.monotonic() < deadline:
+            names = {thread.ident: _thread_group(thread.name) for thread in threading.enumerate()}
+            sampled = Counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread"))
+                sampled[";".join(reversed(stack))] += 1
+            with self._lock:
+                self._stacks.update(sampled)
+                self.samples += 1
+        self.stopped_at = time.time()
+        print(f"🔬 Sampling profiler stopped ({self.samples} samples)")
+
+    def status(self):
+        return {
+            "running": self.running,
+            "samples": self.samples,
+            "interval_ms": self.interval_ms,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+        }
+
+    def collapsed(self, limit=None):
+        """`thread;outer;...;inner count` lines, most frequent first."""
+        with self._lock:
+            stacks = self._stacks.most_common(limit)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def top(self, limit=20):
+        """Innermost frames by share of samples ("where threads are sitting")."""
+        with self._lock:
+            leaves = Counter()
+            for stack, count in self._stacks.items():
+                thread, _, rest = stack.partition(";")
+                leaves[(thread, stack.rsplit(";", 1)[-1] if rest else "idle")] += count
+            total = self.samples or 1
+        return [
+            {"thread": thread, "frame": frame, "samples": count, "share": round(count / total, 4)}
+            for (thread, frame), count in leaves.most_common(limit)
+        ]
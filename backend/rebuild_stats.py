@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Recomputes the /stats rollup tables from the scans table.
+
+    python rebuild_stats.py
+
+Scan inserts keep the rollups current on their own; run this after editing
+or deleting scans by hand, or after changing STATS_CELL_DEG. It runs in one
+transaction, so scan inserts wait until it commits.
+"""
+import time
+from db import ROLLUPS, rebuild_rollups
+
+
+def main():
+    start = time.perf_counter()
+    print(f"📊 Rebuilding {', '.join(ROLLUPS)}...")
+    count = rebuild_rollups()
+    print(f"✅ Folded {count} scans in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
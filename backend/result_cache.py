@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from preprocess import hamming
+
+# --- DUPLICATE UPLOAD CACHE ---
+# People re-upload the same photo, or a burst of near-identical ones. Detections
+# are cached under two keys:
+#   * the content digest of the upload bytes (exact re-upload; the image
+#     isn't even decoded), and
+#   * its 64-bit dHash, matched within RESULT_CACHE_DISTANCE bits (near-duplicates).
+# Near matches use multi-index hashing: the hash is split into distance+1
+# bands, and two hashes within `distance` bits must agree on at least one
+# band, so only entries sharing a band are compared.
+# Memory is LRU, capped at roughly RESULT_CACHE_MAX_MB. With RESULT_CACHE_DIR
+# set, entries are also kept in SQLite there and reloaded on start.
+# Flat images have no signature (see preprocess.image_signature) and are
+# cached under their digest only.
+# Entries are namespaced by the model that produced them, so swapping weights
+# or backends never serves stale detections.
+
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "16"))
+RESULT_CACHE_DISTANCE = int(os.getenv("RESULT_CACHE_DISTANCE", "4"))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR")
+RESULT_CACHE_DISK_ENTRIES = int(os.getenv("RESULT_CACHE_DISK_ENTRIES", "200000"))
+
+HASH_BITS = 64
+# Rough per-entry cost of the dict/OrderedDict/index slots on top of the payload
+ENTRY_OVERHEAD_BYTES = 400
+
+
+# Signatures are stored as hex; "" for images without one
+def _format_signature(signature):
+    return "" if signature is None else format(signature, "016x")
+
+
+def _parse_signature(text):
+    return int(text, 16) if text else None
+
+
+class ResultCache:
+    def __init__(self, namespace="", max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+                 distance=RESULT_CACHE_DISTANCE, directory=RESULT_CACHE_DIR):
+        self.namespace = namespace
+        self.max_bytes = max(0, int(max_bytes))
+        self.distance = max(0, min(distance, HASH_BITS - 1))
+        self.directory = directory
+        self._entries = OrderedDict()  # digest -> (signature, result, cost)
+        self._bytes = 0
+        n_bands = self.distance + 1
+        self._bands = [(HASH_BITS * i // n_bands, HASH_BITS * (i + 1) // n_bands) for i in range(n_bands)]
+        self._band_index = [{} for _ in self._bands]  # band value -> set of digests
+        self._lock = threading.Lock()
+        # SQLite work happens under its own lock so memory lookups never wait on disk
+        self._disk_lock = threading.Lock()
+        self._disk = None
+        self._puts = 0
+        self.hits = {"exact": 0, "similar": 0, "miss": 0}
+
+    # -- lookups --
+
+    def get(self, digest):
+        """Result cached for these exact bytes, or None. Checks disk after memory."""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                self.hits["exact"] += 1
+                return entry[1]
+        row = self._disk_get(digest)
+        if row is None:
+            return None
+        signature, result = row
+        self._remember(digest, signature, result)
+        with self._lock:
+            self.hits["exact"] += 1
+        return result
+
+    def get_similar(self, signature):
+        """Result of the closest cached image within `distance` bits of `signature`, or None."""
+        with self._lock:
+            if signature is None:
+                self.hits["miss"] += 1
+                return None
+            best, best_distance = None, self.distance + 1
+            for (start, end), index in zip(self._bands, self._band_index):
+                for digest in index.get(self._band(signature, start, end), ()):
+                    d = hamming(signature, self._entries[digest][0])
+                    if d < best_distance:
+                        best, best_distance = digest, d
+            if best is None:
+                self.hits["miss"] += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits["similar"] += 1
+            return self._entries[best][1]
+
+    # -- updates --
+
+    def put(self, digest, signature, result):
+        """Caches `result` (JSON-serialisable) under both keys."""
+        self._remember(digest, signature, result)
+        self._disk_put(digest, signature, result)
+
+    def _remember(self, digest, signature, result):
+        cost = ENTRY_OVERHEAD_BYTES + len(json.dumps(result))
+        with self._lock:
+            if digest in self._entries:
+                self._forget(digest)
+            self._entries[digest] = (signature, result, cost)
+            self._bytes += cost
+            if signature is not None:
+                for (start, end), index in zip(self._bands, self._band_index):
+                    index.setdefault(self._band(signature, start, end), set()).add(digest)
+            while self._bytes > self.max_bytes and self._entries:
+                self._forget(next(iter(self._entries)))
+
+    def _forget(self, digest):
+        signature, _, cost = self._entries.pop(digest)
+        self._bytes -= cost
+        if signature is None:
+            return
+        for (start, end), index in zip(self._bands, self._band_index):
+            band = self._band(signature, start, end)
+            members = index.get(band)
+            if members is not None:
+                members.discard(digest)
+                if not members:
+                    del index[band]
+
+    @staticmethod
+    def _band(signature, start, end):
+        return (signature >> start) & ((1 << (end - start)) - 1)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, **self.hits}
+
+    # -- disk tier --
+
+    def start(self):
+        """Opens the on-disk tier (if configured) and loads its most recent entries."""
+        if not self.directory or self._disk is not None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            disk = sqlite3.connect(os.path.join(self.directory, "results.sqlite3"), check_same_thread=False)
+            disk.execute("PRAGMA journal_mode=WAL")
+            disk.execute("PRAGMA synchronous=NORMAL")
+            disk.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " digest TEXT PRIMARY KEY, namespace TEXT NOT NULL, signature TEXT NOT NULL,"
+                " result TEXT NOT NULL, used_at REAL NOT NULL)")
+            disk.execute("CREATE INDEX IF NOT EXISTS idx_results_used ON results (namespace, used_at)")
+            disk.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Result cache disk tier unavailable: {e}")
+            return
+        self._disk = disk
+
+        # Most recently used first, as many as fit in memory
+        rows, budget = [], self.max_bytes
+        for digest, signature, result in disk.execute(
+                "SELECT digest, signature, result FROM results WHERE namespace = ? ORDER BY used_at DESC",
+                (self.namespace,)):
+            budget -= ENTRY_OVERHEAD_BYTES + len(result)
+            if budget < 0:
+                break
+            rows.append((digest, signature, result))
+        # ...inserted oldest first so the LRU order matches
+        for digest, signature, result in reversed(rows):
+            self._remember(digest, _parse_signature(signature), json.loads(result))
+        print(f"✅ Result cache loaded {len(rows)} entries from {self.directory}")
+
+    def close(self):
+        with self._disk_lock:
+            disk, self._disk = self._disk, None
+        if disk is not None:
+            disk.close()
+
+    def _disk_get(self, digest):
+        with self._disk_lock:
+            if self._disk is None:
+                return None
+            try:
+                row = self._disk.execute(
+                    "SELECT signature, result FROM results WHERE digest = ? AND namespace = ?",
+                    (digest, self.namespace)).fetchone()
+                if row is not None:
+                    self._disk.execute("UPDATE results SET used_at = ? WHERE digest = ?", (time.time(), digest))
+                    self._disk.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Result cache read failed: {e}")
+                return None
+        if row is None:
+            return None
+        return _parse_signature(row[0]), json.loads(row[1])
+
+    def _disk_put(self, digest, signature, result):
+        with self._disk_lock:
+            if self._disk is None:
+                return
+            try:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO results (digest, namespace, signature, result, used_at) VALUES (?, ?, ?, ?, ?)",
+                    (digest, self.namespace, _format_signature(signature), json.dumps(result), time.time()))
+                self._puts += 1
+                if self._puts % 1000 == 0:
+                    # Drop other models' entries and anything past the size limit
+                    self._disk.execute("DELETE FROM results WHERE namespace != ?", (self.namespace,))
+                    self._disk.execute(
+                        "DELETE FROM results WHERE digest IN (SELECT digest FROM results ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                        (RESULT_CACHE_DISK_ENTRIES,))
+                self._disk.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Result cache write failed: {e}")
@@ -0,0 +1,264 @@
+import os
+import glob
+import json
+import time
+import uuid
+import base64
+import threading
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from collections import OrderedDict
+from storage import store
+
+# --- WRITE-BEHIND SCAN INSERTS ---
+# /analyze hands its scan record to the writer and answers straight away with
+# a provisional reference. A background thread flushes buffered records to
+# the store (MySQL, or the local SQLite file) as one multi-row INSERT once
+# SCAN_FLUSH_SIZE records are waiting or SCAN_FLUSH_INTERVAL seconds have passed.
+# Each record is stamped with its UTC submit time, so a scan held back by a DB
+# outage (or a spill file) keeps the time it was taken, not the time it was saved.
+
+SCAN_FLUSH_SIZE = int(os.getenv("SCAN_FLUSH_SIZE", "200"))
+SCAN_FLUSH_INTERVAL = float(os.getenv("SCAN_FLUSH_INTERVAL", "0.5"))
+# Hard cap on buffered records; submitters wait (then fail) beyond this
+SCAN_BUFFER_MAX = int(os.getenv("SCAN_BUFFER_MAX", "10000"))
+SCAN_SUBMIT_TIMEOUT = float(os.getenv("SCAN_SUBMIT_TIMEOUT", "2"))
+# Records that could not reach the DB at shutdown are kept in SCAN_SPILL_FILE.<pid>
+# and re-queued by whichever process sweeps them first (on start, then every
+# SCAN_SPILL_SWEEP seconds, so files left by a worker that exited are picked up).
+# A sweep takes only what fits under SCAN_BUFFER_MAX; the rest waits on disk.
+SCAN_SPILL_FILE = os.getenv("SCAN_SPILL_FILE", "scan_spill.jsonl")
+SCAN_SPILL_SWEEP = float(os.getenv("SCAN_SPILL_SWEEP", "60"))
+# How many provisional refs we remember the real scan id for
+SCAN_REF_MEMORY = 10000
+
+
+class BufferFull(Exception):
+    pass
+
+
+# The spill file is JSON lines; BLOB columns (scans.detections) go in as base64
+def _encode_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {"$bytes": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode_bytes(obj):
+    return base64.b64decode(obj["$bytes"]) if obj.keys() == {"$bytes"} else obj
+
+
+@contextmanager
+def _spill_lock(spill_file):
+    # Workers of one server share the spill files; writing and the
+    # read-then-delete sweep happen under one exclusive lock, so a file is
+    # never read half-written or re-queued by two processes.
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(spill_file + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class ScanWriter:
+    def __init__(self, flush_size=SCAN_FLUSH_SIZE, flush_interval=SCAN_FLUSH_INTERVAL,
+                 max_buffered=SCAN_BUFFER_MAX, spill_file=SCAN_SPILL_FILE):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.max_buffered = max(self.flush_size, max_buffered)
+        self.spill_file = spill_file
+        self._buffer = []  # [(ref, record)] in arrival order
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # one flusher at a time
+        self._resolved = OrderedDict()  # ref -> scan id
+        self._flushing = set()  # refs in the INSERT currently running
+        self._late_advice = {}  # ref -> advice that arrived while its INSERT was running
+        self._stop = threading.Event()
+        self._thread = None
+
+    def submit(self, record):
+        """Buffers one scan record (dict of scans columns) and returns its provisional ref."""
+        ref = f"p-{uuid.uuid4().hex}"
+        record.setdefault("timestamp", datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))
+        with self._cond:
+            if len(self._buffer) >= self.max_buffered:
+                # Apply backpressure while the flusher drains the buffer
+                self._cond.notify_all()
+                if not self._cond.wait_for(lambda: len(self._buffer) < self.max_buffered, SCAN_SUBMIT_TIMEOUT):
+                    raise BufferFull(f"{len(self._buffer)} scans waiting for the DB")
+            self._buffer.append((ref, record))
+            if len(self._buffer) >= self.flush_size:
+                self._cond.notify_all()
+        return ref
+
+    def resolve(self, ref):
+        """Returns ("saved", scan_id), ("queued", None) or ("unknown", None)."""
+        with self._cond:
+            if ref in self._resolved:
+                return "saved", self._resolved[ref]
+            if any(pending_ref == ref for pending_ref, _ in self._buffer):
+                return "queued", None
+        return "unknown", None
+
+    def update_advice(self, ref, advice):
+        """Sets gemini_advice on a submitted scan, wherever it is: edited in
+        place while buffered, applied right after the INSERT if one is running,
+        or UPDATEd by id once saved. Returns False for an unknown ref."""
+        with self._cond:
+            scan_id = self._resolved.get(ref)
+            if scan_id is None:
+                for pending_ref, record in self._buffer:
+                    if pending_ref == ref:
+                        if ref in self._flushing:
+                            self._late_advice[ref] = advice
+                        else:
+                            record["gemini_advice"] = advice
+                        return True
+                return False
+        store.update_scan_advice(scan_id, advice)
+        return True
+
+    def pending(self):
+        with self._cond:
+            return len(self._buffer)
+
+    def flush(self):
+        """Writes everything buffered so far. Returns the number of rows saved."""
+        saved = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = self._buffer[:self.flush_size]
+                    self._flushing = {ref for ref, _ in batch}
+                if not batch:
+                    return saved
+                # Records stay buffered until the insert commits, so a failed
+                # flush is simply retried on the next cycle.
+                try:
+                    first_id = store.insert_scans([record for _, record in batch])
+                except Exception:
+                    with self._cond:
+                        self._flushing = set()
+                        for ref, record in batch:
+                            if ref in self._late_advice:
+                                record["gemini_advice"] = self._late_advice.pop(ref)
+                    raise
+                with self._cond:
+                    del self._buffer[:len(batch)]
+                    late = {}
+                    for offset, (ref, _) in enumerate(batch):
+                        self._resolved[ref] = first_id + offset
+                        if ref in self._late_advice:
+                            late[first_id + offset] = self._late_advice.pop(ref)
+                    self._flushing = set()
+                    while len(self._resolved) > SCAN_REF_MEMORY:
+                        self._resolved.popitem(last=False)
+                    self._cond.notify_all()
+                for scan_id, advice in late.items():
+                    try:
+                        store.update_scan_advice(scan_id, advice)
+                    except Exception as e:
+                        print(f"⚠️ Could not save advice for scan {scan_id}: {e}")
+                saved += len(batch)
+
+    def _run(self):
+        next_sweep = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + SCAN_SPILL_SWEEP
+                try:
+                    if self._load_spill():
+                        # More spilled than fits: take the next part once this one is flushed
+                        next_sweep = time.monotonic() + self.flush_interval
+                except OSError as e:
+                    print(f"⚠️ Could not read spilled scans: {e}")
+            with self._cond:
+                self._cond.wait_for(lambda: self._stop.is_set() or len(self._buffer) >= self.flush_size,
+                                    self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Scan flush failed, {self.pending()} scans kept for retry: {e}")
+                self._stop.wait(self.flush_interval)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._load_spill()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="scan-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops the flusher and writes out whatever is left (to the spill file if the DB is down)."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            saved = self.flush()
+            if saved:
+                print(f"💾 Flushed {saved} buffered scans on shutdown")
+        except Exception as e:
+            print(f"⚠️ Final scan flush failed: {e}")
+            self._spill()
+
+    def _spill(self):
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        path = f"{self.spill_file}.{os.getpid()}"
+        with _spill_lock(self.spill_file), open(path, "a", encoding="utf-8") as f:
+            for _, record in batch:
+                f.write(json.dumps(record, default=_encode_bytes) + "\n")
+        print(f"💾 Spilled {len(batch)} unsaved scans to {path}")
+
+    def _spill_files(self):
+        # Per-process files, plus the single file older versions wrote
+        prefix = self.spill_file + "."
+        paths = [path for path in glob.glob(glob.escape(prefix) + "*") if path[len(prefix):].isdigit()]
+        if os.path.exists(self.spill_file):
+            paths.append(self.spill_file)
+        return paths
+
+    def _load_spill(self):
+        """Re-queues spilled records, no more than the buffer has room for.
+        Returns True if some were left on disk for a later sweep."""
+        if not self._spill_files():
+            return False
+        with self._cond:
+            room = self.max_buffered - len(self._buffer)
+        records = []
+        left = False
+        with _spill_lock(self.spill_file):
+            # Read and delete (or cut down) each file while holding the lock:
+            # records taken out of it exist only in this process's buffer
+            for path in self._spill_files():
+                if len(records) >= room:
+                    left = True
+                    break
+                with open(path, encoding="utf-8") as f:
+                    lines = [line for line in f if line.strip()]
+                take = room - len(records)
+                records.extend(json.loads(line, object_hook=_decode_bytes) for line in lines[:take])
+                if len(lines) > take:
+                    with open(path + ".tmp", "w", encoding="utf-8") as f:
+                        f.writelines(lines[take:])
+                    os.replace(path + ".tmp", path)
+                    left = True
+                else:
+                    os.remove(path)
+        if records:
+            with self._cond:
+                self._buffer.extend((f"p-{uuid.uuid4().hex}", record) for record in records)
+            print(f"♻️ Re-queued {len(records)} spilled scans{' (more left on disk)' if left else ''}")
+        return left
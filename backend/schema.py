@@ -0,0 +1,149 @@
+# --- SCHEMA UPGRADES ---
+# init_db.py and createdb.py only run CREATE TABLE IF NOT EXISTS, which leaves
+# tables created by an older version untouched. upgrade() brings an existing
+# database up to what the backend expects; every step is idempotent.
+
+from db import ROLLUPS, update_rollups
+
+
+class SchemaUpgradeError(Exception):
+    pass
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def ensure_column(cursor, table, column, definition):
+    if not column_exists(cursor, table, column):
+        print(f"🔨 Adding column {table}.{column}...")
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def index_exists(cursor, table, index):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def ensure_index(cursor, table, index, columns, unique=False):
+    if not index_exists(cursor, table, index):
+        print(f"🔨 Creating {'unique ' if unique else ''}index {index} on {table} ({columns})...")
+        cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {index} ON {table} ({columns})")
+
+
+def table_exists(cursor, table):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def ensure_table(cursor, table, definition):
+    """Creates `table` if it's missing; returns True if it was created."""
+    if table_exists(cursor, table):
+        return False
+    print(f"🔨 Creating table {table}...")
+    cursor.execute(f"CREATE TABLE {table} ({definition})")
+    return True
+
+
+CENTER_NATURAL_KEY = (
+    "BINARY(16) AS (UNHEX(MD5(CONCAT(LOWER(TRIM(name)), '|', LOWER(TRIM(address)))))) STORED"
+)
+
+# Rows whose name and address repeat an older row's (the older one is kept)
+DUPLICATE_CENTERS_WHERE = (
+    "FROM recycling_centers newer JOIN recycling_centers older "
+    "ON newer.natural_key = older.natural_key AND newer.id > older.id"
+)
+
+
+def count_duplicate_centers(cursor):
+    cursor.execute(f"SELECT COUNT(DISTINCT newer.id) {DUPLICATE_CENTERS_WHERE}")
+    return cursor.fetchone()[0]
+
+
+def dedupe_centers(cursor):
+    """Deletes every center that repeats an older row's name and address;
+    returns how many rows were removed. Only run from dedupe_centers.py."""
+    cursor.execute(f"DELETE newer {DUPLICATE_CENTERS_WHERE}")
+    return cursor.rowcount
+
+
+ROLLUP_MEASURE_COLUMNS = (
+    "scan_count INT NOT NULL, "
+    "confidence_sum DOUBLE NOT NULL, "
+    "confidence_min FLOAT NOT NULL, "
+    "confidence_max FLOAT NOT NULL"
+)
+ROLLUP_TABLES = {
+    "scan_stats_hourly": f"bucket DATETIME NOT NULL, waste_type VARCHAR(255) NOT NULL, {ROLLUP_MEASURE_COLUMNS}, "
+                         "PRIMARY KEY (bucket, waste_type)",
+    "scan_stats_daily": f"bucket DATE NOT NULL, waste_type VARCHAR(255) NOT NULL, {ROLLUP_MEASURE_COLUMNS}, "
+                        "PRIMARY KEY (bucket, waste_type)",
+    "scan_stats_geo": f"cell_lat INT NOT NULL, cell_lon INT NOT NULL, waste_type VARCHAR(255) NOT NULL, "
+                      f"{ROLLUP_MEASURE_COLUMNS}, PRIMARY KEY (cell_lat, cell_lon, waste_type)",
+}
+
+
+def upgrade(cursor):
+    # Spatial index filters centers by material
+    ensure_column(cursor, "recycling_centers", "accepted_materials", "JSON")
+
+    # load_centers.py upserts on (name, address). address is TEXT, so the
+    # unique key is a stored hash of both, normalised the way the loader does.
+    ensure_column(cursor, "recycling_centers", "natural_key", CENTER_NATURAL_KEY)
+    if not index_exists(cursor, "recycling_centers", "uq_centers_natural_key"):
+        # Never delete production rows from here: leave that to an explicit run
+        duplicates = count_duplicate_centers(cursor)
+        if duplicates:
+            raise SchemaUpgradeError(
+                f"{duplicates} recycling_centers rows repeat an older row's name and address, so "
+                "uq_centers_natural_key can't be created. Review them, then run "
+                "`python dedupe_centers.py --apply` and upgrade again.")
+        ensure_index(cursor, "recycling_centers", "uq_centers_natural_key", "natural_key", unique=True)
+    # Lets the spatial index notice rows updated in place, not just appended
+    ensure_column(cursor, "recycling_centers", "updated_at",
+                  "TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)")
+    ensure_index(cursor, "recycling_centers", "idx_centers_updated", "updated_at")
+
+    # Where the photo was taken (optional), for the geo rollup
+    ensure_column(cursor, "scans", "latitude", "FLOAT")
+    ensure_column(cursor, "scans", "longitude", "FLOAT")
+
+    # When each stored recovery protocol was generated, so its TTL survives restarts
+    ensure_column(cursor, "waste_categories", "protocol_fetched_at", "TIMESTAMP NULL")
+
+    # Every detected box, packed (see detections.py); NULL for older scans
+    ensure_column(cursor, "scans", "detections", "BLOB")
+
+    # Set by edge devices syncing from their local store (storage.py), so a
+    # retried push can't insert the same scan twice; NULL for server-side scans
+    ensure_column(cursor, "scans", "client_id", "CHAR(32)")
+    ensure_index(cursor, "scans", "uq_scans_client_id", "client_id", unique=True)
+
+    # Scan history: keyset pages run newest-first by id, optionally filtered
+    # by waste type and/or a time range
+    ensure_index(cursor, "scans", "idx_scans_type_id", "waste_type, id")
+    ensure_index(cursor, "scans", "idx_scans_timestamp_id", "timestamp, id")
+    ensure_index(cursor, "scans", "idx_scans_type_timestamp", "waste_type, timestamp")
+
+    # /stats rollups, kept current by every scan insert. Tables created here
+    # start empty, so fold in the scans that already exist.
+    created = [table for table, definition in ROLLUP_TABLES.items() if ensure_table(cursor, table, definition)]
+    if created:
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM scans")
+        last_id = cursor.fetchone()[0]
+        print(f"📊 Backfilling {', '.join(created)} up to scan id {last_id}...")
+        update_rollups(cursor, 0, last_id, tables=created)
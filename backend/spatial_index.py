@@ -0,0 +1,192 @@
+import os
+import json
+import math
+import heapq
+import threading
+from collections import defaultdict
+from storage import store
+
+# --- NEAREST RECYCLING CENTERS ---
+# recycling_centers is mirrored in memory as a lat/lon grid of
+# CENTERS_CELL_DEG-sized buckets, one grid for all centers plus one per
+# accepted material. A k-nearest query walks rings of cells outward from the
+# query point and stops as soon as no unvisited cell can hold anything closer
+# than the current k-th result, so it only touches a handful of buckets no
+# matter how large the table gets.
+
+CENTERS_CELL_DEG = float(os.getenv("CENTERS_CELL_DEG", "0.25"))
+CENTERS_REFRESH_SECONDS = float(os.getenv("CENTERS_REFRESH_SECONDS", "30"))
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_materials(raw):
+    """accepted_materials is a JSON array column; returns a lowercase list."""
+    if raw is None:
+        return []
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8")
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return []
+    return [str(m).strip().lower() for m in raw if str(m).strip()]
+
+
+class _Grid:
+    def __init__(self, cell_deg):
+        self.cell_deg = cell_deg
+        self.cells = defaultdict(list)
+        # Bounding box of occupied cells, used to stop ring searches early
+        self.min_i = self.min_j = math.inf
+        self.max_i = self.max_j = -math.inf
+
+    def cell_of(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def add(self, center):
+        i, j = self.cell_of(center["latitude"], center["longitude"])
+        self.cells[(i, j)].append(center)
+        self.min_i, self.max_i = min(self.min_i, i), max(self.max_i, i)
+        self.min_j, self.max_j = min(self.min_j, j), max(self.max_j, j)
+
+    def _ring(self, ci, cj, r):
+        if r == 0:
+            yield ci, cj
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield ci - r, j
+            yield ci + r, j
+        for i in range(ci - r + 1, ci + r):
+            yield i, cj - r
+            yield i, cj + r
+
+    def nearest(self, lat, lon, k):
+        if not self.cells:
+            return []
+        ci, cj = self.cell_of(lat, lon)
+        # Max ring needed to reach every occupied cell
+        max_r = max(abs(ci - self.min_i), abs(ci - self.max_i), abs(cj - self.min_j), abs(cj - self.max_j))
+        best = []  # max-heap of (-distance, id, center)
+        r = 0
+        while r <= max_r:
+            for cell in self._ring(ci, cj, r):
+                for center in self.cells.get(cell, ()):
+                    d = haversine_km(lat, lon, center["latitude"], center["longitude"])
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, center["id"], center))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, center["id"], center))
+            # Anything in ring r+1 or beyond is at least r cells away in
+            # latitude or longitude; longitude degrees shrink toward the poles.
+            if len(best) == k:
+                widest_lat = math.radians(min(89.9, abs(lat) + (r + 1) * self.cell_deg))
+                half_span = math.radians(r * self.cell_deg) / 2
+                bound = 2 * EARTH_RADIUS_KM * math.asin(math.cos(widest_lat) * math.sin(half_span))
+                if bound >= -best[0][0]:
+                    break
+            r += 1
+        return sorted(((-neg_d, center) for neg_d, _, center in best), key=lambda item: item[0])
+
+
+class CenterIndex:
+    def __init__(self, cell_deg=CENTERS_CELL_DEG, refresh_seconds=CENTERS_REFRESH_SECONDS):
+        self.cell_deg = cell_deg
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._all = _Grid(cell_deg)
+        self._by_material = {}
+        self._centers = []
+        self._count = 0
+        self._max_id = 0
+        self._updated_at = None  # newest recycling_centers.updated_at seen
+        # Bumped on every change so derived caches (map clusters) know to rebuild
+        self.version = 0
+        self.loaded = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _add(self, row):
+        center = dict(row)
+        center["materials"] = parse_materials(center.pop("accepted_materials", None))
+        self._centers.append(center)
+        self._all.add(center)
+        for material in center["materials"]:
+            self._by_material.setdefault(material, _Grid(self.cell_deg)).add(center)
+        self._count += 1
+        self._max_id = max(self._max_id, center["id"])
+
+    def rebuild(self, updated_at=None):
+        rows = store.fetch_centers_after(0)
+        fresh = CenterIndex(self.cell_deg, self.refresh_seconds)
+        for row in rows:
+            fresh._add(row)
+        with self._lock:
+            self._all, self._by_material = fresh._all, fresh._by_material
+            self._centers, self._count, self._max_id = fresh._centers, fresh._count, fresh._max_id
+            self._updated_at = updated_at
+            self.version += 1
+            self.loaded = True
+        print(f"🗺️ Center index built ({self._count} centers)")
+
+    def sync(self):
+        """Appends rows added since the last sync; rebuilds if rows were removed,
+        replaced or updated in place."""
+        count, max_id, updated_at = store.centers_version()
+        if self.loaded and (count, max_id, updated_at) == (self._count, self._max_id, self._updated_at):
+            return
+        if not self.loaded or max_id < self._max_id:
+            return self.rebuild(updated_at)
+        if self._updated_at is not None and store.count_centers_updated(self._max_id, self._updated_at):
+            return self.rebuild(updated_at)
+        new_rows = store.fetch_centers_after(self._max_id)
+        if self._count + len(new_rows) != count:
+            return self.rebuild(updated_at)
+        with self._lock:
+            for row in new_rows:
+                self._add(row)
+            self._updated_at = updated_at
+            self.version += 1
+        print(f"🗺️ Center index: +{len(new_rows)} centers ({self._count} total)")
+
+    def nearest(self, lat, lon, k=5, material=None):
+        """Returns [(distance_km, center)] for the k closest centers, optionally accepting `material`."""
+        with self._lock:
+            grid = self._all if not material else self._by_material.get(material.strip().lower())
+            if grid is None:
+                return []
+            return grid.nearest(lat, lon, k)
+
+    def snapshot(self):
+        """(version, list of all centers) taken atomically."""
+        with self._lock:
+            return self.version, list(self._centers)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="center-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"⚠️ Center index sync failed: {e}")
+            if self._stop.wait(self.refresh_seconds):
+                return
@@ -0,0 +1,379 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+import functools
+from datetime import datetime, timedelta, timezone
+import db
+
+# --- STORAGE BACKENDS ---
+# STORAGE_BACKEND=mysql (default): scans and centers are read from and written
+# to RDS directly, as before.
+# STORAGE_BACKEND=sqlite: for edge sites with a patchy link. Scans are written
+# to an embedded SQLite file (WAL, synchronous=NORMAL) and read back from it,
+# and recycling_centers is mirrored into the same file, so the request path
+# never waits on the network. A sync thread pushes unsynced scans to MySQL in
+# batches (plus advice that was filled in after the push) and refreshes the
+# centers mirror whenever RDS answers. A scan is marked synced only after its
+# INSERT has committed, so an outage just grows the backlog. Every local scan
+# has a random client_id (UNIQUE in MySQL too), which makes a push idempotent:
+# a batch that committed but wasn't marked synced is skipped when retried.
+# Waste-category advice and the statistics rollups still come from MySQL
+# (advice is cached in memory; stats cover the scans synced so far).
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mysql").lower()
+LOCAL_DB_PATH = os.getenv("LOCAL_DB_PATH", "scwm_local.sqlite3")
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", "5"))
+SYNC_BATCH = int(os.getenv("SYNC_BATCH", "500"))
+# Retry delay doubles while MySQL is unreachable, up to this
+SYNC_MAX_BACKOFF = float(os.getenv("SYNC_MAX_BACKOFF", "300"))
+CENTERS_PULL_INTERVAL = float(os.getenv("CENTERS_PULL_INTERVAL", "600"))
+# Synced scans older than this are deleted locally; 0 = keep everything
+LOCAL_KEEP_SYNCED_DAYS = float(os.getenv("LOCAL_KEEP_SYNCED_DAYS", "0"))
+LOCAL_BUSY_TIMEOUT = float(os.getenv("LOCAL_BUSY_TIMEOUT", "5"))
+
+# Mirrors the MySQL tables; remote_id / advice_dirty track what still has to be pushed
+LOCAL_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS scans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        waste_type TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        timestamp TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        latitude REAL,
+        longitude REAL,
+        gemini_advice TEXT,
+        detections BLOB,
+        client_id TEXT,
+        remote_id INTEGER,
+        advice_dirty INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_scans_unsynced ON scans (id) WHERE remote_id IS NULL",
+    "CREATE INDEX IF NOT EXISTS idx_scans_advice_dirty ON scans (id) WHERE advice_dirty = 1",
+    "CREATE INDEX IF NOT EXISTS idx_scans_type_id ON scans (waste_type, id)",
+    "CREATE INDEX IF NOT EXISTS idx_scans_timestamp ON scans (timestamp)",
+    """CREATE TABLE IF NOT EXISTS recycling_centers (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        address TEXT NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        accepted_materials TEXT,
+        contact_info TEXT,
+        updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+    )""",
+    "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT)",
+)
+# Files created before scans had a client_id
+LOCAL_UPGRADES = (
+    ("client_id", "ALTER TABLE scans ADD COLUMN client_id TEXT"),
+)
+BACKFILL_CLIENT_IDS = "UPDATE scans SET client_id = lower(hex(randomblob(16))) WHERE client_id IS NULL"
+
+INSERT_LOCAL_SCAN = "INSERT INTO scans ({}, client_id, timestamp) VALUES ({}, ?, COALESCE(?, CURRENT_TIMESTAMP))".format(
+    ", ".join(db.SCAN_COLUMNS), ", ".join(["?"] * len(db.SCAN_COLUMNS)))
+UPDATE_LOCAL_ADVICE = "UPDATE scans SET gemini_advice = ?, advice_dirty = 1 WHERE id = ?"
+SELECT_UNSYNCED = "SELECT id, {} FROM scans WHERE remote_id IS NULL ORDER BY id LIMIT ?".format(
+    ", ".join(db.SYNCED_SCAN_COLUMNS))
+# Advice that changed while the INSERT was in flight stays dirty and is pushed next
+MARK_SYNCED = "UPDATE scans SET remote_id = ?, advice_dirty = CASE WHEN gemini_advice IS ? THEN 0 ELSE 1 END WHERE id = ?"
+SELECT_DIRTY_ADVICE = "SELECT id, remote_id, gemini_advice FROM scans WHERE advice_dirty = 1 AND remote_id IS NOT NULL LIMIT ?"
+CLEAR_DIRTY_ADVICE = "UPDATE scans SET advice_dirty = 0 WHERE id = ? AND gemini_advice IS ?"
+INSERT_LOCAL_CENTER = (
+    "INSERT OR REPLACE INTO recycling_centers "
+    "(id, name, address, latitude, longitude, accepted_materials, contact_info) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _utc_text(value):
+    # Local timestamps are UTC text, which compares correctly as a string
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _text(value):
+    return value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else value
+
+
+@functools.lru_cache(maxsize=None)
+def _history_sql(filters, with_detections=False):
+    clauses = {
+        "before_id": "id < ?",
+        "waste_type": "waste_type = ?",
+        "since": "timestamp >= ?",
+        "until": "timestamp < ?",
+        "min_confidence": "confidence >= ?",
+    }
+    where = " AND ".join(clauses[name] for name in filters)
+    return (
+        f"SELECT {db.HISTORY_COLUMNS}{', detections' if with_detections else ''} FROM scans"
+        + (f" WHERE {where}" if where else "")
+        + " ORDER BY id DESC LIMIT ?"
+    )
+
+
+class LocalStore:
+    """Same call signatures as the scans/centers functions in db.py, served from SQLite."""
+
+    def __init__(self, path=LOCAL_DB_PATH, sync_interval=SYNC_INTERVAL, batch=SYNC_BATCH):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.batch = max(1, batch)
+        self._local = threading.local()  # one connection per thread; WAL lets readers run beside the writer
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._sync_lock_file = None
+        self._next_pull = 0.0
+        self.link = "unknown"  # "up" / "down" as last seen by the sync thread
+        self.last_sync = None
+        self.synced = 0
+        self._backoff = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=LOCAL_BUSY_TIMEOUT)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Commits skip the fsync; a power cut can lose the last few, never corrupt the file
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    with conn:
+                        for statement in LOCAL_SCHEMA:
+                            conn.execute(statement)
+                        columns = {row[1] for row in conn.execute("PRAGMA table_info(scans)")}
+                        for column, statement in LOCAL_UPGRADES:
+                            if column not in columns:
+                                conn.execute(statement)
+                        conn.execute(BACKFILL_CLIENT_IDS)
+                        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS uq_scans_client_id ON scans (client_id)")
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    # --- scans ---
+
+    def insert_scan(self, waste_type, confidence, advice, latitude=None, longitude=None, detections=None):
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(INSERT_LOCAL_SCAN, (waste_type, confidence, advice, latitude, longitude, detections,
+                                                      uuid.uuid4().hex, None))
+        return cursor.lastrowid
+
+    def insert_scans(self, records):
+        """Inserts scan records in one transaction; returns the first id (row i gets first_id + i)."""
+        rows = [tuple(record.get(column) for column in db.SCAN_COLUMNS) + (uuid.uuid4().hex, record.get("timestamp"))
+                for record in records]
+        conn = self._conn()
+        with conn:
+            conn.executemany(INSERT_LOCAL_SCAN, rows)
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return last_id - len(rows) + 1
+
+    def update_scan_advice(self, scan_id, advice):
+        conn = self._conn()
+        with conn:
+            conn.execute(UPDATE_LOCAL_ADVICE, (advice, scan_id))
+
+    def fetch_history(self, limit=10, before_id=None, waste_type=None, since=None, until=None, min_confidence=None,
+                      with_detections=False):
+        filters = {
+            "before_id": before_id,
+            "waste_type": waste_type,
+            "since": _utc_text(since) if since is not None else None,
+            "until": _utc_text(until) if until is not None else None,
+            "min_confidence": min_confidence,
+        }
+        names = tuple(name for name, value in filters.items() if value is not None)
+        rows = self._conn().execute(_history_sql(names, with_detections),
+                                    tuple(filters[name] for name in names) + (limit,)).fetchall()
+        history = []
+        for row in rows:
+            scan = dict(row)
+            scan["timestamp"] = datetime.fromisoformat(scan["timestamp"])
+            history.append(scan)
+        return history
+
+    # --- recycling centers (local mirror) ---
+
+    def fetch_centers(self):
+        rows = self._conn().execute("SELECT name, address, latitude, longitude, contact_info FROM recycling_centers")
+        return [dict(row) for row in rows]
+
+    def fetch_centers_after(self, after_id):
+        rows = self._conn().execute(
+            "SELECT id, name, address, latitude, longitude, accepted_materials, contact_info "
+            "FROM recycling_centers WHERE id > ? ORDER BY id", (after_id,))
+        return [dict(row) for row in rows]
+
+    def centers_version(self):
+        count, max_id, updated_at = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0), MAX(updated_at) FROM recycling_centers").fetchone()
+        return count, max_id, updated_at
+
+    def count_centers_updated(self, max_id, since):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM recycling_centers WHERE id <= ? AND updated_at > ?", (max_id, since)).fetchone()[0]
+
+    def ping(self):
+        return self._conn().execute("SELECT 1").fetchone()[0]
+
+    # --- sync to MySQL ---
+
+    def _state(self, name):
+        row = self._conn().execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def push_scans(self):
+        """Sends the oldest unsynced scans to MySQL as one batch; returns how many."""
+        conn = self._conn()
+        rows = conn.execute(SELECT_UNSYNCED, (self.batch,)).fetchall()
+        if not rows:
+            return 0
+        remote_ids = db.insert_synced_scans([dict(row) for row in rows])
+        with conn:
+            conn.executemany(MARK_SYNCED, [
+                (remote_ids[row["client_id"]], row["gemini_advice"], row["id"]) for row in rows])
+        self.synced += len(rows)
+        return len(rows)
+
+    def push_advice(self):
+        """UPDATEs advice that arrived after its scan was pushed."""
+        conn = self._conn()
+        rows = conn.execute(SELECT_DIRTY_ADVICE, (self.batch,)).fetchall()
+        for row in rows:
+            db.update_scan_advice(row["remote_id"], row["gemini_advice"])
+            with conn:
+                conn.execute(CLEAR_DIRTY_ADVICE, (row["id"], row["gemini_advice"]))
+        return len(rows)
+
+    def pull_centers(self):
+        """Refreshes the recycling_centers mirror: appends new rows, or copies the
+        table again if rows were removed or edited. Returns rows written."""
+        count, max_id, updated_at = db.centers_version()
+        remote_version = f"{count}|{max_id}|{updated_at}"
+        if self._state("centers_version") == remote_version:
+            return 0
+        conn = self._conn()
+        local_count, local_max = conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM recycling_centers").fetchone()
+        since = self._state("centers_updated_at")
+        append = (local_count > 0 and max_id >= local_max and since is not None
+                  and not db.count_centers_updated(local_max, since))
+        rows = db.fetch_centers_after(local_max if append else 0)
+        if append and local_count + len(rows) != count:
+            append, rows = False, db.fetch_centers_after(0)
+        with conn:
+            if not append:
+                conn.execute("DELETE FROM recycling_centers")
+            conn.executemany(INSERT_LOCAL_CENTER, [
+                (row["id"], row["name"], row["address"], row["latitude"], row["longitude"],
+                 _text(row["accepted_materials"]), row["contact_info"])
+                for row in rows])
+            conn.executemany("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)", [
+                ("centers_version", remote_version),
+                ("centers_updated_at", None if updated_at is None else str(updated_at)),
+            ])
+        print(f"🗺️ Local centers mirror {'+' if append else ''}{len(rows)} rows")
+        return len(rows)
+
+    def prune(self):
+        if LOCAL_KEEP_SYNCED_DAYS <= 0:
+            return 0
+        cutoff = _utc_text(datetime.now(timezone.utc) - timedelta(days=LOCAL_KEEP_SYNCED_DAYS))
+        conn = self._conn()
+        with conn:
+            return conn.execute(
+                "DELETE FROM scans WHERE remote_id IS NOT NULL AND advice_dirty = 0 AND timestamp < ?",
+                (cutoff,)).rowcount
+
+    def sync(self):
+        """One sync pass. Raises if MySQL can't be reached; returns scans pushed."""
+        pushed = self.push_scans()
+        self.push_advice()
+        if time.monotonic() >= self._next_pull:
+            self.pull_centers()
+            self._next_pull = time.monotonic() + CENTERS_PULL_INTERVAL
+        self.prune()
+        return pushed
+
+    def pending(self):
+        return self._conn().execute("SELECT COUNT(*) FROM scans WHERE remote_id IS NULL").fetchone()[0]
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            "link": self.link,
+            "pending_scans": self.pending(),
+            "pending_advice": conn.execute(
+                "SELECT COUNT(*) FROM scans WHERE advice_dirty = 1 AND remote_id IS NOT NULL").fetchone()[0],
+            "synced": self.synced,
+            "last_sync": self.last_sync,
+        }
+
+    def _hold_sync_lock(self):
+        # Under gunicorn every worker has a store on the same file; only the
+        # process holding this lock pushes, or scans would be sent twice.
+        if self._sync_lock_file is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        lock_file = open(self.path + ".sync-lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._sync_lock_file = lock_file
+        return True
+
+    def _run(self):
+        delay = 0
+        while not self._stop.wait(delay):
+            delay = self.sync_interval
+            if not self._hold_sync_lock():
+                continue
+            try:
+                pushed = self.sync()
+            except Exception as e:
+                if self.link != "down":
+                    print(f"⚠️ MySQL sync failed, {self.pending()} scans kept locally: {e}")
+                self.link = "down"
+                self._backoff = min(max(self._backoff * 2, self.sync_interval), SYNC_MAX_BACKOFF)
+                delay = self._backoff
+                continue
+            if self.link == "down":
+                print(f"🔗 MySQL reachable again, {self.pending()} local scans left to sync")
+            self.link, self.last_sync, self._backoff = "up", time.time(), 0
+            if pushed >= self.batch:
+                delay = 0  # more waiting: keep draining
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._conn()
+        print(f"💽 Local store at {self.path} ({self.pending()} scans waiting to sync)")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="local-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._sync_lock_file is not None:
+            self._sync_lock_file.close()
+            self._sync_lock_file = None
+
+
+# What the app reads and writes scans/centers through: db itself, or the local store
+local_store = LocalStore() if STORAGE_BACKEND == "sqlite" else None
+store = local_store or db
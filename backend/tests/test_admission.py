@@ -0,0 +1,106 @@
+import json
+import asyncio
+import time
+from admission import Admission, AdmissionMiddleware
+
+
+class App:
+    """Downstream ASGI app that holds each request until release is set."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.scopes = []
+
+    async def __call__(self, scope, receive, send):
+        self.scopes.append(scope)
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def call(app, path, method="POST", headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), sent[1]["body"]
+
+
+def test_over_the_lane_limit_gets_429():
+    async def main():
+        inner = App()
+        admission = Admission()
+        admission.lanes["bulk"].limit = 1
+        app = AdmissionMiddleware(inner, admission)
+        first = asyncio.ensure_future(call(app, "/analyze/batch"))
+        await asyncio.sleep(0)
+        status, headers, body = await call(app, "/analyze/batch")
+        assert status == 429
+        assert headers[b"retry-after"] == b"2"
+        assert "bulk" in json.loads(body)["detail"]
+        # The interactive lane is counted separately
+        inner.release.set()
+        assert (await call(app, "/analyze"))[0] == 200
+        assert (await first)[0] == 200
+        return admission
+
+    admission = asyncio.run(main())
+    assert admission.stats()["bulk"] == {"active": 0, "limit": 1, "rejected": 1}
+
+
+def test_full_inference_queue_gets_503():
+    async def main():
+        inner = App()
+        inner.release.set()
+        full = set()
+        app = AdmissionMiddleware(inner, Admission(saturated=lambda lane: lane in full))
+        full.add("interactive")
+        status, headers, body = await call(app, "/analyze")
+        assert status == 503 and b"retry-after" in headers
+        assert json.loads(body) == {"detail": "Inference queue is full"}
+        assert (await call(app, "/analyze/batch"))[0] == 200
+        full.clear()
+        assert (await call(app, "/analyze"))[0] == 200
+        return inner
+
+    inner = asyncio.run(main())
+    assert [scope["path"] for scope in inner.scopes] == ["/analyze/batch", "/analyze"]
+
+
+def test_other_routes_are_never_admitted():
+    async def main():
+        inner = App()
+        inner.release.set()
+        admission = Admission(saturated=lambda lane: True)
+        for lane in admission.lanes.values():
+            lane.active = lane.limit
+        app = AdmissionMiddleware(inner, admission)
+        assert (await call(app, "/centers", method="GET"))[0] == 200
+        assert (await call(app, "/analyze", method="GET"))[0] == 200
+        assert (await call(app, "/health", method="GET"))[0] == 200
+
+    asyncio.run(main())
+
+
+def test_client_can_shorten_the_deadline():
+    async def main():
+        inner = App()
+        inner.release.set()
+        app = AdmissionMiddleware(inner, Admission())
+        before = time.monotonic()
+        await call(app, "/analyze", headers=[(b"x-deadline-ms", b"500")])
+        await call(app, "/analyze", headers=[(b"x-deadline-ms", b"99999999")])
+        await call(app, "/analyze", headers=[(b"x-deadline-ms", b"soon")])
+        return before, [scope["state"]["deadline"] - before for scope in inner.scopes]
+
+    before, budgets = asyncio.run(main())
+    assert 0.4 < budgets[0] <= 0.6
+    # Longer or malformed requests fall back to ANALYZE_DEADLINE_MS
+    assert 14 < budgets[1] <= 15.1 and 14 < budgets[2] <= 15.1
@@ -0,0 +1,196 @@
+import time
+import asyncio
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import executors
+from batcher import InferenceBatcher, QueueFull, DeadlineExceeded
+
+
+class FakeModel:
+    """Records every batch it is given; answers each image with f"result:{image}".
+    With gate set, each call blocks until gate.set()."""
+
+    def __init__(self, gate=None, fail=False):
+        self.calls = []
+        self.gate = gate
+        self.fail = fail
+        self.started = threading.Event()
+
+    def __call__(self, images):
+        self.calls.append(list(images))
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("model exploded")
+        return [f"result:{image}" for image in images]
+
+
+async def wait_started(model):
+    await asyncio.get_running_loop().run_in_executor(None, model.started.wait, 5)
+    model.started.clear()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_callers_share_one_batch():
+    model = FakeModel()
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=8, window_ms=50)
+        results = await asyncio.gather(*(batcher.predict(i) for i in range(5)))
+        await batcher.close()
+        return batcher, results
+
+    batcher, results = run(main())
+    assert results == [f"result:{i}" for i in range(5)]
+    assert model.calls == [[0, 1, 2, 3, 4]]
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["images"] == 5
+
+
+def test_batches_are_capped_at_max_batch_size():
+    model = FakeModel()
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=3, window_ms=50)
+        results = await asyncio.gather(*(batcher.predict(i) for i in range(7)))
+        await batcher.close()
+        return results
+
+    assert run(main()) == [f"result:{i}" for i in range(7)]
+    assert [len(call) for call in model.calls] == [3, 3, 1]
+
+
+def test_interactive_lane_is_served_before_bulk():
+    gate = threading.Event()
+    model = FakeModel(gate)
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=1, window_ms=0)
+        first = asyncio.ensure_future(batcher.predict("first"))
+        await wait_started(model)
+        # Queued while the model is busy: bulk arrives first but runs last
+        bulk = asyncio.ensure_future(batcher.predict("bulk", lane="bulk"))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(batcher.predict("interactive"))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, bulk, interactive)
+        await batcher.close()
+
+    run(main())
+    assert model.calls == [["first"], ["interactive"], ["bulk"]]
+
+
+def test_full_lane_raises_queue_full():
+    gate = threading.Event()
+    model = FakeModel(gate)
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=1, window_ms=0, queue_limits={"interactive": 2, "bulk": 1})
+        running = asyncio.ensure_future(batcher.predict("running"))
+        await wait_started(model)
+        waiting = [asyncio.ensure_future(batcher.predict(i)) for i in range(2)]
+        await asyncio.sleep(0)
+        assert batcher.saturated("interactive") and not batcher.saturated("bulk")
+        with pytest.raises(QueueFull):
+            await batcher.predict("one too many")
+        # The bulk lane has its own limit
+        bulk = asyncio.ensure_future(batcher.predict("bulk", lane="bulk"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            await batcher.predict("bulk too many", lane="bulk")
+        gate.set()
+        await asyncio.gather(running, bulk, *waiting)
+        await batcher.close()
+        return batcher
+
+    batcher = run(main())
+    assert batcher.rejected == {"interactive": 1, "bulk": 1}
+    assert "one too many" not in sum(model.calls, [])
+
+
+def test_expired_image_is_dropped_without_running():
+    gate = threading.Event()
+    model = FakeModel(gate)
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=8, window_ms=0)
+        running = asyncio.ensure_future(batcher.predict("running"))
+        await wait_started(model)
+        with pytest.raises(DeadlineExceeded):
+            await batcher.predict("late", deadline=time.monotonic() + 0.05)
+        gate.set()
+        await running
+        # Give the worker a chance to look at the queue again
+        await batcher.predict("next")
+        await batcher.close()
+
+    run(main())
+    assert model.calls == [["running"], ["next"]]
+
+
+def test_deadline_already_passed_when_taken():
+    gate = threading.Event()
+    model = FakeModel(gate)
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=8, window_ms=0)
+        running = asyncio.ensure_future(batcher.predict("running"))
+        await wait_started(model)
+        # Queue directly so the caller's own timeout can't fire first
+        future = asyncio.get_running_loop().create_future()
+        batcher._lanes["interactive"].append(("stale", future, time.monotonic() - 1))
+        batcher._arrived.set()
+        gate.set()
+        await running
+        with pytest.raises(DeadlineExceeded):
+            await future
+        await batcher.close()
+        return batcher
+
+    batcher = run(main())
+    assert batcher.expired == 1
+    assert model.calls == [["running"]]
+
+
+def test_model_errors_reach_every_caller_in_the_batch():
+    model = FakeModel(fail=True)
+
+    async def main():
+        batcher = InferenceBatcher(model, max_batch_size=8, window_ms=50)
+        results = await asyncio.gather(*(batcher.predict(i) for i in range(3)), return_exceptions=True)
+        await batcher.close()
+        return batcher, results
+
+    batcher, results = run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert batcher.errors == 1 and batcher.stats()["in_flight"] == 0
+
+
+def test_each_replica_runs_one_batch_at_a_time(monkeypatch):
+    # One inference thread per replica, as main.start_model sets it up
+    monkeypatch.setattr(executors, "inference_pool", ThreadPoolExecutor(max_workers=2))
+    gate = threading.Event()
+    replicas = [FakeModel(gate), FakeModel(gate)]
+
+    async def main():
+        batcher = InferenceBatcher(replicas, max_batch_size=1, window_ms=0)
+        first = asyncio.ensure_future(batcher.predict("a"))
+        second = asyncio.ensure_future(batcher.predict("b"))
+        for replica in replicas:
+            await wait_started(replica)
+        # Both replicas are busy, so a third image waits in the queue
+        third = asyncio.ensure_future(batcher.predict("c"))
+        await asyncio.sleep(0.05)
+        assert batcher.in_flight == 2 and batcher.queued() == 1
+        gate.set()
+        results = await asyncio.gather(first, second, third)
+        await batcher.close()
+        return results
+
+    assert run(main()) == ["result:a", "result:b", "result:c"]
+    assert sorted(sum((replica.calls for replica in replicas), []), key=str) == [["a"], ["b"], ["c"]]
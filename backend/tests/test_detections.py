@@ -0,0 +1,75 @@
+import numpy as np
+from detections import PACK_VERSION, PACKED_BOX, pack, unpack, composition, describe
+
+NAMES = {0: "Concrete", 1: "Brick", 2: "Metal"}
+
+CLS = np.array([1, 0, 1])
+CONF = np.array([0.9, 0.75, 0.5], dtype=np.float32)
+XYXY = np.array([
+    [0.0, 0.0, 0.5, 0.5],    # Brick, area 0.25
+    [0.5, 0.5, 1.0, 0.75],   # Concrete, area 0.125
+    [0.25, 0.0, 0.75, 0.2],  # Brick, area 0.1
+], dtype=np.float32)
+
+
+def test_layout_is_a_version_byte_then_12_bytes_per_box():
+    blob = pack(CLS, CONF, XYXY)
+    assert PACKED_BOX.itemsize == 12
+    assert len(blob) == 1 + 12 * 3
+    assert blob[0] == PACK_VERSION
+    # First box: class 1, conf 0.9 * 65535, corners 0, 0, 0.5, 0.5 (little endian uint16)
+    assert blob[1:13] == np.array([1, 58982, 0, 0, 32768, 32768], dtype="<u2").tobytes()
+
+
+def test_pack_unpack_round_trip():
+    cls, conf, xyxy = unpack(pack(CLS, CONF, XYXY))
+    assert cls.tolist() == [1, 0, 1]
+    np.testing.assert_allclose(conf, CONF, atol=1 / 65535)
+    np.testing.assert_allclose(xyxy, XYXY, atol=1 / 65535)
+
+
+def test_values_are_clipped_to_the_unit_range():
+    cls, conf, _ = unpack(pack(np.array([2]), np.array([1.5]), np.array([[0.0, 0.0, 1.0, 1.0]])))
+    assert cls.tolist() == [2]
+    assert conf.tolist() == [1.0]
+
+
+def test_empty_result():
+    blob = pack(np.zeros(0), np.zeros(0), np.zeros((0, 4)))
+    assert blob == bytes([PACK_VERSION])
+    cls, conf, xyxy = unpack(blob)
+    assert cls.shape == (0,) and conf.shape == (0,) and xyxy.shape == (0, 4)
+    assert describe(blob, NAMES) == {"detections": [], "composition": {}}
+
+
+def test_missing_or_unknown_blobs_unpack_empty():
+    for blob in (None, b"", bytes([PACK_VERSION + 1]) + bytes(12)):
+        cls, conf, xyxy = unpack(blob)
+        assert len(cls) == len(conf) == len(xyxy) == 0
+
+
+def test_composition_matches_hand_computed_numbers():
+    result = composition(CLS, CONF, XYXY, NAMES)
+    # Largest summed area first
+    assert list(result) == ["Brick", "Concrete"]
+    assert result["Brick"] == {
+        "count": 2,
+        "area_fraction": 0.35,        # 0.25 + 0.1
+        "max_confidence": 0.9,
+        "mean_confidence": 0.7,       # (0.9 + 0.5) / 2
+    }
+    assert result["Concrete"] == {
+        "count": 1,
+        "area_fraction": 0.125,
+        "max_confidence": 0.75,
+        "mean_confidence": 0.75,
+    }
+
+
+def test_describe_lists_every_box_with_class_names():
+    described = describe(pack(CLS, CONF, XYXY), NAMES)
+    assert [box["waste_type"] for box in described["detections"]] == ["Brick", "Concrete", "Brick"]
+    assert described["detections"][0]["box"] == [0.0, 0.0, 0.5, 0.5]
+    assert described["composition"]["Brick"]["count"] == 2
+    # Unknown class ids fall back to the id itself
+    assert list(describe(pack(np.array([7]), np.array([0.5]), np.array([[0, 0, 1, 1]])), NAMES)["composition"]) == ["7"]
@@ -0,0 +1,47 @@
+import pytest
+from storage import LocalStore
+
+
+@pytest.fixture
+def local(tmp_path):
+    store = LocalStore(str(tmp_path / "local.sqlite3"))
+    types = ["Brick", "Metal", "Concrete"]
+    store.insert_scans([{"waste_type": types[i % 3], "confidence": (i % 10) / 10, "gemini_advice": None}
+                        for i in range(25)])
+    return store
+
+
+def pages(store, limit, **filters):
+    """Walks /history the way a client does: ask for limit + 1 rows, pass the
+    last id shown back as the cursor until a short page comes back."""
+    cursor, seen = None, []
+    while True:
+        rows = store.fetch_history(limit + 1, cursor, **filters)
+        page = rows[:limit]
+        seen.append([row["id"] for row in page])
+        if len(rows) <= limit:
+            return seen
+        cursor = page[-1]["id"]
+
+
+def test_cursor_walks_every_scan_once_newest_first(local):
+    seen = pages(local, 10)
+    assert [len(page) for page in seen] == [10, 10, 5]
+    assert sum(seen, []) == list(range(25, 0, -1))
+
+
+def test_exact_multiple_of_the_page_size_ends_without_an_empty_page(local):
+    assert [len(page) for page in pages(local, 5)] == [5, 5, 5, 5, 5]
+
+
+def test_cursor_keeps_filters(local):
+    seen = sum(pages(local, 3, waste_type="Metal"), [])
+    assert seen == [i + 1 for i in range(24, -1, -1) if i % 3 == 1]
+    assert sum(pages(local, 4, min_confidence=0.8), []) == [i + 1 for i in range(24, -1, -1) if i % 10 >= 8]
+
+
+def test_rows_added_while_paging_do_not_shift_later_pages(local):
+    first = local.fetch_history(6)
+    local.insert_scans([{"waste_type": "Brick", "confidence": 0.5, "gemini_advice": None}] * 3)
+    second = local.fetch_history(5, first[4]["id"])
+    assert [row["id"] for row in second] == [20, 19, 18, 17, 16]
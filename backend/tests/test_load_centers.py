@@ -0,0 +1,50 @@
+import os
+import pytest
+from load_centers import Deduper, read_csv, unique_centers
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def stats():
+    return {"read": 0, "rejected": 0, "duplicates": 0, "merged": 0, "written": 0}
+
+
+def row(name, address, lat=12.9716, lon=77.5946):
+    return (name, address, lat, lon, None, None)
+
+
+def test_same_name_at_the_same_spot_with_other_addresses_are_kept():
+    counts = stats()
+    rows = list(unique_centers(read_csv(os.path.join(DATA_DIR, "centers_bengaluru.csv")), Deduper(0), counts))
+    bbmp = sorted(address for name, address, *_ in rows if name == "BBMP Construction Waste Unit")
+    assert bbmp == ["Channasandra Bengaluru", "Chikkajala Bengaluru", "Kannur Bengaluru"]
+    assert counts["merged"] == 0
+
+
+def test_only_the_natural_key_dedupes_by_default():
+    counts = stats()
+    rows = [row("Unit", "Kannur"), row("unit ", "KANNUR"), row("Unit", "Kannur", 13.5, 78.0), row("Unit", "Chikkajala")]
+    kept = list(unique_centers(rows, Deduper(0), counts))
+    assert [address for _, address, *_ in kept] == ["Kannur", "Chikkajala"]
+    assert counts["duplicates"] == 2
+
+
+def test_merging_nearby_centers_is_opt_in_and_reported():
+    counts, merges = stats(), []
+    rows = [row("Unit", "Kannur"), row("Unit", "Kannur Main Rd", 12.9717, 77.5946), row("Unit", "Hosur", 12.98, 77.5946)]
+    kept = list(unique_centers(rows, Deduper(50), counts, merges=merges))
+    assert [address for _, address, *_ in kept] == ["Kannur", "Hosur"]
+    assert merges == [("Unit", "Kannur Main Rd", "Kannur")]
+    assert counts["merged"] == 1 and counts["duplicates"] == 1
+
+
+def test_rows_matching_a_stored_center_update_it():
+    counts = stats()
+    kept = list(unique_centers([row("Unit", "Kannur", 12.98, 77.6)], Deduper(0), counts, known={"unit|kannur"}))
+    assert kept == [row("Unit", "Kannur", 12.98, 77.6)]
+
+
+def test_dedupe_existing_needs_a_distance():
+    from load_centers import dedupe_existing
+    with pytest.raises(ValueError):
+        dedupe_existing(0)
@@ -0,0 +1,36 @@
+import io
+import pytest
+from PIL import Image
+import preprocess
+from preprocess import decode_image, ImageRejected
+
+
+@pytest.fixture
+def limit(monkeypatch):
+    # Both guards at 1000 pixels, as MAX_IMAGE_PIXELS=1000 sets them at import
+    monkeypatch.setattr(preprocess, "MAX_IMAGE_PIXELS", 1000)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+
+
+def png(width, height):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (90, 60, 30)).save(buf, "PNG")
+    buf.seek(0)
+    return buf
+
+
+def test_image_within_the_limit_decodes(limit):
+    assert decode_image(png(30, 30)).size == (30, 30)
+
+
+@pytest.mark.parametrize("side", [40, 50, 200])  # 1.6x, 2.5x and 40x the limit
+def test_oversized_images_are_rejected_with_413(limit, side):
+    with pytest.raises(ImageRejected) as rejected:
+        decode_image(png(side, side))
+    assert rejected.value.status_code == 413
+
+
+def test_non_images_are_rejected_with_400():
+    with pytest.raises(ImageRejected) as rejected:
+        decode_image(io.BytesIO(b"not an image"))
+    assert rejected.value.status_code == 400
@@ -0,0 +1,54 @@
+import io
+import numpy as np
+from PIL import Image
+from preprocess import decode_image, image_signature
+from result_cache import ResultCache
+
+
+def jpeg(image, quality=90):
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=quality)
+    buf.seek(0)
+    return decode_image(buf)
+
+
+def textured(seed):
+    cells = np.random.default_rng(seed).integers(0, 256, (12, 16, 3), dtype=np.uint8)
+    return Image.fromarray(cells).resize((640, 480), Image.Resampling.BILINEAR)
+
+
+def test_flat_images_have_no_signature():
+    for colour in ((200, 30, 30), (20, 20, 220), (128, 128, 128)):
+        assert image_signature(jpeg(Image.new("RGB", (640, 480), colour))) is None
+    gradient = Image.linear_gradient("L").rotate(90).resize((640, 480)).convert("RGB")
+    assert image_signature(jpeg(gradient)) is None
+
+
+def test_flat_images_never_match_each_other():
+    cache = ResultCache(distance=4)
+    red = jpeg(Image.new("RGB", (640, 480), (200, 30, 30)))
+    blue = jpeg(Image.new("RGB", (640, 480), (20, 20, 220)))
+    cache.put("red", image_signature(red), {"waste_type": "Brick"})
+    assert cache.get_similar(image_signature(blue)) is None
+    # ...but the exact bytes are still cached
+    assert cache.get("red") == {"waste_type": "Brick"}
+
+
+def test_reencoded_photo_matches_and_different_photo_does_not():
+    cache = ResultCache(distance=4)
+    photo = textured(1)
+    cache.put("photo", image_signature(jpeg(photo, 95)), {"waste_type": "Wood"})
+    assert cache.get_similar(image_signature(jpeg(photo, 60))) == {"waste_type": "Wood"}
+    assert cache.get_similar(image_signature(jpeg(textured(2)))) is None
+
+
+def test_disk_tier_round_trips_missing_signature(tmp_path):
+    cache = ResultCache(namespace="m", directory=str(tmp_path))
+    cache.start()
+    cache.put("flat", None, {"waste_type": "Glass"})
+    cache.close()
+    reloaded = ResultCache(namespace="m", directory=str(tmp_path))
+    reloaded.start()
+    assert reloaded.get("flat") == {"waste_type": "Glass"}
+    assert reloaded.get_similar(0) is None
+    reloaded.close()
@@ -0,0 +1,193 @@
+import os
+from datetime import datetime, timezone
+import pytest
+import scan_writer
+from scan_writer import ScanWriter, BufferFull
+from storage import LocalStore
+
+
+class FakeStore:
+    """Stands in for db / LocalStore: insert_scans returns the first new id."""
+
+    def __init__(self):
+        self.rows = []
+        self.advice = {}
+        self.down = False
+
+    def insert_scans(self, records):
+        if self.down:
+            raise ConnectionError("DB is down")
+        first_id = len(self.rows) + 1
+        self.rows.extend(dict(record) for record in records)
+        return first_id
+
+    def update_scan_advice(self, scan_id, advice):
+        self.advice[scan_id] = advice
+
+
+@pytest.fixture
+def store(monkeypatch):
+    fake = FakeStore()
+    monkeypatch.setattr(scan_writer, "store", fake)
+    return fake
+
+
+def record(i, **extra):
+    return dict({"waste_type": "Brick", "confidence": 0.5 + i / 100, "gemini_advice": None}, **extra)
+
+
+def test_flush_saves_in_batches_and_resolves_refs(store):
+    writer = ScanWriter(flush_size=2, spill_file="unused")
+    refs = [writer.submit(record(i)) for i in range(5)]
+    assert writer.resolve(refs[0]) == ("queued", None)
+    assert writer.resolve("p-nope") == ("unknown", None)
+
+    assert writer.flush() == 5
+    assert writer.pending() == 0
+    assert [writer.resolve(ref) for ref in refs] == [("saved", i) for i in range(1, 6)]
+    assert [row["confidence"] for row in store.rows] == [0.5, 0.51, 0.52, 0.53, 0.54]
+
+
+def test_failed_flush_keeps_records_for_retry(store):
+    writer = ScanWriter(spill_file="unused")
+    ref = writer.submit(record(0))
+    store.down = True
+    with pytest.raises(ConnectionError):
+        writer.flush()
+    assert writer.pending() == 1 and writer.resolve(ref) == ("queued", None)
+
+    store.down = False
+    assert writer.flush() == 1
+    assert writer.resolve(ref) == ("saved", 1)
+
+
+def test_advice_follows_the_scan(store):
+    writer = ScanWriter(spill_file="unused")
+    buffered = writer.submit(record(0))
+    assert writer.update_advice(buffered, "crush it") is True
+    writer.flush()
+    assert store.rows[0]["gemini_advice"] == "crush it"
+
+    # Once saved, advice is written by id
+    assert writer.update_advice(buffered, "recycle it") is True
+    assert store.advice == {1: "recycle it"}
+    assert writer.update_advice("p-nope", "lost") is False
+
+
+def test_full_buffer_raises_buffer_full(store, monkeypatch):
+    monkeypatch.setattr(scan_writer, "SCAN_SUBMIT_TIMEOUT", 0.01)
+    writer = ScanWriter(flush_size=2, max_buffered=2, spill_file="unused")
+    writer.submit(record(0))
+    writer.submit(record(1))
+    with pytest.raises(BufferFull):
+        writer.submit(record(2))
+
+
+def test_close_spills_when_the_db_is_down_and_start_requeues(store, tmp_path):
+    spill_file = str(tmp_path / "scan_spill.jsonl")
+    writer = ScanWriter(spill_file=spill_file)
+    writer.submit(record(0, detections=b"\x01\x00\xff"))
+    writer.submit(record(1))
+    store.down = True
+    writer.close()
+    assert os.path.exists(f"{spill_file}.{os.getpid()}")
+
+    # Another process's leftovers and the old single-file name are swept too
+    with open(f"{spill_file}.99999", "w") as f:
+        f.write('{"waste_type": "Metal", "confidence": 0.9, "gemini_advice": null}\n')
+
+    store.down = False
+    restarted = ScanWriter(spill_file=spill_file)
+    restarted._load_spill()
+    assert restarted.pending() == 3
+    assert restarted.flush() == 3
+    assert [row.get("detections") for row in store.rows].count(b"\x01\x00\xff") == 1
+    assert sorted(row["waste_type"] for row in store.rows) == ["Brick", "Brick", "Metal"]
+    assert restarted._spill_files() == []
+
+
+def test_background_thread_flushes_on_interval(store, tmp_path):
+    writer = ScanWriter(flush_size=100, flush_interval=0.01, spill_file=str(tmp_path / "spill.jsonl"))
+    writer.start()
+    try:
+        ref = writer.submit(record(0))
+        for _ in range(200):
+            if writer.resolve(ref)[0] == "saved":
+                break
+            writer._stop.wait(0.01)
+        assert writer.resolve(ref) == ("saved", 1)
+    finally:
+        writer.close()
+
+
+def test_scans_keep_their_submit_time_through_a_spill(store, tmp_path, monkeypatch):
+    spill_file = str(tmp_path / "scan_spill.jsonl")
+    writer = ScanWriter(spill_file=spill_file)
+    writer.submit(record(0, timestamp="2026-01-02 03:04:05"))
+    writer.submit(record(1))
+    store.down = True
+    writer.close()
+
+    store.down = False
+    restarted = ScanWriter(spill_file=spill_file)
+    restarted._load_spill()
+    restarted.flush()
+    assert store.rows[0]["timestamp"] == "2026-01-02 03:04:05"
+    # Stamped in UTC at submit, not left for the DB to fill in at flush time
+    assert len(store.rows[1]["timestamp"]) == 19
+
+
+def test_local_store_saves_the_submit_time(tmp_path, monkeypatch):
+    local = LocalStore(str(tmp_path / "local.sqlite3"))
+    monkeypatch.setattr(scan_writer, "store", local)
+    writer = ScanWriter(spill_file=str(tmp_path / "unused"))
+    writer.submit(record(0, timestamp="2026-01-02 03:04:05"))
+    writer.submit(record(1))
+    writer.flush()
+    local.insert_scan("Metal", 0.9, None)  # unbuffered inserts are stamped by SQLite
+    history = local.fetch_history(10)
+    assert history[-1]["timestamp"] == datetime(2026, 1, 2, 3, 4, 5)
+    assert all(abs(scan["timestamp"] - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds() < 60 for scan in history[:2])
+    assert [scan["id"] for scan in local.fetch_history(10, until=datetime(2026, 1, 3))] == [1]
+
+
+def test_spill_load_stops_at_the_buffer_limit(store, tmp_path):
+    spill_file = str(tmp_path / "scan_spill.jsonl")
+    writer = ScanWriter(flush_size=2, max_buffered=3, spill_file=spill_file)
+    for i in range(3):
+        writer.submit(record(i))
+    store.down = True
+    writer.close()
+    with open(f"{spill_file}.99999", "w") as f:
+        f.write('{"waste_type": "Metal", "confidence": 0.9, "gemini_advice": null}\n' * 2)
+
+    store.down = False
+    restarted = ScanWriter(flush_size=2, max_buffered=3, spill_file=spill_file)
+    restarted.submit(record(9))
+    # One live scan plus 2 of the 5 spilled ones
+    assert restarted._load_spill() is True
+    assert restarted.pending() == 3
+    restarted.flush()
+    assert restarted._load_spill() is False
+    assert restarted.pending() == 3
+    restarted.flush()
+    assert len(store.rows) == 6 and restarted._spill_files() == []
+
+
+def test_flusher_feeds_in_a_large_spill_as_the_buffer_drains(store, tmp_path):
+    spill_file = str(tmp_path / "scan_spill.jsonl")
+    with open(f"{spill_file}.99999", "w") as f:
+        f.write('{"waste_type": "Metal", "confidence": 0.9, "gemini_advice": null}\n' * 50)
+    writer = ScanWriter(flush_size=5, max_buffered=10, flush_interval=0.01, spill_file=spill_file)
+    peak = 0
+    writer.start()
+    try:
+        for _ in range(500):
+            peak = max(peak, writer.pending())
+            if len(store.rows) == 50:
+                break
+            writer._stop.wait(0.005)
+    finally:
+        writer.close()
+    assert len(store.rows) == 50 and peak <= 10
+    assert writer._spill_files() == []
@@ -0,0 +1,155 @@
+import os
+import asyncio
+import functools
+import numpy as np
+from detections import as_array
+
+# --- TILED HIGH-RESOLUTION INFERENCE ---
+# Downsampling a drone or wide-angle shot to INFERENCE_IMGSZ loses small
+# debris. In tiled mode the photo is decoded larger, cut into overlapping
+# tile_size crops, and every crop (plus one downscaled view of the whole
+# frame, for objects bigger than a tile) goes through the batcher, so tiles
+# share forward passes and spread over the inference threads. Boxes are
+# shifted back into image coordinates and duplicates along the seams are
+# removed with class-aware NMS.
+# Tiles queue in the batcher's bulk lane, so tiled requests never crowd out
+# ordinary single scans, and each request keeps at most TILE_IN_FLIGHT tiles
+# queued at a time. If one tile fails (queue full, deadline), the rest are
+# cancelled before they reach the model.
+
+TILE_SIZE = int(os.getenv("TILE_SIZE", "640"))
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+# Tiles along the long side; bounds the work per request to TILE_GRID^2 + 1 images
+TILE_GRID = int(os.getenv("TILE_GRID", "4"))
+TILE_NMS_IOU = float(os.getenv("TILE_NMS_IOU", "0.5"))
+TILE_IN_FLIGHT = int(os.getenv("TILE_IN_FLIGHT", "4"))
+
+
+class MergedBoxes:
+    """Mirrors the parts of ultralytics Boxes we read: parallel xyxy/conf/cls
+    arrays, sorted by confidence."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy, self.conf, self.cls = xyxy, conf, cls
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class MergedResult:
+    def __init__(self, boxes, orig_shape, tiles):
+        self.boxes = boxes
+        self.orig_shape = orig_shape  # (height, width) of the tiled image
+        self.tiles = tiles
+
+
+def decode_target(tile_size=TILE_SIZE, overlap=TILE_OVERLAP, grid=TILE_GRID):
+    """Long side to decode to so it splits into at most `grid` tiles along it."""
+    stride = tile_size * (1 - overlap)
+    return int(tile_size + (max(1, grid) - 1) * stride)
+
+
+def _starts(length, tile_size, stride):
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, stride))
+    # Last tile flush with the edge rather than hanging over it
+    return starts + [length - tile_size]
+
+
+def tile_windows(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    """(left, top, right, bottom) crops covering the image with the given overlap."""
+    stride = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in _starts(height, tile_size, stride)
+        for x in _starts(width, tile_size, stride)
+    ]
+
+
+@functools.lru_cache(maxsize=1)
+def _torchvision_nms():
+    try:
+        import torch
+        from torchvision.ops import batched_nms
+    except ImportError:
+        return None
+    return lambda xyxy, conf, cls, iou: batched_nms(
+        torch.from_numpy(xyxy), torch.from_numpy(conf), torch.from_numpy(cls.astype(np.int64)), iou).numpy()
+
+
+def _numpy_nms(xyxy, conf, cls, iou):
+    # Offsetting each class into its own coordinate range makes one NMS pass class-aware
+    shifted = xyxy + (cls * (xyxy.max() + 1))[:, None]
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-conf, kind="stable")
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = w * h
+        overlap = inter / (areas[best] + areas[rest] - inter + 1e-9)
+        order = rest[overlap <= iou]
+    return np.array(keep, dtype=np.int64)
+
+
+def batched_nms(xyxy, conf, cls, iou=TILE_NMS_IOU):
+    """Indices of the boxes kept by class-aware NMS, highest confidence first.
+    Uses torchvision when it is installed (it ships with ultralytics)."""
+    if len(conf) == 0:
+        return np.zeros(0, dtype=np.int64)
+    nms = _torchvision_nms()
+    if nms is not None:
+        return nms(xyxy, conf, cls, iou)
+    return _numpy_nms(xyxy, conf, cls, iou)
+
+
+def merge(results, offsets, image_size, iou=TILE_NMS_IOU):
+    """Merges per-tile Results (boxes relative to each tile) into one MergedResult."""
+    xyxy, conf, cls = [], [], []
+    for result, (left, top) in zip(results, offsets):
+        boxes = result.boxes
+        if len(boxes) == 0:
+            continue
+        xyxy.append(as_array(boxes.xyxy).reshape(-1, 4) + np.array([left, top, left, top], dtype=np.float32))
+        conf.append(as_array(boxes.conf).reshape(-1))
+        cls.append(as_array(boxes.cls).reshape(-1))
+    width, height = image_size
+    if not conf:
+        empty = np.zeros(0, dtype=np.float32)
+        return MergedResult(MergedBoxes(np.zeros((0, 4), dtype=np.float32), empty, empty), (height, width), len(results))
+    xyxy, conf, cls = np.concatenate(xyxy), np.concatenate(conf), np.concatenate(cls)
+    keep = batched_nms(xyxy, conf, cls, iou)
+    return MergedResult(MergedBoxes(xyxy[keep], conf[keep], cls[keep]), (height, width), len(results))
+
+
+async def predict_tiled(predict, image, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, iou=TILE_NMS_IOU,
+                        max_in_flight=TILE_IN_FLIGHT):
+    """Runs `predict` (async, one image -> Results) over overlapping tiles of
+    `image` and the whole frame, up to `max_in_flight` at once, and merges the
+    detections."""
+    width, height = image.size
+    windows = tile_windows(width, height, tile_size, overlap)
+    crops = [image.crop(window) for window in windows]
+    offsets = [window[:2] for window in windows]
+    if len(windows) > 1:
+        # Whole-frame view: the model downsamples it like an untiled request
+        crops.append(image)
+        offsets.append((0, 0))
+    slots = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def run(crop):
+        async with slots:
+            return await predict(crop)
+
+    tasks = [asyncio.ensure_future(run(crop)) for crop in crops]
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        # On the first failure (or if the caller is cancelled) nobody wants the rest
+        for task in tasks:
+            task.cancel()
+    return merge(results, offsets, (width, height), iou)
@@ -0,0 +1,22 @@
+import time
+from contextlib import contextmanager
+
+# --- PER-REQUEST STAGE TIMING ---
+# /analyze times each pipeline stage and reports them in a Server-Timing
+# header (visible in browser devtools, and read by the benchmark harness).
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}  # stage name -> seconds, in first-seen order
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def server_timing(self):
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items())
@@ -13,7 +13,8 @@ const MapComponent = dynamic(() => import('@/components/MapComponent'), {
 });
 
 // --- TYPES ---
-type ScanResult = { waste_type: string; confidence: number; advice: string; scan_id?: number; };
+type ScanResult = { waste_type: string; confidence: number; advice: string | null; scan_id?: number; scan_ref?: string; cache?: "miss" | "exact" | "similar" | "off"; advice_job?: string; composition?: Record<string, MaterialShare>; };
+type MaterialShare = { count: number; area_fraction: number; max_confidence: number; mean_confidence: number; };
 type RecyclingCenter = { name: string; address: string; latitude: number; longitude: number; contact_info: string; };
 type ScanHistory = { id: number; waste_type: string; confidence: number; timestamp: string; };
 
@@ -40,8 +41,18 @@ export default function Home() {
     const formData = new FormData();
     formData.append('file', file);
     try {
-      const response = await axios.post('http://localhost:8000/analyze', formData);
+      // Deferred advice: show the detection now, fill in the advice when it arrives
+      const response = await axios.post('http://localhost:8000/analyze?advice=deferred', formData);
       setResult(response.data);
+      if (response.data.advice_job) {
+        const events = new EventSource(`http://localhost:8000/advice/${response.data.advice_job}/events`);
+        events.addEventListener('advice', (e) => {
+          const { advice } = JSON.parse((e as MessageEvent).data);
+          setResult(prev => prev && prev.advice_job === response.data.advice_job ? { ...prev, advice } : prev);
+          events.close();
+        });
+        events.onerror = () => events.close();
+      }
     } catch (err) { alert("Backend Error"); } 
     finally { setLoading(false); }
   };
@@ -87,7 +98,14 @@ export default function Home() {
                     <div className="bg-slate-800 p-4 rounded-xl"><p className="text-slate-400 text-sm">Material</p><p className="text-2xl font-bold text-white">{result.waste_type}</p></div>
                     <div className="bg-slate-800 p-4 rounded-xl"><p className="text-slate-400 text-sm">Confidence</p><p className="text-2xl font-bold text-blue-400">{(result.confidence * 100).toFixed(1)}%</p></div>
                   </div>
-                  <div className="bg-slate-800/50 p-5 rounded-xl border border-slate-700"><h3 className="text-slate-300 font-medium mb-2">Gemini Advice</h3><p className="text-slate-400 text-sm">{result.advice}</p></div>
+                  {result.composition && Object.keys(result.composition).length > 1 && (
+                    <div className="bg-slate-800 p-4 rounded-xl"><p className="text-slate-400 text-sm mb-2">Composition</p>
+                      {Object.entries(result.composition).map(([material, share]) => (
+                        <p key={material} className="text-sm text-slate-300">{material}: {share.count} × ({(share.area_fraction * 100).toFixed(1)}% of frame, max {(share.max_confidence * 100).toFixed(0)}%)</p>
+                      ))}
+                    </div>
+                  )}
+                  <div className="bg-slate-800/50 p-5 rounded-xl border border-slate-700"><h3 className="text-slate-300 font-medium mb-2">Gemini Advice</h3><p className="text-slate-400 text-sm">{result.advice ?? 'Generating advice...'}</p></div>
                 </div>
               ) : <div className="h-48 flex items-center justify-center text-slate-600 border border-dashed border-slate-800 rounded-xl">Ready to scan</div>}
             </section>